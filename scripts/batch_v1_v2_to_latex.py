@@ -1,17 +1,27 @@
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import subprocess
-import sys
-import tempfile
+import argparse
+import hashlib
+import json
+import os
 import re
+import sys
+import time
 
-
-def run(cmd: list[str]) -> int:
-    print('$', ' '.join(cmd))
-    return subprocess.call(cmd)
+# v1 and v2 run in-process (no interpreter per file). A manifest records, for every .md,
+# the content hash it was converted from together with a hash of the converter sources,
+# so unchanged files are skipped on the next run.
+MANIFEST_NAME = '.v1v2_hashes.json'
+REPO = Path(__file__).resolve().parents[1]
+# Sources that decide the conversion output; also the stage inputs in scripts/run_auto.py
+CONVERTER_FILES = [REPO / 'scripts' / name for name in (
+    'v1_fix_math_dollor.py', 'v2_fix_uni_to_latex.py', 'normalize_unicode_math.py', 'batch_v1_v2_to_latex.py')]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
 
 
-def process_one(md_path: Path) -> int:
+def output_path(md_path: Path) -> Path:
     stem = md_path.stem
     # Prefer new scheme: <n>_<doc>_<label>.md -> same stem with .latex
     out_latex = md_path.with_suffix('.latex')
@@ -24,39 +34,110 @@ def process_one(md_path: Path) -> int:
             core_wo_n = core[:-(len(n) + 1)]  # strip _<n>
             new_stem = f"{n}_{core_wo_n}"
             out_latex = md_path.parent / (new_stem + '.latex')
-    # Use a temporary file for v1 output so no *.v1.md remains in repo
-    with tempfile.TemporaryDirectory() as tdir:
-        tmp1 = Path(tdir) / (md_path.stem + '.v1.md')
-        # v1: wrap unicode-like math into $...$
-        rc = run([sys.executable, '-m', 'scripts.v1_fix_math_dollor', str(md_path), str(tmp1)])
-        if rc != 0:
-            print(f'[v1] FAIL: {md_path} rc={rc}')
-            return rc
-        # v2: map unicode inside math to LaTeX commands and convert md images -> \includegraphics
-        rc = run([sys.executable, '-m', 'scripts.v2_fix_uni_to_latex', str(tmp1), str(out_latex)])
-        if rc != 0:
-            print(f'[v2] FAIL: {md_path} rc={rc}')
-            return rc
-    print(f'[OK] {out_latex}')
-    return 0
+    return out_latex
+
+
+def list_sources(db: Path) -> list[Path]:
+    # Only process files in per-document subfolders: qs_DB/<doc_name>/*.md
+    return sorted(p for p in db.glob('*/*.md') if not p.name.endswith('.v1.md'))
+
+
+def convert_text(text: str) -> str:
+    # v1 (wrap unicode math in $...$) + v2 (unicode -> LaTeX, images -> \includegraphics),
+    # fused into one pass; see scripts/bench_unicode_math.py for the equivalence check
+    from scripts.normalize_unicode_math import normalize
+    return normalize(text)
+
+
+def converter_hash() -> str:
+    h = hashlib.sha256()
+    for path in CONVERTER_FILES:
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def load_manifest(db: Path) -> dict:
+    try:
+        return json.loads((db / MANIFEST_NAME).read_text(encoding='utf-8'))
+    except Exception:
+        return {}
+
+
+def save_manifest(db: Path, data: dict) -> None:
+    tmp = db / (MANIFEST_NAME + '.tmp')
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True), encoding='utf-8')
+    os.replace(tmp, db / MANIFEST_NAME)
+
+
+def convert_file(md_path: Path) -> tuple[str, str | None, float]:
+    """Worker: convert one .md to .latex. Returns (source hash, error or None, seconds)."""
+    # v1: wrap unicode-like math into $...$
+    # v2: map unicode inside math to LaTeX commands and convert md images -> \\includegraphics
+    t0 = time.perf_counter()
+    try:
+        text = md_path.read_text(encoding='utf-8')
+        output_path(md_path).write_text(convert_text(text), encoding='utf-8')
+        return text_hash(text), None, time.perf_counter() - t0
+    except Exception as e:
+        return '', str(e), time.perf_counter() - t0
 
 
 def main() -> int:
-    repo = Path(__file__).resolve().parents[1]
-    db = repo / 'qs_DB'
+    ap = argparse.ArgumentParser(description='Convert qs_DB/<doc>/*.md to .latex via v1 + v2')
+    ap.add_argument('--db', default=str(REPO / 'qs_DB'))
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    ap.add_argument('--force', action='store_true', help='convert every file even if its hash is unchanged')
+    ap.add_argument('--top', type=int, default=5, help='list the N slowest files')
+    args = ap.parse_args()
+
+    db = Path(args.db)
     if not db.exists():
         print(f'not found: {db}')
         return 1
-    # Only process files in per-document subfolders: qs_DB/<doc_name>/*.md
-    mds = sorted(p for p in db.glob('*/*.md') if not p.name.endswith('.v1.md'))
+    mds = list_sources(db)
     if not mds:
         print('[batch v1+v2] no md files under qs_DB')
         return 0
-    failures = 0
+
+    t_all = time.perf_counter()
+    code = converter_hash()
+    manifest = load_manifest(db)
+    if manifest.get('converter') != code:
+        manifest = {'converter': code, 'files': {}}
+    files = manifest['files']
+    todo: list[Path] = []
+    skipped = 0
     for md in mds:
-        rc = process_one(md)
-        if rc != 0:
+        key = md.relative_to(db).as_posix()
+        rec = files.get(key)
+        if not args.force and rec and output_path(md).exists() and rec == text_hash(md.read_text(encoding='utf-8')):
+            skipped += 1
+        else:
+            todo.append(md)
+
+    failures = 0
+    timings: list[tuple[float, Path]] = []
+    if len(todo) > 1 and args.workers > 1:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(todo))) as ex:
+            results = list(ex.map(convert_file, todo, chunksize=max(1, len(todo) // (4 * args.workers))))
+    else:
+        results = [convert_file(md) for md in todo]
+    for md, (digest, err, secs) in zip(todo, results):
+        key = md.relative_to(db).as_posix()
+        if err:
             failures += 1
+            files.pop(key, None)
+            print(f'[v1+v2] FAIL: {md}: {err}')
+            continue
+        files[key] = digest
+        timings.append((secs, md))
+        print(f'[OK] {output_path(md)} ({secs * 1000:.1f} ms)')
+    save_manifest(db, manifest)
+
     # remove any historical *.v1.md left in qs_DB
     removed = 0
     for p in db.rglob('*.v1.md'):
@@ -65,7 +146,12 @@ def main() -> int:
             removed += 1
         except Exception:
             pass
-    print(f'[batch v1+v2] done: {len(mds)} files, failures={failures}, removed_v1_md={removed}')
+    if timings and args.top > 0:
+        print(f'[batch v1+v2] slowest {min(args.top, len(timings))}:')
+        for secs, md in sorted(timings, key=lambda t: t[0], reverse=True)[:args.top]:
+            print(f'  {secs * 1000:8.1f} ms  {md.name}')
+    print(f'[batch v1+v2] done: {len(mds)} files, converted={len(todo) - failures}, skipped={skipped}, '
+          f'failures={failures}, removed_v1_md={removed}, {time.perf_counter() - t_all:.2f}s')
     return 0 if failures == 0 else 2
 
 
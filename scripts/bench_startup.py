@@ -0,0 +1,81 @@
+from __future__ import annotations
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Cold-start benchmark: wall-clock time of a fresh interpreter that imports each
+# entry point (src.pipeline, every scripts.* module) and of `src.pipeline --help`.
+# Each target is run --repeat times in a new process; min and median are reported.
+#
+#   python -m scripts.bench_startup
+#   python -m scripts.bench_startup --repeat 10 --importtime src.pipeline
+
+REPO = Path(__file__).resolve().parents[1]
+SKIP = {"__init__", "bench_startup"}
+
+
+def discover_targets() -> list[tuple[str, list[str]]]:
+    targets: list[tuple[str, list[str]]] = [
+        ("python (baseline)", ["-c", "pass"]),
+        ("import src.pipeline", ["-c", "import src.pipeline"]),
+        ("src.pipeline --help", ["-m", "src.pipeline", "--help"]),
+    ]
+    # scripts/legacy/* execute work at import time, so only top-level scripts are timed
+    for p in sorted((REPO / "scripts").glob("*.py")):
+        if p.stem in SKIP:
+            continue
+        mod = f"scripts.{p.stem}"
+        targets.append((f"import {mod}", ["-c", f"import {mod}"]))
+    return targets
+
+
+def time_once(args: list[str]) -> tuple[float, int]:
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, *args], cwd=str(REPO), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - t0, p.returncode
+
+
+def top_imports(module: str, n: int) -> list[tuple[int, str]]:
+    """Return the n slowest imports (cumulative microseconds) reported by -X importtime."""
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(REPO), capture_output=True, text=True,
+    )
+    rows: list[tuple[int, str]] = []
+    for line in p.stderr.splitlines():
+        m = re.match(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(.*)$", line)
+        if m:
+            rows.append((int(m.group(1)), m.group(2).rstrip()))
+    rows.sort(reverse=True)
+    return rows[:n]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Measure interpreter cold-start cost of each entry point")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--importtime", metavar="MODULE", help="also list the slowest imports of MODULE")
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args()
+
+    print(f"{'target':<52} {'min ms':>8} {'median ms':>10}  rc")
+    for label, cmd in discover_targets():
+        samples = []
+        rc = 0
+        for _ in range(max(1, args.repeat)):
+            dt, rc = time_once(cmd)
+            samples.append(dt * 1000)
+        print(f"{label:<52} {min(samples):>8.1f} {statistics.median(samples):>10.1f}  {rc}")
+
+    if args.importtime:
+        print(f"\n[importtime] slowest imports for {args.importtime} (cumulative ms):")
+        for us, name in top_imports(args.importtime, args.top):
+            print(f"  {us / 1000:>8.1f}  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
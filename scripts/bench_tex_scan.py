@@ -0,0 +1,106 @@
+"""Benchmark the brace-aware TeX scanner against the old non-greedy wrapper regexes.
+
+Generates `--mb` megabytes of pandoc-like TeX (images wrapped in \\pandocbounded,
+\\ensuremath with nested groups, escaped braces, % comments) and times the old
+`\\name\\{([\\s\\S]*?)\\}` substitutions against src/tex_scan. Flat wrappers must come
+out identical; for nested ones the old regex cuts at the first `}`, which the
+report counts as a correctness difference, not a failure. `--stress N` adds a
+document with N unclosed wrappers (a truncated conversion), where every regex
+attempt runs to the end of the text and the old pass turns quadratic. `--stress` also
+times one long line of N `a\\%b \\ensuremath{x}` groups: escapes and comments must be
+tracked forward along the line, not rescanned from the line start for every macro.
+
+    python -m scripts.bench_tex_scan [--mb 4] [--repeat 3] [--stress 4000]
+"""
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import re
+import sys
+import time
+
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from src.tex_scan import rewrite, unwrap  # noqa: E402
+
+OLD_BOUNDED = re.compile(r"\\pandocbounded\{([\s\S]*?)\}")
+OLD_ENSUREMATH = re.compile(r"\\ensuremath\s*\{([\s\S]*?)\}")
+
+FLAT = [
+    "如图，\\pandocbounded{figure-1.png} 所示，求 $x$ 的值。\n",
+    "已知 \\ensuremath{x^2} 与 \\{a, b\\} 的关系。 % 注释 }\n",
+    "\\textbf{解析：} 设 $a=1$，则 \\(b=2\\)。\n\n",
+]
+NESTED = [
+    "\\pandocbounded{\\includegraphics[keepaspectratio]{images/a1b2c3.jpg}}\n",
+    "所以 \\ensuremath{\\angle {A} + \\angle {B}} = 90°。\n",
+]
+
+
+def generate(size: int, nested: bool) -> str:
+    block = "".join(FLAT + (NESTED if nested else []))
+    return block * (size // len(block) + 1)
+
+
+def old_unwrap(tex: str) -> str:
+    tex = OLD_BOUNDED.sub(r"\1", tex)
+    return OLD_ENSUREMATH.sub(lambda m: f"${m.group(1)}$", tex)
+
+
+def new_unwrap(tex: str) -> str:
+    tex = unwrap(tex, ["pandocbounded"])
+    return rewrite(tex, {"ensuremath": ("$", "$")})
+
+
+def best_of(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Compare regex wrapper removal with src/tex_scan")
+    ap.add_argument("--mb", type=float, default=4.0, help="size of each generated document in MB")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--stress", type=int, default=0, help="number of unclosed wrappers (0 = off)")
+    args = ap.parse_args()
+    size = int(args.mb * 1024 * 1024)
+
+    rc = 0
+    for label, nested in (("flat", False), ("nested", True)):
+        tex = generate(size, nested)
+        old_out, new_out = old_unwrap(tex), new_unwrap(tex)
+        same = old_out == new_out
+        leftover = new_out.count("\\pandocbounded") + new_out.count("\\ensuremath")
+        old = best_of(old_unwrap, tex, args.repeat)
+        new = best_of(new_unwrap, tex, args.repeat)
+        print(f"[bench] {label:<6} {len(tex) / 1e6:5.1f} MB  regex {old * 1000:8.1f} ms  "
+              f"scanner {new * 1000:8.1f} ms  x{old / new:.2f}  identical={same}  leftover={leftover}")
+        if not nested and not same:
+            rc = 1  # flat wrappers must not change behaviour
+    if args.stress > 0:
+        tex = "\\ensuremath{\\angle A 中文" * args.stress
+        same = old_unwrap(tex) == new_unwrap(tex)
+        old = best_of(old_unwrap, tex, 1)
+        new = best_of(new_unwrap, tex, 1)
+        print(f"[bench] stress {args.stress} unclosed  regex {old * 1000:8.1f} ms  "
+              f"scanner {new * 1000:8.1f} ms  x{old / new:.1f}  identical={same}")
+        tex = "a\\%b \\ensuremath{x}" * args.stress
+        same = old_unwrap(tex) == new_unwrap(tex)
+        old = best_of(old_unwrap, tex, 1)
+        new = best_of(new_unwrap, tex, 1)
+        print(f"[bench] stress {args.stress} on one line  regex {old * 1000:8.1f} ms  "
+              f"scanner {new * 1000:8.1f} ms  identical={same}")
+    # The case the regex gets wrong: an inner group closes the wrapper early
+    probe = NESTED[1]
+    print(f"[bench] nested probe  regex={old_unwrap(probe).strip()!r}  scanner={new_unwrap(probe).strip()!r}")
+    return rc
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
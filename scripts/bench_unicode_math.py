@@ -0,0 +1,71 @@
+"""Benchmark the fused normalizer against the old v1 -> v2 chain on qs_DB.
+
+Checks that both produce identical output for every part, then times each over
+`--repeat` rounds of the whole corpus. `--stress N` adds a synthetic part with an
+N-character symbol-free run, the case where v1's wrapping regex backtracks.
+
+    python -m scripts.bench_unicode_math [--db qs_DB] [--repeat 50] [--stress 20000]
+"""
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import sys
+import time
+
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from scripts.batch_v1_v2_to_latex import list_sources  # noqa: E402
+from scripts.normalize_unicode_math import normalize  # noqa: E402
+from scripts.v1_fix_math_dollor import wrap_unicode_math  # noqa: E402
+from scripts.v2_fix_uni_to_latex import convert  # noqa: E402
+
+
+def old_chain(text: str) -> str:
+    return convert(wrap_unicode_math(text))
+
+
+def best_of(fn, texts: list[str], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description='Compare v1+v2 with the fused normalizer')
+    ap.add_argument('--db', default=str(REPO / 'qs_DB'))
+    ap.add_argument('--repeat', type=int, default=50)
+    ap.add_argument('--stress', type=int, default=0, help='length of a synthetic symbol-free run (0 = off)')
+    args = ap.parse_args()
+
+    mds = list_sources(Path(args.db))
+    if not mds:
+        print(f'[bench] no md files under {args.db}')
+        return 1
+    texts = [p.read_text(encoding='utf-8') for p in mds]
+    mismatches = [p for p, t in zip(mds, texts) if normalize(t) != old_chain(t)]
+    for p in mismatches:
+        print(f'[bench] DIFF {p}')
+    size = sum(len(t) for t in texts)
+    print(f'[bench] {len(texts)} files, {size} chars, identical={len(texts) - len(mismatches)}/{len(texts)}')
+
+    old = best_of(old_chain, texts, args.repeat)
+    new = best_of(normalize, texts, args.repeat)
+    print(f'[bench] corpus  old {old * 1000:8.2f} ms  fused {new * 1000:8.2f} ms  x{old / new:.1f}')
+
+    if args.stress > 0:
+        stress = ['a' * args.stress + '中∠A']
+        same = normalize(stress[0]) == old_chain(stress[0])
+        old = best_of(old_chain, stress, 1)
+        new = best_of(normalize, stress, 1)
+        print(f'[bench] stress  old {old * 1000:8.2f} ms  fused {new * 1000:8.2f} ms  x{old / new:.1f}  identical={same}')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,12 +1,22 @@
 from __future__ import annotations
-import re
 from pathlib import Path
 import sys
 
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from src.tex_scan import unwrap  # noqa: E402
+
+
+def clean_text(s: str) -> str:
+    # Brace-aware: \pandocbounded{\includegraphics[...]{a.png}} keeps the inner group intact
+    return unwrap(s, ["pandocbounded"])
+
 
 def clean_file(p: Path) -> bool:
     s = p.read_text(encoding="utf-8", errors="strict")
-    new_s = re.sub(r"\\pandocbounded\{([\s\S]*?)\}", r"\1", s)
+    new_s = clean_text(s)
     if new_s != s:
         p.write_text(new_s, encoding="utf-8")
         return True
@@ -3,6 +3,12 @@ import re
 from pathlib import Path
 import sys
 
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from src.tex_scan import rewrite  # noqa: E402
+
 
 CONTROL_CHARS = re.compile(r"[\x00-\x08\x0B\x0C\x0E-\x1F]")
 
@@ -22,8 +28,8 @@ def clean(tex: str) -> str:
         inner = _unescape_braces(m.group(1))
         return f"${inner}$"
     s = re.sub(r"\\ensuremath\s*\\\{([\s\S]*?)\\\}", _repl_esc, s)
-    # 3b) Replace normal ensuremath: \ensuremath{ ... } -> $...$
-    s = re.sub(r"\\ensuremath\s*\{([\s\S]*?)\}", lambda m: f"${m.group(1)}$", s)
+    # 3b) Replace normal ensuremath: \ensuremath{ ... } -> $...$ (nested braces kept intact)
+    s = rewrite(s, {"ensuremath": ("$", "$")})
     # 4) After conversions, unescape any remaining \{ \} to { }
     s = _unescape_braces(s)
     # 5) Collapse duplicated $$ from previous conversions (optional safety)
@@ -6,10 +6,18 @@ import sys
 
 def comment_preamble(tex_path: Path) -> bool:
     s = tex_path.read_text(encoding="utf-8", errors="strict")
+    out = comment_preamble_text(s)
+    if out != s:
+        tex_path.write_text(out, encoding="utf-8")
+        return True
+    return False
+
+
+def comment_preamble_text(s: str) -> str:
     # Find \begin{document}
     m = re.search(r"^\\begin\{document\}\s*$", s, flags=re.MULTILINE)
     if not m:
-        return False
+        return s
     head = s[:m.start()]
     tail = s[m.start():]
     # Comment every non-empty line in head (preserve empty lines)
@@ -19,11 +27,7 @@ def comment_preamble(tex_path: Path) -> bool:
             commented_lines.append('% ' + line)
         else:
             commented_lines.append(line)
-    out = ''.join(commented_lines) + tail
-    if out != s:
-        tex_path.write_text(out, encoding="utf-8")
-        return True
-    return False
+    return ''.join(commented_lines) + tail
 
 
 def main() -> int:
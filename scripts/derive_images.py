@@ -0,0 +1,56 @@
+"""Point \\includegraphics links at size/DPI-bounded image derivatives (src/image_derivatives.py).
+
+Derivatives are sized for the 0.75\\textwidth layout and cached under .cache/derived by
+source hash + target parameters; originals stay in qs_image_DB. All files given share one
+process pool, and files are rewritten in place only when a link changes.
+
+    python -m scripts.derive_images outputs/worksheet_pandoc.tex
+    python -m scripts.derive_images outputs/worksheet.tex qs_DB --dpi 200
+"""
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import sys
+
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from src import image_derivatives as deriv  # noqa: E402
+
+
+def collect(targets: list[str], pattern: str) -> list[Path]:
+    files: list[Path] = []
+    for t in targets:
+        p = Path(t)
+        if p.is_dir():
+            files.extend(sorted(p.glob(pattern)))
+        elif p.exists():
+            files.append(p)
+        else:
+            print(f"[derive] not found: {p}")
+    return list(dict.fromkeys(files))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Rewrite \\includegraphics links to cached, size-bounded image derivatives")
+    ap.add_argument("targets", nargs="*", default=["outputs/worksheet_pandoc.tex"],
+                    help="TeX files or directories (directories are searched with --pattern)")
+    ap.add_argument("--pattern", default="**/*.latex", help="glob used inside directory targets")
+    ap.add_argument("--dpi", type=int, default=deriv.DPI, help="target DPI at 0.75\\textwidth")
+    ap.add_argument("--quality", type=int, default=deriv.QUALITY, help="JPEG quality of derivatives")
+    ap.add_argument("--workers", type=int, default=deriv.WORKERS, help="processes used to resize images")
+    args = ap.parse_args()
+
+    deriv.configure(dpi=args.dpi, quality=args.quality, workers=args.workers)
+    files = collect(args.targets, args.pattern)
+    if not files:
+        print("[derive] no TeX files")
+        return 0
+    stats, changed = deriv.rewrite_tex_paths(files)
+    print(f"[derive] {deriv.summary(stats)} params={deriv.params()} files_changed={changed}/{len(files)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
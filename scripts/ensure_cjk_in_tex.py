@@ -3,6 +3,13 @@ from pathlib import Path
 
 def ensure_cjk(tex_path: Path) -> None:
     s = tex_path.read_text(encoding='utf-8', errors='ignore')
+    new_s = ensure_cjk_text(s)
+    if new_s is not s:
+        tex_path.write_text(new_s, encoding='utf-8')
+
+def ensure_cjk_text(s: str) -> str:
+    """Return the TeX with XeCJK/font setup injected (unchanged object if nothing to do)."""
+    orig = s
     # Remove lmodern when using unicode-math/fontspec to avoid conflicts
     s = s.replace('\\usepackage{lmodern}', '')
     lines = s.splitlines()
@@ -19,7 +26,8 @@ def ensure_cjk(tex_path: Path) -> None:
             out.append('\\IfFontExistsTF{XITS Math}{\\setmathfont{XITS Math}}{\\IfFontExistsTF{STIX Two Math}{\\setmathfont{STIX Two Math}}{\\IfFontExistsTF{Latin Modern Math}{\\setmathfont{Latin Modern Math}}{\\IfFontExistsTF{TeX Gyre Termes Math}{\\setmathfont{TeX Gyre Termes Math}}{\\IfFontExistsTF{Libertinus Math}{\\setmathfont{Libertinus Math}}{}}}}}')
             injected = True
     if injected:
-        tex_path.write_text('\n'.join(out), encoding='utf-8')
+        return '\n'.join(out)
+    return orig
 
 if __name__ == '__main__':
     p = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('outputs/worksheet_pandoc.tex')
@@ -7,9 +7,15 @@ INJECT_MARK = "% -- Injected unicode mappings --"
 
 
 def ensure_mappings(tex_path: Path) -> bool:
-    s = tex_path.read_text(encoding="utf-8", errors="strict")
+    s, injected = ensure_mappings_text(tex_path.read_text(encoding="utf-8", errors="strict"))
+    if injected:
+        tex_path.write_text(s, encoding="utf-8")
+    return injected
+
+
+def ensure_mappings_text(s: str) -> tuple[str, bool]:
     if INJECT_MARK in s:
-        return False
+        return s, False
 
     lines = s.splitlines()
     out = []
@@ -25,8 +31,8 @@ def ensure_mappings(tex_path: Path) -> bool:
             out.append("\\newunicodechar{∠}{\\ensuremath{\\angle}}")
             injected = True
     if injected:
-        tex_path.write_text("\n".join(out), encoding="utf-8")
-    return injected
+        return "\n".join(out), True
+    return s, False
 
 
 def main() -> int:
@@ -1,18 +1,19 @@
 ﻿from __future__ import annotations
-import re, os
+import re, os, sys
 from pathlib import Path
 
-repo = Path(__file__).resolve().parents[1]
+repo = Path(__file__).resolve().parents[2]
+if str(repo) not in sys.path:
+    sys.path.insert(0, str(repo))
+from scripts.sync_qs_image_db_and_fix_links import build_filename_index  # noqa: E402
+
 tex = repo / 'outputs' / 'worksheet_pandoc.tex'
 db = repo / 'qs_image_DB'
 if not tex.exists():
     print('[skip] no outputs/worksheet_pandoc.tex')
     raise SystemExit(0)
-# build index
-idx = {}
-for p in db.rglob('*'):
-    if p.is_file() and p.suffix.lower() in {'.jpg','.jpeg','.png','.bmp'}:
-        idx[p.name] = p
+# index comes from qs_image_DB/_index.sqlite, no tree walk
+idx = build_filename_index(db)
 
 content = tex.read_text(encoding='utf-8', errors='ignore')
 pattern = re.compile(r"\\includegraphics(\[[^\]]*\])?\{([^}]+)\}")
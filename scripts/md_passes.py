@@ -0,0 +1,146 @@
+"""Markdown post-processing passes: worksheet.md is read once, edited in memory, written once.
+
+normalize_md_question_titles, insert_linebreaks_before_solutions, the image-link rewrite of
+sync_qs_image_db_and_fix_links and split_md_to_parts each used to read worksheet.md, change it
+and write the whole file back. Here they are passes of a PassManager (src/passes.py) over one
+buffer; the scripts keep their own CLIs. Title merging and line breaks are plain text passes;
+the link rewrite and the split depend on the image index / output folder and are bound per run
+by `manager()`. The split pass writes the qs_DB parts and returns the text unchanged.
+
+    python -m scripts.md_passes                         # sync images, fix outputs/worksheet.md, split
+    python -m scripts.md_passes outputs/worksheet.md --passes normalize_md_question_titles
+    python -m scripts.md_passes --no-split --no-sync
+"""
+from __future__ import annotations
+from functools import partial
+from pathlib import Path
+import argparse
+import sys
+
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from src.passes import Pass, PassManager, PassRegistry  # noqa: E402
+from scripts import sync_qs_image_db_and_fix_links as sync  # noqa: E402
+from scripts.insert_linebreaks_before_solutions import insert_breaks  # noqa: E402
+from scripts.normalize_md_question_titles import normalize_text  # noqa: E402
+from scripts.split_md_to_parts import _detect_doc_name, split_text  # noqa: E402
+
+
+def normalize_titles(text: str) -> str:
+    return normalize_text(text)[0]
+
+
+def insert_linebreaks(text: str) -> str:
+    return insert_breaks(text)[0]
+
+
+def rewrite_image_links(text: str, index: dict[str, Path], base_dir: Path) -> str:
+    return sync.rewrite_links_in_text(text, index, base_dir, REPO)
+
+
+def split_parts(text: str, out_root: Path, doc_name: str, written: list[Path]) -> str:
+    written.extend(split_text(text, out_root, doc_name))
+    return text
+
+
+MD_PASSES = PassRegistry()
+MD_PASSES.register("normalize_md_question_titles", normalize_titles, "merge title-only lines with the next line")
+MD_PASSES.register("insert_linebreaks_before_solutions", insert_linebreaks, "newline before inline 解析：/解法<n>：")
+# Bound per run in manager(): they need the image index / the qs_DB folder
+BOUND_PASSES = {
+    "rewrite_image_links": "point image links at qs_image_DB",
+    "split_md_to_parts": "write one qs_DB part per question head (text unchanged)",
+}
+
+# What run_mineru_auto.bat steps 6.5-7.5 / run_auto's fix_md + split do, in that order
+PRESETS = {
+    "worksheet": [
+        "normalize_md_question_titles",
+        "insert_linebreaks_before_solutions",
+        "rewrite_image_links",
+        "split_md_to_parts",
+    ],
+}
+
+
+def manager(
+    names: list[str] | None = None,
+    md: Path = REPO / "outputs" / "worksheet.md",
+    index: dict[str, Path] | None = None,
+    out_root: Path = REPO / "qs_DB",
+    doc_name: str | None = None,
+    written: list[Path] | None = None,
+) -> PassManager:
+    """Build a PassManager for `names` (default: the worksheet preset).
+
+    `index` is the qs_image_DB basename index (built on demand); split parts are appended
+    to `written` when given.
+    """
+    passes: list[Pass] = []
+    for name in names or PRESETS["worksheet"]:
+        if name == "rewrite_image_links":
+            if index is None:
+                index = sync.build_filename_index(REPO / "qs_image_DB")
+            fn = partial(rewrite_image_links, index=index, base_dir=md.parent)
+        elif name == "split_md_to_parts":
+            fn = partial(split_parts, out_root=out_root, doc_name=doc_name or _detect_doc_name(REPO),
+                         written=written if written is not None else [])
+        else:
+            passes.append(MD_PASSES.get(name))
+            continue
+        passes.append(Pass(name, fn, BOUND_PASSES[name]))
+    return PassManager(passes)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Run the Markdown fixers and the split over worksheet.md in one read/write")
+    ap.add_argument("md", nargs="?", default="outputs/worksheet.md")
+    ap.add_argument("--passes", default="", help="comma-separated pass names (default: worksheet preset)")
+    ap.add_argument("--no-split", action="store_true", help="drop split_md_to_parts from the pass list")
+    ap.add_argument("--no-sync", action="store_true", help="do not store MinerU images in qs_image_DB first")
+    ap.add_argument("--list", action="store_true", help="list passes and exit")
+    args = ap.parse_args()
+
+    if args.list:
+        for name in MD_PASSES.names():
+            print(f"{name:<36}{MD_PASSES.get(name).doc}")
+        for name, doc in BOUND_PASSES.items():
+            print(f"{name:<36}{doc}")
+        return 0
+    md = Path(args.md)
+    if not md.exists():
+        print(f"not found: {md}")
+        return 1
+    names = [n.strip() for n in args.passes.split(",") if n.strip()] or list(PRESETS["worksheet"])
+    if args.no_split:
+        names = [n for n in names if n != "split_md_to_parts"]
+
+    if not args.no_sync and "rewrite_image_links" in names:
+        copied, docs = sync.sync_mineru_tmp_to_db(REPO, md.parent / "_mineru_tmp")
+        removed = sync.cleanup_non_image_in_db(REPO, docs)
+        print(f"[sync] stored {copied} new images in qs_image_DB, removed {removed} non-images")
+    index = sync.build_filename_index(REPO / "qs_image_DB") if "rewrite_image_links" in names else None
+    written: list[Path] = []
+    try:
+        pm = manager(names, md, index=index, written=written)
+    except KeyError as e:
+        print(e.args[0])
+        return 2
+    changed = pm.run_file(md)
+    print(pm.report())
+    print(f"[md-passes] md_changed={changed} parts={len(written)} file={md}")
+    # worksheet.tex carries the same image links; fix it with the same index
+    tex = md.with_suffix(".tex")
+    if index is not None and tex.exists():
+        t = tex.read_text(encoding="utf-8")
+        new_t = rewrite_image_links(t, index, tex.parent)
+        if new_t != t:
+            tex.write_text(new_t, encoding="utf-8")
+        print(f"[links] tex_changed={new_t != t}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Local stand-in for the MathPix /v3/text endpoint, used to measure client
+# throughput and exercise retry/rate-limit handling without network access.
+#
+#   python -m scripts.mock_mathpix_server --port 8765 --latency 0.2 --fail_rate 0.1
+#   MATHPIX_API_URL=http://127.0.0.1:8765/v3/text python -m src.pipeline ...
+#
+#   python -m scripts.mock_mathpix_server --bench 200   # in-process server + client benchmark
+
+
+class MockState:
+    def __init__(self, latency: float, fail_rate: float, max_rps: float, seed: int) -> None:
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.max_rps = max_rps
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window: list[float] = []
+        self.counts = {"ok": 0, "429": 0, "500": 0, "401": 0}
+
+    def admit(self) -> int:
+        """Return the HTTP status to answer with (200, 429 or 500)."""
+        with self.lock:
+            now = time.monotonic()
+            if self.max_rps > 0:
+                self.window = [t for t in self.window if now - t < 1.0]
+                if len(self.window) >= self.max_rps:
+                    self.counts["429"] += 1
+                    return 429
+                self.window.append(now)
+            if self.rng.random() < self.fail_rate:
+                self.counts["500"] += 1
+                return 500
+            self.counts["ok"] += 1
+            return 200
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):  # keep the console quiet
+            pass
+
+        def _reply(self, status: int, body: dict) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length)
+            if not (self.headers.get("app_id") and self.headers.get("app_key")):
+                with state.lock:
+                    state.counts["401"] += 1
+                self._reply(401, {"error": "missing credentials"})
+                return
+            if state.latency:
+                time.sleep(state.latency)
+            status = state.admit()
+            if status != 200:
+                self._reply(status, {"error": f"mock {status}"})
+                return
+            try:
+                src = json.loads(raw.decode("utf-8")).get("src", "")
+            except Exception:
+                self._reply(400, {"error": "bad json"})
+                return
+            digest = hashlib.sha256(src.encode("utf-8")).hexdigest()
+            # Deterministic pseudo-result so cached and fresh answers can be compared
+            self._reply(200, {"latex_styled": f"x_{{{digest[:6]}}}^{{2}}", "confidence": 0.99})
+
+    return Handler
+
+
+def start_server(port: int, state: MockState) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def bench(n: int, state: MockState, concurrency: int, rate: float) -> int:
+    from src.mathpix_client import MathpixClient
+
+    srv = start_server(0, state)
+    url = f"http://127.0.0.1:{srv.server_address[1]}/v3/text"
+    with tempfile.TemporaryDirectory() as tdir:
+        imgs = []
+        for i in range(n):
+            p = Path(tdir) / f"img_{i}.png"
+            # every 10th image duplicates an earlier one to exercise the hash cache
+            p.write_bytes(f"fake-image-{i if i % 10 else 0}".encode("utf-8"))
+            imgs.append(p)
+
+        seq = MathpixClient("mock", "mock", api_url=url, max_concurrency=1, rate=0, retries=3, backoff=0.05)
+        t0 = time.perf_counter()
+        seq.recognize(imgs[: max(1, n // 10)])
+        seq_dt = (time.perf_counter() - t0) / max(1, n // 10)
+        seq.close()
+
+        cli = MathpixClient("mock", "mock", api_url=url, max_concurrency=concurrency, rate=rate, retries=3, backoff=0.05)
+        t0 = time.perf_counter()
+        res = cli.recognize(imgs)
+        dt = time.perf_counter() - t0
+        cli.close()
+    srv.shutdown()
+    ok = sum(1 for r in res if r)
+    print(f"[bench] sequential: {1 / seq_dt:.1f} img/s (sampled on {max(1, n // 10)} images)")
+    print(f"[bench] async: {n} images in {dt:.2f}s -> {n / dt:.1f} img/s, ok={ok}, failed={n - ok}")
+    print(f"[bench] client stats: {cli.stats}")
+    print(f"[bench] server replies: {state.counts}")
+    return 0 if ok == n else 1
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Local mock of the MathPix /v3/text API")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.2, help="seconds to sleep per request")
+    ap.add_argument("--fail_rate", type=float, default=0.0, help="probability of answering 500")
+    ap.add_argument("--max_rps", type=float, default=0.0, help="answer 429 above this many requests/second (0 = off)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--bench", type=int, default=0, help="run an in-process client benchmark over N fake images and exit")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--rate", type=float, default=0.0, help="client-side requests/second limit for --bench (0 = off)")
+    args = ap.parse_args()
+
+    state = MockState(args.latency, args.fail_rate, args.max_rps, args.seed)
+    if args.bench:
+        return bench(args.bench, state, args.concurrency, args.rate)
+
+    srv = start_server(args.port, state)
+    print(f"[mock-mathpix] listening on http://127.0.0.1:{srv.server_address[1]}/v3/text (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    srv.shutdown()
+    print(f"[mock-mathpix] replies: {state.counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
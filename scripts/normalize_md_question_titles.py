@@ -1,19 +1,36 @@
 from __future__ import annotations
-import re
 from pathlib import Path
 import sys
 
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from src.question_grammar import QUESTION, TITLE_KINDS, scan  # noqa: E402
+
 # 这里是把题号和题干合并到一行的脚本，为了后续切题方便
-TITLE_BRACKETED = re.compile(r"^\s*【([^】]+)】\s*$")
-TITLE_NUMBERED = re.compile(r"^\s*(\d+)\s*[\.．、]\s*$")
 
 
-def should_merge_with_next(line: str) -> bool:
-    if TITLE_BRACKETED.match(line):
-        return True
-    if TITLE_NUMBERED.match(line):
-        return True
-    return False
+def title_prefixes(text: str, lines: list[str]) -> dict[int, str]:
+    """返回 行号 -> 合并用前缀，只包含单独成行的题号行（【...】 或 "1."/"1、"）。"""
+    heads = [t for t in scan(text) if t.alone]
+    if not heads:
+        return {}
+    out: dict[int, str] = {}
+    k, offset = 0, 0
+    for idx, line in enumerate(lines):
+        end = offset + len(line)
+        while k < len(heads) and heads[k].head < end:
+            t = heads[k]
+            k += 1
+            if t.head < offset or text[offset:t.head].strip():
+                continue  # head is not at the start of this line (e.g. quoted with ">")
+            if t.label.startswith("【") and t.kind in TITLE_KINDS:
+                out[idx] = f"【{t.inner}】"
+            elif t.kind == QUESTION and t.label[-1] in ".．、" and t.label[:-1].strip().isdigit():
+                out[idx] = f"{t.number}."
+        offset = end
+    return out
 
 
 def is_mergeable_text(line: str) -> bool:
@@ -26,29 +43,24 @@ def is_mergeable_text(line: str) -> bool:
     return True
 
 
-def normalize(md_path: Path) -> int:
-    lines = md_path.read_text(encoding="utf-8").splitlines()
+def normalize_text(text: str) -> tuple[str, int]:
+    # Title lines come from one scan of the whole text; keepends keeps offsets aligned with it
+    raw_lines = text.splitlines(keepends=True)
+    titles = title_prefixes(text, raw_lines)
+    lines = text.splitlines()
     out: list[str] = []
     i = 0
     changes = 0
     n = len(lines)
     while i < n:
         cur = lines[i]
-        if should_merge_with_next(cur) and i + 1 < n:
+        if i in titles and i + 1 < n:
             # Find next non-empty line index j (allow at most one blank)
             j = i + 1
             if j < n and not lines[j].strip() and (j + 1) < n:
                 j += 1
             if j < n and is_mergeable_text(lines[j]):
-                b = TITLE_BRACKETED.match(cur)
-                m = TITLE_NUMBERED.match(cur)
-                if b:
-                    prefix = f"【{b.group(1).strip()}】"
-                elif m:
-                    prefix = f"{m.group(1)}."
-                else:
-                    prefix = cur.strip()
-                merged = f"{prefix} {lines[j].lstrip()}".rstrip()
+                merged = f"{titles[i]} {lines[j].lstrip()}".rstrip()
                 out.append(merged)
                 i = j + 1
                 changes += 1
@@ -57,7 +69,14 @@ def normalize(md_path: Path) -> int:
         i += 1
 
     if changes:
-        md_path.write_text("\n".join(out) + "\n", encoding="utf-8")
+        return "\n".join(out) + "\n", changes
+    return text, 0
+
+
+def normalize(md_path: Path) -> int:
+    new_text, changes = normalize_text(md_path.read_text(encoding="utf-8"))
+    if changes:
+        md_path.write_text(new_text, encoding="utf-8")
     return changes
 
 
@@ -0,0 +1,129 @@
+"""Fused v1 + v2: one linear pass from worksheet-part Markdown to LaTeX-ready text.
+
+The old chain ran three full passes: v1 split the text on math delimiters and wrapped
+bare Unicode math with `[chars]*[sym][chars]*` (which backtracks on long symbol-free
+runs), v2 looped `str.replace` once per symbol inside every math span, and a last regex
+turned Markdown images into \\includegraphics. Here a single tokenizer walks the text once:
+
+- tracks math state for `$...$`, `\\(...\\)` (also `\\ (` as v1 did) and `\\[...\\]`;
+- outside math, wraps every maximal run of math-ish characters that contains a target
+  symbol in `$...$` (same character classes as v1);
+- cleans each math span with a translation table plus v2's digit/brace fixes;
+- emits `\\includegraphics[keepaspectratio]{path}` for `![alt](path)`.
+
+Output is identical to v1 -> v2 on well-formed input (see scripts/bench_unicode_math.py);
+interleaved delimiters such as `$ \\( $ ... \\)` follow the state machine above.
+Where the old chain misbehaved it now does the obvious thing instead: math spans that
+cross a line break are still cleaned, `\\[...\\]` is left as display math, and image
+syntax is never split by the wrapping (v1 used to wrap `abc.jpg)∠A` inside the link).
+"""
+from __future__ import annotations
+from pathlib import Path
+import re
+import sys
+
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from scripts.v1_fix_math_dollor import TARGET_SYMBOLS, VALID_MATH_CHARS  # noqa: E402
+from scripts.v2_fix_uni_to_latex import REPLACEMENT_DICT  # noqa: E402
+
+SYMBOL_TABLE = str.maketrans(REPLACEMENT_DICT)
+IMAGE = r'\includegraphics[keepaspectratio]{%s}'
+
+# Text-mode tokens. Every alternative is a plain character class or a literal prefix,
+# so matching never backtracks over a run more than once.
+_TEXT_TOKEN = re.compile(
+    r'(?P<img>!\[[^\]]*\]\((?P<path>[^)\n]*)\))'
+    r'|(?P<open>\$|\\\s*\(|\\\[)'
+    r'|\\\s*\)'
+    rf'|(?P<run>[{VALID_MATH_CHARS}]+)'
+    rf'|[^{VALID_MATH_CHARS}$\\!]+'
+    r'|.',
+    re.S,
+)
+_IMAGE_MD = re.compile(r'!\[[^\]]*\]\(([^)\n]*)\)')
+_CLOSE_PAREN = re.compile(r'\\\s*\)')
+_HAS_SYMBOL = re.compile(f'[{TARGET_SYMBOLS}]').search
+_DIGIT_GAP = re.compile(r'(\d)\s+(\d)')
+_BRACE = re.compile(r'(\\triangle|\\angle|\\parallel|\\perp)([a-zA-Z]{1,})')
+
+
+def convert_images(text: str) -> str:
+    return _IMAGE_MD.sub(lambda m: IMAGE % m.group(1), text)
+
+
+def clean_math(content: str) -> str:
+    # Same steps as v2.clean_math_content; the per-symbol replace loop becomes one translate()
+    content = content.translate(SYMBOL_TABLE)
+    content = _DIGIT_GAP.sub(r'\1\2', content)
+    content = content.replace(r'\boldsymbol { E }', 'E')
+    content = _BRACE.sub(r'\1{\2}', content)
+    return convert_images(content)
+
+
+def _close(text: str, opener: str, pos: int) -> tuple[int, int]:
+    # (content end, position after the closing delimiter), or (-1, -1) if never closed
+    if opener == '$':
+        j = text.find('$', pos)
+        return (j, j + 1) if j >= 0 else (-1, -1)
+    if opener == '\\[':
+        j = text.find('\\]', pos)
+        return (j, j + 2) if j >= 0 else (-1, -1)
+    m = _CLOSE_PAREN.search(text, pos)
+    return (m.start(), m.end()) if m else (-1, -1)
+
+
+def normalize(text: str) -> str:
+    out: list[str] = []
+    emit = out.append
+    pos, n = 0, len(text)
+    match = _TEXT_TOKEN.match
+    while pos < n:
+        m = match(text, pos)
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == 'run':
+            run = m.group()
+            if not run.isascii() and _HAS_SYMBOL(run):
+                emit('$' + clean_math(run) + '$')
+            else:
+                emit(run)
+        elif kind == 'img':
+            emit(IMAGE % m.group('path'))
+        elif kind == 'open':
+            opener = m.group() if m.group() in ('$', '\\[') else '\\('
+            end, after = _close(text, opener, pos)
+            if end < 0:
+                # never closed: like v1, nothing after it is wrapped; images are still converted
+                emit(convert_images(text[m.start():]))
+                break
+            body = text[pos:end]
+            if opener == '\\[':
+                emit('\\[' + clean_math(body) + '\\]')
+            else:
+                # v2 rewrote \(...\) as $...$ without the padding inside the delimiters
+                emit('$' + clean_math(body if opener == '$' else body.strip()) + '$')
+            pos = after
+        else:
+            emit(m.group())
+    return ''.join(out)
+
+
+def main() -> int:
+    if len(sys.argv) != 3:
+        print('Usage: python -m scripts.normalize_unicode_math <input.md> <output.latex>')
+        return 1
+    src, dst = Path(sys.argv[1]), Path(sys.argv[2])
+    try:
+        dst.write_text(normalize(src.read_text(encoding='utf-8')), encoding='utf-8')
+    except FileNotFoundError:
+        print(f"Error: Input file '{src}' not found.")
+        return 1
+    print(f'--- Saved to: {dst}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
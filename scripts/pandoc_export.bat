@@ -37,6 +37,9 @@ python "%SCRIPTDIR%ensure_cjk_in_tex.py" "%OUTTEX%" || goto :err
 echo [2.6/3] Injecting unicode mappings (e.g., triangle -> \triangle) ...
 python "%SCRIPTDIR%ensure_unicode_mappings.py" "%OUTTEX%" || goto :err
 
+echo [2.7/3] Linking size-bounded image derivatives in %OUTTEX% ...
+python "%SCRIPTDIR%derive_images.py" "%OUTTEX%" || goto :err
+
 echo [3/3] Building PDF from cleaned TeX via XeLaTeX ...
 if exist "%OUTPDF%" del /q "%OUTPDF%" >nul 2>nul
 where xelatex >nul 2>nul && (
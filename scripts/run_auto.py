@@ -1,11 +1,18 @@
 ﻿from __future__ import annotations
 import argparse
+import ast
 import os
-import shutil
 import subprocess
 import sys
 from pathlib import Path
 
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from src.env_probe import which  # noqa: E402  (cached pandoc/xelatex lookup)
+from src.stage_graph import Stage, StageGraph  # noqa: E402
+
 
 def run(cmd: list[str], cwd: Path | None = None, check: bool = True) -> int:
     print("$", " ".join(cmd))
@@ -19,55 +26,110 @@ def ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
 
-def do_pandoc_export(md: Path, out_dir: Path, emit_snippet: bool = False) -> Path:
+# TeX post-processing applied to worksheet_pandoc.tex (the "pandoc" preset of scripts/tex_passes.py,
+# in the order of pandoc_export.bat). The modules are listed so their source is part of the
+# pandoc stage fingerprint.
+TEX_FIXERS = [
+    "clean_pandocbounded",
+    "fix_math_delimiters",
+    "strip_empty_enumerate",
+    "ensure_cjk_in_tex",
+    "ensure_unicode_mappings",
+]
+PANDOC_ARGS = [
+    "-f", "gfm", "-t", "latex", "--standalone",
+    "-V", "documentclass=article", "-V", "geometry:margin=2cm",
+    "-V", "mainfont=SimSun", "-V", "CJKmainfont=SimSun", "-V", "mathfont=XITS Math",
+]
+LUA_FILTER = REPO / "scripts" / "filters" / "unicode_to_tex.lua"
+# Markdown passes applied to worksheet.md by the fix_md stage (scripts/md_passes.py "worksheet"
+# preset without the split, which runs as its own stage on the same buffer).
+MD_FIXERS = [
+    "normalize_md_question_titles",
+    "insert_linebreaks_before_solutions",
+    "rewrite_image_links",
+]
+
+
+def pipeline_sources(fmt: str, use_mineru: bool) -> list[Path]:
+    """src/pipeline.py and the src modules it imports, directly or transitively.
+
+    Only these are fingerprinted for the pipeline stage, so editing pandoc-side modules
+    (passes, image_derivatives, ...) does not rerun OCR/MinerU. tex_scan only affects the
+    pipeline's own worksheet.tex and image_store only the MinerU branch, so they count only then.
+    """
+    skip = set()
+    if fmt not in ("tex", "both"):
+        skip.add("tex_scan")
+    if not use_mineru:
+        skip.add("image_store")
+    src = REPO / "src"
+    seen: dict[str, Path] = {}
+    todo = ["pipeline"]
+    while todo:
+        name = todo.pop()
+        path = src / f"{name}.py"
+        if name in seen or name in skip or not path.exists():
+            continue
+        seen[name] = path
+        for node in ast.walk(ast.parse(path.read_bytes())):
+            if isinstance(node, ast.ImportFrom) and node.level == 1:
+                # `from .x import y` names module x; `from . import x, y` names x and y
+                todo.extend([node.module] if node.module else [a.name for a in node.names])
+    return sorted(seen.values())
+
+
+def fix_pandoc_tex(tex: str) -> str:
+    from scripts.tex_passes import manager
+
+    pm = manager(TEX_FIXERS)
+    tex = pm.run(tex)
+    print(pm.report())
+    return tex
+
+
+def do_pandoc_export(md: Path, out_dir: Path, emit_snippet: bool = False, derive: bool = True) -> Path | None:
     out_tex = out_dir / "worksheet_pandoc.tex"
-    out_pdf = out_dir / "worksheet_pandoc.pdf"
 
-    if not shutil.which("pandoc"):
+    if not which("pandoc"):
         print("[WARN] pandoc not found; skipping LaTeX/PDF export.")
-        return
+        return None
 
-    script_dir = Path(__file__).resolve().parent
-    lua_filter = script_dir / "filters" / "unicode_to_tex.lua"
-
-    # 1) Markdown -> LaTeX
-    run([
-        "pandoc",
-        str(md),
-        "-o",
-        str(out_tex),
-        "-f",
-        "gfm",
-        "-t",
-        "latex",
-        "--standalone",
-        "--lua-filter", str(lua_filter),
-        "-V",
-        "documentclass=article",
-        "-V",
-        "geometry:margin=2cm",
-    ])
-
-    # 2) Clean pandoc-bounded wrappers (pure Python to avoid shell encodings)
-    # 2) Minimal post-processing only: remove pandocbounded wrapper
-    run([sys.executable, "-m", "scripts.clean_pandocbounded", str(out_tex)])
-    # 3) Final cleanup: ensuremath/braces/control-chars, remove stray $$ in CJK lines
-    run([sys.executable, "-m", "scripts.cleanup_tex_artifacts", str(out_tex)])
-
-    # 4) Try PDF via XeLaTeX if available; else leave TeX as-is
-    if shutil.which("xelatex"):
-        if out_pdf.exists():
-            try:
-                out_pdf.unlink()
-            except Exception:
-                pass
-        run(["xelatex", "-interaction=nonstopmode", "worksheet_pandoc.tex"], cwd=out_dir, check=False)
-    else:
-        print("[INFO] xelatex not found; skipping PDF build. TeX is ready.")
+    # 1) Markdown -> LaTeX (the lua filter is optional, as in pandoc_export.bat)
+    cmd = ["pandoc", str(md), "-o", str(out_tex), *PANDOC_ARGS]
+    if LUA_FILTER.exists():
+        cmd += ["--lua-filter", str(LUA_FILTER)]
+    run(cmd)
+
+    # 2) Post-process the generated TeX in memory; one read, one write
+    tex = out_tex.read_text(encoding="utf-8")
+    fixed = fix_pandoc_tex(tex)
+    if derive:
+        # Point \includegraphics at cached, size-bounded derivatives (originals stay in qs_image_DB)
+        from src import image_derivatives as deriv
+        fixed, stats = deriv.rewrite_tex(fixed, out_dir)
+        print(f"[derive] {deriv.summary(stats)}")
+    if fixed != tex:
+        out_tex.write_text(fixed, encoding="utf-8")
 
+    if emit_snippet:
+        make_snippet(out_tex, out_dir)
     return out_tex
 
 
+def do_xelatex(out_dir: Path) -> None:
+    out_pdf = out_dir / "worksheet_pandoc.pdf"
+    if not which("xelatex"):
+        print("[INFO] xelatex not found; skipping PDF build. TeX is ready.")
+        return
+    if out_pdf.exists():
+        try:
+            out_pdf.unlink()
+        except Exception:
+            pass
+    run(["xelatex", "-interaction=nonstopmode", "worksheet_pandoc.tex"], cwd=out_dir, check=False)
+
+
 def make_snippet(tex_path: Path, out_dir: Path) -> Path:
     """Create a snippet TeX without preamble and without \begin/\end{document}."""
     s = tex_path.read_text(encoding="utf-8", errors="ignore")
@@ -88,6 +150,164 @@ def make_snippet(tex_path: Path, out_dir: Path) -> Path:
     return out
 
 
+def build_graph(args: argparse.Namespace) -> StageGraph:
+    """Declare the full worksheet flow (same steps as run_mineru_auto.bat) as a stage graph.
+
+    Every stage lists its inputs (including the scripts that implement it) and outputs;
+    StageGraph skips a stage when neither changed since its last successful run.
+    All Python steps run in this process and pass worksheet.md text along in memory;
+    only MinerU (inside the pipeline), pandoc and xelatex are external processes.
+    """
+    from scripts.batch_v1_v2_to_latex import CONVERTER_FILES, convert_text, list_sources, output_path
+    from scripts.split_md_to_parts import _detect_doc_name
+    from src import image_derivatives as deriv
+
+    images_dir = (REPO / args.images_dir).resolve()
+    out_dir = (REPO / args.out_dir).resolve()
+    md = out_dir / "worksheet.md"
+    tex = out_dir / "worksheet.tex"
+    pandoc_tex = out_dir / "worksheet_pandoc.tex"
+    qs_db = REPO / "qs_DB"
+    scripts = REPO / "scripts"
+    g = StageGraph(out_dir / ".stage_state.json", REPO)
+    # LaTeX outputs link to size/DPI-bounded image derivatives (src/image_derivatives.py)
+    derive = not args.no_derive_images
+    derive_code = [REPO / "src" / "image_derivatives.py"] if derive else []
+    derive_params = deriv.params() if derive else None
+    texts: dict[str, str] = {}  # worksheet.md text handed from fix_md to split
+
+    def pipeline() -> None:
+        from src import pipeline as pl
+        argv = ["--images_dir", str(images_dir), "--out_dir", str(out_dir), "--format", args.format]
+        if args.use_mineru:
+            argv.append("--use_mineru")
+        # A failure must propagate: StageGraph records fingerprints only for stages that return,
+        # so the pipeline stays stale and is retried instead of passing the old worksheet.md on
+        before = md.stat().st_mtime_ns if md.exists() else None
+        pl.main(argv)
+        if not md.exists() or md.stat().st_mtime_ns == before:
+            raise RuntimeError(f"pipeline wrote no {md.name}; check that {images_dir} holds images or PDFs")
+
+    g.add(Stage(
+        "pipeline", pipeline,
+        inputs=[images_dir, *pipeline_sources(args.format, args.use_mineru)],
+        outputs=[md] + ([tex] if args.format in ("tex", "both") else []),
+        params={"format": args.format, "use_mineru": args.use_mineru},
+    ))
+
+    # normalize / insert-breaks / link-fix are passes over one in-memory worksheet.md buffer
+    # (scripts/md_passes.py); they form a single stage because they rewrite worksheet.md in place,
+    # so one fingerprint taken after the last edit stays valid on the next run.
+    def fix_md() -> None:
+        from scripts import md_passes
+        from scripts import sync_qs_image_db_and_fix_links as sync
+
+        copied, docs = sync.sync_mineru_tmp_to_db(REPO, out_dir / "_mineru_tmp")
+        removed = sync.cleanup_non_image_in_db(REPO, docs)
+        idx = sync.build_filename_index(REPO / "qs_image_DB")
+        original = md.read_text(encoding="utf-8")
+        pm = md_passes.manager(MD_FIXERS, md, index=idx)
+        text = pm.run(original)
+        print(pm.report())
+        if text != original:
+            md.write_text(text, encoding="utf-8")
+        texts["md"] = text
+        tex_changed = False
+        if tex.exists():
+            t = tex.read_text(encoding="utf-8")
+            new_t = md_passes.rewrite_image_links(t, idx, tex.parent)
+            if derive:
+                # Done here rather than in a later stage: worksheet.tex is an input of this stage
+                new_t, stats = deriv.rewrite_tex(new_t, tex.parent)
+                print(f"[derive] worksheet.tex {deriv.summary(stats)}")
+            if new_t != t:
+                tex.write_text(new_t, encoding="utf-8")
+                tex_changed = True
+        print(f"[sync] stored {copied} new images in qs_image_DB, removed {removed} non-images")
+        print(f"[links] md_changed={text != original} tex_changed={tex_changed}")
+
+    g.add(Stage(
+        "fix_md", fix_md, deps=["pipeline"],
+        # The qs_image_DB index changes whenever images are stored/registered; no need to walk the DB
+        inputs=lambda: [md, tex, REPO / "qs_image_DB" / "_index.sqlite",
+                        *(out_dir / "_mineru_tmp").rglob("auto/images"),
+                        scripts / "md_passes.py", REPO / "src" / "passes.py",
+                        scripts / "normalize_md_question_titles.py", REPO / "src" / "question_grammar.py",
+                        scripts / "insert_linebreaks_before_solutions.py",
+                        scripts / "sync_qs_image_db_and_fix_links.py", *derive_code],
+        outputs=lambda: [md, *deriv.derived_refs(tex)],
+        params={"derive": derive_params},
+    ))
+
+    def split() -> None:
+        from scripts import md_passes
+
+        # Split is the last pass of the same preset; it reuses the buffer fix_md left in memory
+        written: list[Path] = []
+        pm = md_passes.manager(["split_md_to_parts"], md, out_root=qs_db, written=written)
+        pm.run(texts.get("md") or md.read_text(encoding="utf-8"))
+        print(pm.report())
+        print(f"[split-md] wrote {len(written)} parts into {qs_db / _detect_doc_name(REPO)}")
+
+    g.add(Stage(
+        "split", split,
+        deps=["fix_md"],
+        inputs=[md, scripts / "split_md_to_parts.py", scripts / "md_passes.py",
+                REPO / "src" / "question_grammar.py"],
+        outputs=lambda: [qs_db / _detect_doc_name(REPO)],
+    ))
+
+    def v1v2_parts() -> list[Stage]:
+        code = CONVERTER_FILES
+
+        def convert(src: Path):
+            def _run() -> None:
+                output_path(src).write_text(convert_text(src.read_text(encoding="utf-8")), encoding="utf-8")
+            return _run
+
+        return [
+            Stage(src.relative_to(qs_db).as_posix(), convert(src), inputs=[src, *code], outputs=[output_path(src)])
+            for src in list_sources(qs_db)
+        ]
+
+    g.add(Stage("v1v2", deps=["split"], expand=v1v2_parts))
+
+    def latex_parts() -> list[Path]:
+        return [p for p in (output_path(src) for src in list_sources(qs_db)) if p.exists()]
+
+    def derive_images() -> None:
+        # All qs_DB parts in one pass, so their images share one process pool
+        files = latex_parts()
+        stats, changed = deriv.rewrite_tex_paths(files)
+        print(f"[derive] {deriv.summary(stats)} files_changed={changed}/{len(files)}")
+
+    if derive:
+        # Links are rewritten in place; the derivatives they point at are the outputs, so clearing
+        # .cache/derived (or changing the target DPI/quality) reruns the stage
+        g.add(Stage(
+            "derive", derive_images, deps=["v1v2"],
+            inputs=lambda: [*latex_parts(), *derive_code],
+            outputs=lambda: [r for p in latex_parts() for r in deriv.derived_refs(p)],
+            params=derive_params,
+        ))
+
+    g.add(Stage(
+        "pandoc", lambda: do_pandoc_export(md, out_dir, emit_snippet=args.emit_snippet, derive=derive),
+        deps=["fix_md"],
+        inputs=[md, LUA_FILTER, scripts / "tex_passes.py", REPO / "src" / "passes.py", REPO / "src" / "tex_scan.py",
+                *(scripts / f"{m}.py" for m in TEX_FIXERS), *derive_code],
+        outputs=lambda: [pandoc_tex, *deriv.derived_refs(pandoc_tex)],
+        params={"pandoc_args": PANDOC_ARGS, "fixers": TEX_FIXERS, "emit_snippet": args.emit_snippet,
+                "derive": derive_params},
+    ))
+    g.add(Stage(
+        "xelatex", lambda: do_xelatex(out_dir), deps=["pandoc"],
+        inputs=[pandoc_tex],
+        outputs=[out_dir / "worksheet_pandoc.pdf"],
+    ))
+    return g
+
+
 def main() -> None:
     ap = argparse.ArgumentParser(description="Cross-platform runner for worksheet2mdlatex pipeline")
     ap.add_argument("--images_dir", default="images")
@@ -95,50 +315,21 @@ def main() -> None:
     ap.add_argument("--use_mineru", action="store_true")
     ap.add_argument("--format", default="both", choices=["md", "tex", "both"])
     ap.add_argument("--emit_snippet", action="store_true", help="Also write outputs/worksheet_snippet.tex without preamble and document env")
+    ap.add_argument("--force", action="append", default=[], metavar="STAGE",
+                    help="rerun STAGE even if up to date (repeatable; 'all' reruns everything)")
+    ap.add_argument("--no_derive_images", action="store_true",
+                    help="keep links to the original images instead of size-bounded derivatives for LaTeX/PDF")
+    ap.add_argument("--dry_run", action="store_true", help="only print which stages are out of date")
+    ap.add_argument("--only", action="append", default=[], metavar="STAGE",
+                    help="run only STAGE and its upstream stages (repeatable)")
     args = ap.parse_args()
 
-    repo = Path(__file__).resolve().parents[1]
-    images_dir = (repo / args.images_dir).resolve()
-    out_dir = (repo / args.out_dir).resolve()
-    ensure_dir(out_dir)
-
-    # 1) Run pipeline
-    print("[INFO] Running pipeline ...")
-    pl_cmd = [
-        sys.executable,
-        "-m",
-        "src.pipeline",
-        "--images_dir",
-        str(images_dir),
-        "--out_dir",
-        str(out_dir),
-        "--format",
-        args.format,
-    ]
-    if args.use_mineru:
-        pl_cmd.append("--use_mineru")
-    run(pl_cmd, cwd=repo)
-
-    # 2) Sync image DB and fix links
-    print("[INFO] Sync qs_image_DB and fix links ...")
-    run([sys.executable, "-m", "scripts.sync_qs_image_db_and_fix_links"], cwd=repo)
-
-    # 3) Regenerate pandoc TeX/PDF from corrected Markdown
-    md_path = out_dir / "worksheet.md"
-    if md_path.exists():
-        print("[INFO] Export via Pandoc based on corrected Markdown ...")
-        do_pandoc_export(md_path, out_dir, emit_snippet=args.emit_snippet)
-    else:
-        print("[WARN] outputs/worksheet.md not found; skip pandoc export.")
-
+    # The helper scripts resolve qs_DB/, qs_image_DB/ and outputs/ relative to the repo root
+    os.chdir(REPO)
+    ensure_dir((REPO / args.out_dir).resolve())
+    build_graph(args).run(targets=args.only or None, force=args.force, dry_run=args.dry_run)
     print("[DONE] See outputs/ for results.")
 
 
 if __name__ == "__main__":
     main()
-
-
-
-
-
-
@@ -61,26 +61,19 @@ if %errorlevel% neq 0 (
     )
 )
 
-REM Step 6.5: Normalize question titles (merge number + stem into one line)
-echo [INFO] Normalizing question titles in outputs\worksheet.md ...
-python -m scripts.normalize_md_question_titles || goto :fail
-
-REM Step 6.6: Insert linebreaks before '??:' / '??<n>:'
-echo [INFO] Inserting linebreaks before ??/??<n> ...
-python -m scripts.insert_linebreaks_before_solutions || goto :fail
-
-REM Step 7: Sync image DB and fix links
-echo [INFO] Sync images to qs_image_DB and fix links ...
-python -m scripts.sync_qs_image_db_and_fix_links || goto :fail
-
-REM Step 7.5: Split worksheet.md into parts for later processing
-echo [INFO] Splitting worksheet.md into qs_DB parts ...
-python -m scripts.split_md_to_parts || goto :fail
+REM Step 6.5-7.5: Normalize titles, insert linebreaks, sync image DB + fix links, split into qs_DB
+REM (one read/write of outputs\worksheet.md via the Markdown pass manager)
+echo [INFO] Fixing outputs\worksheet.md and splitting into qs_DB parts ...
+python -m scripts.md_passes || goto :fail
 
 REM Step 7.6: Run v1 + v2 on qs_DB/*.md to produce .latex per question
 echo [INFO] Converting qs_DB/*.md to .latex via v1+v2 ...
 python -m scripts.batch_v1_v2_to_latex || goto :fail
 
+REM Step 7.7: Point worksheet.tex and qs_DB/*.latex at cached, size-bounded image derivatives
+echo [INFO] Linking size-bounded image derivatives ...
+python -m scripts.derive_images outputs\worksheet.tex qs_DB || goto :fail
+
 REM Step 8: Regenerate Pandoc TeX/PDF after link fix
 echo [INFO] Regenerating Pandoc TeX/PDF from corrected worksheet.md ...
 call scripts\pandoc_export.bat
@@ -4,18 +4,13 @@ import sys
 from pathlib import Path
 
 
-LABEL_PATTERN = re.compile(
-    r"(?m)^\s*(?:>\s*)*"
-    r"("  # captured label text
-    r"(?:"
-    r"\d+[．.]|\d+[)]|"                      # 1. / 1) / 1．
-    r"【例\d+】|【练习\d+】|【变式\d*-*\d*】|"  # 【例1】/【练习1】/【变式1-1】
-    r"例\d+|练习\d+|变式\d+|"
-    r"【答案】|【解析】|【详解】|【参考答案】|"
-    r"答案[:：]?|解析[:：]?|详解[:：]?|解法\s*(?:\d+|[一二三四五六七八九十]+)\s*[:：]?|参考答案[:：]?"
-    r")"
-    r")\s*"
-)
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from src.question_grammar import PART_KINDS, scan  # noqa: E402
+
+# Parts start at question / variant / answer / analysis / solution heads (not at （1） sub-questions)
 
 
 def _sanitize_filename_part(s: str) -> str:
@@ -57,18 +52,21 @@ def _detect_doc_name(repo_root: Path) -> str:
 
 
 def split_md(md_path: Path, out_root: Path, doc_name: str) -> list[Path]:
-    text = md_path.read_text(encoding="utf-8")
-    matches = list(LABEL_PATTERN.finditer(text))
-    if not matches:
+    return split_text(md_path.read_text(encoding="utf-8"), out_root, doc_name)
+
+
+def split_text(text: str, out_root: Path, doc_name: str) -> list[Path]:
+    heads = [t for t in scan(text) if t.kind in PART_KINDS]
+    if not heads:
         return []
-    starts = [m.start() for m in matches] + [len(text)]
+    starts = [t.start for t in heads] + [len(text)]
     spans = [(starts[i], starts[i + 1]) for i in range(len(starts) - 1)]
 
     out_dir = out_root / doc_name
     out_dir.mkdir(parents=True, exist_ok=True)
     written: list[Path] = []
     for i, (a, b) in enumerate(spans):
-        label_raw = matches[i].group(1) if i < len(matches) else f"part{i+1}"
+        label_raw = heads[i].label
         label = _sanitize_filename_part(label_raw)
         chunk = text[a:b].lstrip("\n")
         chunk = _adjust_image_links_for_depth(chunk, depth_delta=1)
@@ -1,125 +1,135 @@
 from __future__ import annotations
+import argparse
 import os
 import re
-import shutil
+import sys
 from pathlib import Path
+from typing import Iterable
 
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
 
-def ensure_dir(p: Path) -> None:
-    p.mkdir(parents=True, exist_ok=True)
+from src import linkcopy  # noqa: E402
+from src.image_store import IMAGE_EXTS, ImageStore, tree_signature  # noqa: E402
 
 
-def sync_mineru_tmp_to_db(repo_root: Path) -> int:
-    """Copy only MinerU `auto/images` files into repo_root/qs_image_DB with flattened layout:
-    qs_image_DB/<doc_name>/<image_name>.
-    Returns number of files copied (best-effort)."""
-    src_root = repo_root / "outputs" / "_mineru_tmp"
-    dst_root = repo_root / "qs_image_DB"
-    ensure_dir(dst_root)
+def mineru_docs(src_root: Path) -> list[str]:
+    """Document folders under _mineru_tmp (one level; `_shards` and other `_` folders are skipped)."""
     if not src_root.exists():
-        return 0
-    exts = {".jpg", ".jpeg", ".png", ".bmp"}
-    copied = 0
-    # Find all auto/images folders and copy image files only
-    for images_dir in src_root.rglob("auto/images"):
-        if not images_dir.is_dir():
+        return []
+    return sorted(d.name for d in src_root.iterdir() if d.is_dir() and not d.name.startswith("_"))
+
+
+def sync_mineru_tmp_to_db(repo_root: Path, src_root: Path | None = None) -> tuple[int, list[str]]:
+    """Store MinerU `auto/images` files in the content-addressed qs_image_DB (src/image_store.py):
+    one blob per distinct image under qs_image_DB/_blobs/, plus a name map per document
+    (doc_name = first path element under `src_root`).
+    A document whose images match the signature recorded in the index is skipped without hashing.
+    `src_root` defaults to repo_root/outputs/_mineru_tmp.
+    Returns (number of new blobs written, documents whose images changed)."""
+    src_root = src_root or (repo_root / "outputs" / "_mineru_tmp")
+    docs = mineru_docs(src_root)
+    if not docs:
+        return 0, []
+    store = ImageStore(repo_root / "qs_image_DB")
+    added = 0
+    changed: list[str] = []
+    for doc in docs:
+        image_dirs = sorted(d for d in (src_root / doc).rglob("auto/images") if d.is_dir())
+        sig = ";".join(tree_signature(d) for d in image_dirs)
+        if store.source_sig(doc) == sig:
             continue
-        # Determine doc_name as the first path element under _mineru_tmp
-        try:
-            rel_from_root = images_dir.relative_to(src_root)
-            parts = rel_from_root.parts
-            if not parts:
-                continue
-            doc_name = parts[0]
-        except Exception:
-            continue
-        doc_dst = dst_root / doc_name
-        ensure_dir(doc_dst)
-        for src in images_dir.rglob("*"):
-            if src.is_file() and src.suffix.lower() in exts:
-                dst = doc_dst / src.name
-                if not dst.exists():
-                    try:
-                        shutil.copy2(src, dst)
-                        copied += 1
-                    except Exception:
-                        pass
-    return copied
-
-
-def cleanup_non_image_in_db(repo_root: Path) -> int:
-    """Remove non-image files under qs_image_DB to keep DB image-only, and flatten legacy layout.
-    Also migrates legacy qs_image_DB/<doc>/<doc>/auto/images/*.jpg to qs_image_DB/<doc>/*.jpg.
-    Returns number of files removed (non-images) + migrated (counted separately)."""
+        for d in image_dirs:
+            added += store.add_tree(doc, d)
+        store.set_source_sig(doc, sig)
+        changed.append(doc)
+    store.close()
+    return added, changed
+
+
+def cleanup_non_image_in_db(repo_root: Path, docs: Iterable[str] | None = None) -> int:
+    """Remove non-image files under qs_image_DB/<doc>/ and migrate the legacy layout, for `docs` only
+    (the documents changed in this run); docs=None sweeps every document folder.
+    Legacy qs_image_DB/<doc>/<doc>/auto/images/*.jpg (the old per-page mirror) is moved into the
+    blob store under <doc>; flat qs_image_DB/<doc>/*.jpg files are left alone so old links keep working.
+    Returns number of non-image files removed."""
     db_root = repo_root / "qs_image_DB"
     if not db_root.exists():
         return 0
-    exts = {".jpg", ".jpeg", ".png", ".bmp"}
+    if docs is None:
+        docs = [d.name for d in db_root.iterdir() if d.is_dir() and not d.name.startswith("_")]
+    targets = [db_root / d for d in docs if (db_root / d).is_dir()]
+    if not targets:
+        return 0
+    store = ImageStore(db_root)
     removed = 0
-    # Migrate legacy deep images into flat layout, then remove originals
-    for p in list(db_root.rglob("auto/images/*")):
-        if p.is_file() and p.suffix.lower() in exts:
-            try:
-                rel = p.relative_to(db_root)
-                parts = rel.parts
-                if not parts:
-                    continue
-                doc_name = parts[0]
-                dst = db_root / doc_name / p.name
-                ensure_dir(dst.parent)
-                if not dst.exists():
-                    shutil.copy2(p, dst)
-                # delete original deep file
+    for doc_dir in targets:
+        # Migrate legacy deep images into the store (renamed into place, no copy)
+        for images in list(doc_dir.rglob("auto/images")):
+            if images.is_dir():
+                store.add_tree(doc_dir.name, images, move=True)
+        # Remove non-images and prune empty directories inside this document only
+        for p in doc_dir.rglob("*"):
+            if p.is_file() and p.suffix.lower() not in IMAGE_EXTS:
                 try:
                     p.unlink()
+                    removed += 1
                 except Exception:
                     pass
-            except Exception:
-                pass
-    # Remove non-images anywhere under db_root
-    for p in db_root.rglob("*"):
-        if p.is_file() and p.suffix.lower() not in exts:
+        for d in sorted([x for x in doc_dir.rglob("*") if x.is_dir()], key=lambda x: len(x.as_posix().split('/')), reverse=True):
             try:
-                p.unlink()
-                removed += 1
+                if not any(d.iterdir()):
+                    d.rmdir()
             except Exception:
                 pass
-    # Prune empty directories
-    for d in sorted([x for x in db_root.rglob("*") if x.is_dir()], key=lambda x: len(x.as_posix().split('/')), reverse=True):
         try:
-            if not any(d.iterdir()):
-                d.rmdir()
+            if not any(doc_dir.iterdir()):
+                doc_dir.rmdir()
         except Exception:
             pass
+    store.refresh_legacy(d.name for d in targets)
+    store.close()
     return removed
 
 
 def build_filename_index(db_root: Path) -> dict[str, Path]:
-    idx: dict[str, Path] = {}
+    """Link index from the qs_image_DB index (no directory walk): "<doc>/<name>", unambiguous "<name>",
+    blob file names, and legacy flat qs_image_DB/<doc>/<name> files where the store has no entry."""
     if not db_root.exists():
-        return idx
-    exts = {".jpg", ".jpeg", ".png", ".bmp"}
-    for p in db_root.rglob("*"):
-        if p.is_file() and p.suffix.lower() in exts:
-            idx[p.name] = p
+        return {}
+    store = ImageStore(db_root)
+    idx = store.index()
+    store.close()
     return idx
 
 
+def _lookup(name_to_path: dict[str, Path], url: str) -> Path | None:
+    # Prefer "<dir>/<name>" for any directory on the link path (the doc name sits somewhere in
+    # qs_image_DB/<doc>/x.jpg or _mineru_tmp/<doc>/auto/images/x.jpg), then the bare file name.
+    segs = [s for s in url.replace("\\", "/").split("/") if s and s not in (".", "..")]
+    fname = segs[-1] if segs else url
+    for d in reversed(segs[:-1]):
+        p = name_to_path.get(f"{d}/{fname}")
+        if p:
+            return p
+    return name_to_path.get(fname)
+
+
 def rewrite_links_in_text(text: str, name_to_path: dict[str, Path], base_dir: Path, repo_root: Path) -> str:
     # Rewrite any markdown image link whose basename is known in DB to the DB-relative path
     # Allow spaces in the URL inside parentheses (common in doc names) and rebuild with
     # angle brackets around URL when it contains spaces or non-ASCII for broader preview support.
     # Note: this simple pattern does not parse optional titles.
     pattern = re.compile(r"!\[([^\]]*)\]\(([^)]+)\)")
-    exts = {".jpg", ".jpeg", ".png", ".bmp"}
 
     def repl(m: re.Match) -> str:
         alt = m.group(1)
         old_path = m.group(2)
         fname = os.path.basename(old_path)
-        if os.path.splitext(fname)[1].lower() not in exts:
+        if os.path.splitext(fname)[1].lower() not in IMAGE_EXTS:
             return m.group(0)
-        p = name_to_path.get(fname)
+        p = _lookup(name_to_path, old_path.strip("<> "))
         if not p:
             return m.group(0)
         rel = os.path.relpath(str(p), str(base_dir)).replace("\\", "/")
@@ -161,12 +171,24 @@ def fix_outputs(repo_root: Path) -> dict:
 
 
 def main() -> None:
+    ap = argparse.ArgumentParser(description="Store MinerU images in qs_image_DB and fix image links in outputs/")
+    ap.add_argument("--full", action="store_true", help="clean/migrate every document folder, not just the changed ones")
+    ap.add_argument("--rebuild-index", action="store_true", help="rebuild qs_image_DB/_index.sqlite from disk first")
+    ap.add_argument("--link-mode", default=linkcopy.MODE, choices=["auto", *linkcopy.MODES],
+                    help="how images are placed into the store (auto: reflink, then hardlink, then copy)")
+    args = ap.parse_args()
+    linkcopy.configure(args.link_mode)
     repo_root = Path(__file__).resolve().parents[1]
-    copied = sync_mineru_tmp_to_db(repo_root)
-    removed = cleanup_non_image_in_db(repo_root)
+    if args.rebuild_index:
+        store = ImageStore(repo_root / "qs_image_DB")
+        store.rebuild()
+        store.close()
+    copied, docs = sync_mineru_tmp_to_db(repo_root)
+    removed = cleanup_non_image_in_db(repo_root, None if args.full else docs)
     changed = fix_outputs(repo_root)
-    print(f"[sync] copied {copied} images into qs_image_DB, removed {removed} non-images")
+    print(f"[sync] stored {copied} new images in qs_image_DB, removed {removed} non-images")
     print(f"[links] md_changed={changed['md']} tex_changed={changed['tex']}")
+    print(f"[link-mode] {linkcopy.summary()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""TeX post-processing passes: one read, every registered fixer in memory, one write.
+
+Each fixer script (clean_pandocbounded, fix_math_delimiters, ...) keeps its own CLI;
+here their text-level functions are registered as passes of a PassManager
+(src/passes.py), so a document is loaded once and written once however many
+fixers run on it. Pass names are the script names.
+
+    python -m scripts.tex_passes outputs/worksheet_pandoc.tex            # pandoc preset
+    python -m scripts.tex_passes qs_DB --passes fix_math_backslashes,fix_angle_patterns_in_tex
+    python -m scripts.tex_passes qs_DB --pattern '**/*.latex' --workers 4
+"""
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import os
+import sys
+
+REPO = Path(__file__).resolve().parents[1]
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+from src.passes import PassManager, PassRegistry  # noqa: E402
+from scripts.clean_pandocbounded import clean_text  # noqa: E402
+from scripts.cleanup_tex_artifacts import clean as cleanup_artifacts  # noqa: E402
+from scripts.comment_preamble import comment_preamble_text  # noqa: E402
+from scripts.ensure_cjk_in_tex import ensure_cjk_text  # noqa: E402
+from scripts.ensure_unicode_mappings import ensure_mappings_text  # noqa: E402
+from scripts.fix_angle_patterns_in_tex import fix_tex as fix_angle_patterns  # noqa: E402
+from scripts.fix_math_backslashes import fix_tex as fix_math_backslashes  # noqa: E402
+from scripts.fix_math_delimiters import replace_math_delimiters  # noqa: E402
+from scripts.strip_empty_enumerate import strip as strip_empty_enumerate  # noqa: E402
+
+
+def ensure_unicode_mappings(tex: str) -> str:
+    return ensure_mappings_text(tex)[0]
+
+
+TEX_PASSES = PassRegistry()
+TEX_PASSES.register("clean_pandocbounded", clean_text, "unwrap \\pandocbounded{...}")
+TEX_PASSES.register("cleanup_tex_artifacts", cleanup_artifacts, "control chars, \\ensuremath, escaped braces")
+TEX_PASSES.register("fix_math_backslashes", fix_math_backslashes, "\\\\cmd -> \\cmd inside math")
+TEX_PASSES.register("fix_math_delimiters", replace_math_delimiters, "\\( \\) \\[ \\] -> $ / $$")
+TEX_PASSES.register("fix_angle_patterns_in_tex", fix_angle_patterns, "∠A, △ABC, 30° -> math")
+TEX_PASSES.register("strip_empty_enumerate", strip_empty_enumerate, "drop enumerate blocks with one empty item")
+TEX_PASSES.register("ensure_cjk_in_tex", ensure_cjk_text, "inject xeCJK + font fallbacks")
+TEX_PASSES.register("ensure_unicode_mappings", ensure_unicode_mappings, "newunicodechar for △ and ∠")
+TEX_PASSES.register("comment_preamble", comment_preamble_text, "comment out everything before \\begin{document}")
+
+# What pandoc_export.bat / run_auto apply to worksheet_pandoc.tex, in that order
+PRESETS = {
+    "pandoc": [
+        "clean_pandocbounded",
+        "fix_math_delimiters",
+        "strip_empty_enumerate",
+        "ensure_cjk_in_tex",
+        "ensure_unicode_mappings",
+    ],
+}
+
+
+def manager(names: list[str] | None = None, preset: str = "pandoc") -> PassManager:
+    return TEX_PASSES.manager(names or PRESETS[preset])
+
+
+def collect(targets: list[str], pattern: str) -> list[Path]:
+    files: list[Path] = []
+    for t in targets:
+        p = Path(t)
+        files.extend(sorted(p.glob(pattern)) if p.is_dir() else [p])
+    return files
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Run TeX fixers over files in one read/write each")
+    ap.add_argument("targets", nargs="*", default=["outputs/worksheet_pandoc.tex"], help="files or directories")
+    ap.add_argument("--pattern", default="**/*.latex", help="glob used inside directory targets")
+    ap.add_argument("--preset", default="pandoc", choices=sorted(PRESETS))
+    ap.add_argument("--passes", default="", help="comma-separated pass names (overrides --preset)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--list", action="store_true", help="list registered passes and exit")
+    args = ap.parse_args()
+
+    if args.list:
+        for name in TEX_PASSES.names():
+            print(f"{name:<28}{TEX_PASSES.get(name).doc}")
+        return 0
+    names = [n.strip() for n in args.passes.split(",") if n.strip()] or None
+    try:
+        pm = manager(names, args.preset)
+    except KeyError as e:
+        print(e.args[0])
+        return 2
+    files = collect(args.targets, args.pattern)
+    missing = [f for f in files if not f.is_file()]
+    for f in missing:
+        print(f"not found: {f}")
+    files = [f for f in files if f.is_file()]
+    if not files:
+        return 1
+
+    changed, failed = pm.run_batch(files, workers=args.workers)
+    for f in changed:
+        print(f"[ok] {f}")
+    for f, err in failed:
+        print(f"[fail] {f}: {err}")
+    print(pm.report())
+    print(f"[tex-passes] files={len(files)} changed={len(changed)} failed={len(failed)}")
+    return 2 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,18 +1,18 @@
 import re
 import sys
 
+# 目标 Unicode 符号列表
+TARGET_SYMBOLS = r'∠°△∥⊥Ωαβγδ√θπ≌ΣΩΔ±×÷⋅≠≤≥≈≡√∞→←↔⇒⇐'
+
+# 合法的数学表达式字符
+VALID_MATH_CHARS = r'a-zA-Z0-9\s=+\-.,()\[\]{}' + TARGET_SYMBOLS
+
 def wrap_unicode_math(content):
     """
     Splits the text by '$', '\(', and '\)' delimiters and processes the parts.
     Text outside of all math blocks will be scanned for unicode math symbols,
     which are then wrapped in '$'.
     """
-    
-    # 目标 Unicode 符号列表
-    TARGET_SYMBOLS = r'∠°△∥⊥Ωαβγδ√θπ≌ΣΩΔ±×÷⋅≠≤≥≈≡√∞→←↔⇒⇐'
-    
-    # 合法的数学表达式字符
-    VALID_MATH_CHARS = r'a-zA-Z0-9\s=+\-.,()\[\]{}' + TARGET_SYMBOLS
 
     # 查找由合法字符组成，且至少包含一个目标符号的字符串
     wrapper_regex = re.compile(
@@ -79,6 +79,24 @@ def convert_images_to_latex(content):
     return image_regex.sub(replacement, content)
 
 
+# 这个正则表达式同时查找 $...$ 和 \(...\)
+# 捕获组 2: $...$ 的内容
+# 捕获组 4: \(...\) 的内容
+MATH_REGEX = re.compile(
+    r'(\$(.*?)\$)|' +  # 匹配 $...$
+    r'(\\\(\s*(.*?)\s*\\\))' # 匹配 \(...\)
+)
+
+
+def convert(content):
+    """
+    v2 的完整转换：清理数学内容中的 Unicode，再把 Markdown 图片转为 \\includegraphics
+    """
+    # 使用 re.sub 和回调函数一次性替换所有
+    final_content = MATH_REGEX.sub(replacer_callback, content)
+    return convert_images_to_latex(final_content)
+
+
 def replacer_callback(match):
     """
     这个回调函数会被 re.sub() 调用
@@ -115,17 +133,7 @@ def main():
             
         print(f"--- Reading file: {input_filename}")
         
-        # 这个正则表达式同时查找 $...$ 和 \(...\)
-        # 捕获组 2: $...$ 的内容
-        # 捕获组 4: \(...\) 的内容
-        math_regex = re.compile(
-            r'(\$(.*?)\$)|' +  # 匹配 $...$
-            r'(\\\(\s*(.*?)\s*\\\))' # 匹配 \(...\)
-        )
-        
-        # 使用 re.sub 和回调函数一次性替换所有
-        final_content = math_regex.sub(replacer_callback, content)
-        final_content = convert_images_to_latex(final_content)
+        final_content = convert(content)
         
         with open(output_filename, 'w', encoding='utf-8') as f:
             f.write(final_content)
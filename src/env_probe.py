@@ -0,0 +1,147 @@
+"""
+env_probe.py
+------------
+运行环境能力探测与持久缓存：
+1) 统一探测 MinerU 版本、GPU 类型、pandoc/xelatex 可执行文件位置；
+2) 结果写入仓库下 `.cache/env_probe.json`，重复运行直接读取，不再启动
+   `python -m mineru --version`（会导入 MinerU 全套依赖）或 `lspci | grep` 之类的子进程；
+3) 缓存键由解释器路径/版本、相关包版本（只读元数据）、相关可执行文件的路径与 mtime 组成，
+   任一变化（换 venv、升级包、重装 pandoc 等）都会自动失效重探。
+
+命令行：`python -m src.env_probe [--refresh]` 打印当前探测结果。
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+import hashlib
+import json
+import os
+import platform
+import shutil
+import sys
+import threading
+
+CACHE_PATH = Path(os.getenv("W2M_CACHE_DIR") or (Path(__file__).resolve().parents[1] / ".cache")) / "env_probe.json"
+
+# 参与缓存键的包与可执行文件
+_KEY_PACKAGES = ["mineru", "torch", "paddleocr", "paddlepaddle"]
+_KEY_BINARIES = ["mineru", "pandoc", "xelatex", "lspci", "nvidia-smi", "wmic"]
+
+_lock = threading.Lock()
+_memo: Optional[Dict[str, Any]] = None
+
+
+def _pkg_version(name: str) -> str:
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return ""
+
+
+def _binary_stamp(name: str) -> Optional[list]:
+    path = shutil.which(name)
+    if not path:
+        return None
+    try:
+        return [path, os.stat(path).st_mtime_ns]
+    except OSError:
+        return [path, 0]
+
+
+def environment_key() -> str:
+    """当前环境指纹：解释器、包版本、可执行文件路径与 mtime 的哈希。"""
+    raw = {
+        "python": sys.executable,
+        "python_version": sys.version,
+        "platform": platform.platform(),
+        "packages": {p: _pkg_version(p) for p in _KEY_PACKAGES},
+        "binaries": {b: _binary_stamp(b) for b in _KEY_BINARIES},
+    }
+    return hashlib.sha256(json.dumps(raw, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _probe_mineru_version() -> str:
+    from .mineru_helper import MinerUHelper
+    return MinerUHelper._probe_version()
+
+
+def _probe_gpu() -> str:
+    from .utils import _detect_gpu_type_uncached
+    return _detect_gpu_type_uncached()
+
+
+PROBES: Dict[str, Callable[[], Any]] = {
+    "mineru_version": _probe_mineru_version,
+    "gpu": _probe_gpu,
+    "pandoc": lambda: shutil.which("pandoc"),
+    "xelatex": lambda: shutil.which("xelatex"),
+}
+
+
+def _load() -> Dict[str, Any]:
+    """读取磁盘缓存；键不匹配（环境变化）时返回空记录。调用方已持锁。"""
+    global _memo
+    if _memo is not None:
+        return _memo
+    key = environment_key()
+    data: Dict[str, Any] = {"key": key, "values": {}}
+    try:
+        disk = json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+        if disk.get("key") == key and isinstance(disk.get("values"), dict):
+            data = disk
+    except Exception:
+        pass
+    _memo = data
+    return data
+
+
+def _save(data: Dict[str, Any]) -> None:
+    try:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, CACHE_PATH)
+    except Exception as e:
+        print(f"[WARN] 写入环境探测缓存失败: {e}")
+
+
+def get(name: str) -> Any:
+    """获取某项能力；命中缓存直接返回，否则只探测这一项并写回缓存。"""
+    with _lock:
+        data = _load()
+        if name in data["values"]:
+            return data["values"][name]
+        value = PROBES[name]()
+        data["values"][name] = value
+        _save(data)
+        return value
+
+
+def which(binary: str) -> Optional[str]:
+    """缓存版 `shutil.which`（仅限 PROBES 中登记的可执行文件）。"""
+    return get(binary) if binary in PROBES else shutil.which(binary)
+
+
+def refresh() -> Dict[str, Any]:
+    """丢弃缓存并重新探测全部能力。"""
+    global _memo
+    with _lock:
+        _memo = {"key": environment_key(), "values": {}}
+    return {name: get(name) for name in PROBES}
+
+
+def main() -> int:
+    import argparse
+    ap = argparse.ArgumentParser(description="探测并缓存运行环境能力")
+    ap.add_argument("--refresh", action="store_true", help="忽略缓存重新探测")
+    args = ap.parse_args()
+    values = refresh() if args.refresh else {name: get(name) for name in PROBES}
+    for k, v in values.items():
+        print(f"{k}: {v}")
+    print(f"[cache] {CACHE_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -49,26 +49,49 @@ def render_md_item(q: Dict[str, Any], img_rel: str, latex: str = None) -> str:
     return "\n".join(s)
 
 
-def export_markdown(
-    questions: List[Dict[str, Any]],
-    img_paths: List[Path],
-    latex_list,
-    out_dir: Path,
-) -> Path:
-    """批量生成 `worksheet.md` 文件。"""
-    out_md = out_dir / "worksheet.md"
-    lines = [MD_HEADER]
-    out_dir_resolved = out_dir.resolve()
-    for (q, img, latex) in zip(questions, img_paths, latex_list):
+class MarkdownWriter:
+    """流式写出 `worksheet.md`：逐题追加并刷新，输出与 `export_markdown` 完全一致。
+
+    用法：
+    `with MarkdownWriter(out_dir) as w: w.write(q, img, latex)`
+    """
+
+    def __init__(self, out_dir: Path) -> None:
+        self.out_dir = out_dir
+        self.path = out_dir / "worksheet.md"
+        self._out_dir_resolved = out_dir.resolve()
+        self._f = None
+
+    def __enter__(self) -> "MarkdownWriter":
+        self._f = open(self.path, "w", encoding="utf-8")
+        self._f.write(MD_HEADER)
+        return self
+
+    def write(self, q: Dict[str, Any], img, latex: str = None) -> None:
         rel_str = ""
         if img:
             try:
                 # Prefer a path relative to the output directory
-                rel_path = Path(img).resolve().relative_to(out_dir_resolved)
+                rel_path = Path(img).resolve().relative_to(self._out_dir_resolved)
                 rel_str = rel_path.as_posix()
             except Exception:
                 # Fallback to os.path.relpath in case img is on a different drive
-                rel_str = os.path.relpath(str(img), str(out_dir)).replace("\\", "/")
-        lines.append(render_md_item(q, rel_str, latex))
-    out_md.write_text("\n".join(lines), encoding="utf-8")
-    return out_md
+                rel_str = os.path.relpath(str(img), str(self.out_dir)).replace("\\", "/")
+        self._f.write("\n" + render_md_item(q, rel_str, latex))
+        self._f.flush()
+
+    def __exit__(self, *exc) -> None:
+        self._f.close()
+
+
+def export_markdown(
+    questions: List[Dict[str, Any]],
+    img_paths: List[Path],
+    latex_list,
+    out_dir: Path,
+) -> Path:
+    """批量生成 `worksheet.md` 文件。"""
+    with MarkdownWriter(out_dir) as w:
+        for (q, img, latex) in zip(questions, img_paths, latex_list):
+            w.write(q, img, latex)
+    return w.path
@@ -88,6 +88,44 @@ def render_tex_item(q: Dict[str, Any], img_rel: str, latex: str = None) -> str:
     return "\n".join(s)
 
 
+class LatexWriter:
+    """流式写出 `worksheet.tex`：先写模板前半部分，逐题追加并刷新，关闭时写入模板结尾。
+
+    输出与 `export_latex` 完全一致。用法：`with LatexWriter(out_dir) as w: w.write(q, img, latex)`
+    """
+
+    def __init__(self, out_dir: Path) -> None:
+        self.out_dir = out_dir
+        self.path = out_dir / "worksheet.tex"
+        self._out_dir_resolved = out_dir.resolve()
+        self._prefix, self._suffix = TEX_TPL.split("%__QUESTIONS__", 1)
+        self._first = True
+        self._f = None
+
+    def __enter__(self) -> "LatexWriter":
+        self._f = open(self.path, "w", encoding="utf-8")
+        self._f.write(self._prefix)
+        return self
+
+    def write(self, q: Dict[str, Any], img, latex: str = None) -> None:
+        rel_str = ""
+        if img:
+            try:
+                rel_path = Path(img).resolve().relative_to(self._out_dir_resolved)
+                rel_str = rel_path.as_posix()
+            except Exception:
+                rel_str = os.path.relpath(str(img), str(self.out_dir)).replace("\\", "/")
+        if not self._first:
+            self._f.write("\n\n")
+        self._first = False
+        self._f.write(render_tex_item(q, rel_str, latex))
+        self._f.flush()
+
+    def __exit__(self, *exc) -> None:
+        self._f.write(self._suffix)
+        self._f.close()
+
+
 def export_latex(
     questions: List[Dict[str, Any]],
     img_paths: List[Path],
@@ -97,20 +135,7 @@ def export_latex(
     """鎵归噺瀵煎嚭 LaTeX 鏂囦欢 `worksheet.tex`銆?
     - 閫愰璋冪敤 `render_tex_item` 鐢熸垚鍧楋紝鎻掑叆鍒版ā鏉?`%__QUESTIONS__` 鍗犱綅绗︺€?    - 鍥剧墖璺緞浼樺厛浣跨敤棰樺共鍐?Markdown 鍥剧墖锛涜嫢鍚屾椂鎻愪緵 `img_paths`锛屼篃浼氶澶栨彃鍏ヤ唬琛ㄥ浘銆?    """
 
-    out_tex = out_dir / "worksheet.tex"
-    blocks: list[str] = []
-    out_dir_resolved = out_dir.resolve()
-    for (q, img, latex) in zip(questions, img_paths, latex_list):
-        rel_str = ""
-        if img:
-            try:
-                rel_path = Path(img).resolve().relative_to(out_dir_resolved)
-                rel_str = rel_path.as_posix()
-            except Exception:
-                rel_str = os.path.relpath(str(img), str(out_dir)).replace("\\", "/")
-        blocks.append(render_tex_item(q, rel_str, latex))
-    tex = TEX_TPL.replace("%__QUESTIONS__", "\n\n".join(blocks))
-    out_tex.write_text(tex, encoding="utf-8")
-    return out_tex
-
-
+    with LatexWriter(out_dir) as w:
+        for (q, img, latex) in zip(questions, img_paths, latex_list):
+            w.write(q, img, latex)
+    return w.path
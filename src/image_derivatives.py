@@ -0,0 +1,318 @@
+"""
+image_derivatives.py
+--------------------
+LaTeX/PDF 用的图片派生件（按版面缩小的副本）：
+1) 讲义中的图片统一按 `0.75\\textwidth` 排版（A4、2cm 页边距时约 5 英寸宽）；派生件宽度上限为
+   该宽度 × `DPI`，高度上限为其 2 倍（约一页版心高），按 EXIF 方向转正并写入 DPI 元数据；
+   JPG 仍输出 JPG（质量 `QUALITY`），PNG/BMP 输出 PNG；
+2) 派生件按“原图内容 SHA-256 + 目标参数”缓存：`.cache/derived/<前两位>/<原图哈希>_<参数哈希><扩展名>`
+   （`W2M_CACHE_DIR` 可改缓存根目录）；参数不变时重跑直接命中，改参数只会生成新文件；
+3) 文件名本身可逆：整个缓存目录被删除后，已改写为派生件的链接仍能按原图哈希在
+   `qs_image_DB/_blobs` 中找回原图重新生成；题图库之外的原图由索引 `.cache/derived/_index.sqlite`
+   记录（同时缓存其哈希，按大小、mtime 复用），索引也丢失时该链接计为 failed 并告警；
+4) 未命中的图片用进程池并发缩放；原图本就不超过上限且无需转正时直接沿用原图；
+5) `rewrite_tex()` / `rewrite_tex_files()` 把 `\\includegraphics` 链接改写为派生件的相对路径，
+   原图仍留在 `qs_image_DB`；Pillow 不可用时保持原链接不变。
+
+配置：`configure()` 或环境变量 `W2M_DERIVE_DPI`（默认 300）、`W2M_DERIVE_QUALITY`（默认 85）、
+`W2M_DERIVE_WORKERS`（默认 CPU 核数）。
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+from .image_store import BLOBS, IMAGE_EXTS
+from .utils import ensure_dir, file_sha256
+
+LAYOUT_WIDTH_IN = 0.75 * (210 - 2 * 20) / 25.4  # 0.75\textwidth：A4 宽 210mm，左右页边距各 2cm
+DPI = int(os.getenv("W2M_DERIVE_DPI") or 300)
+QUALITY = int(os.getenv("W2M_DERIVE_QUALITY") or 85)
+WORKERS = int(os.getenv("W2M_DERIVE_WORKERS") or os.cpu_count() or 2)
+CACHE_DIR = Path(os.getenv("W2M_CACHE_DIR") or (Path(__file__).resolve().parents[1] / ".cache")) / "derived"
+BLOB_DIR = Path(__file__).resolve().parents[1] / "qs_image_DB" / BLOBS
+INDEX = "_index.sqlite"
+VERSION = 1  # 缩放/编码方式变化时递增，使旧派生件失效
+
+_INCLUDE = re.compile(r"(\\includegraphics\s*(?:\[[^\]]*\])?\s*\{)([^{}]+)(\})")
+_SHA = re.compile(r"[0-9a-f]{64}")
+_DERIVED = re.compile(r"([0-9a-f]{64})_[0-9a-f]{16}")
+_STATS = ("cached", "new", "original", "failed")
+_ROTATED = {5, 6, 7, 8}  # EXIF 方向：转正后宽高互换
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS derived (
+    key  TEXT PRIMARY KEY,
+    src  TEXT NOT NULL,
+    out  TEXT NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS derived_out ON derived(out);
+CREATE TABLE IF NOT EXISTS digests (
+    path  TEXT PRIMARY KEY,
+    size  INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    sha   TEXT NOT NULL
+);
+"""
+
+
+def configure(dpi: int = None, quality: int = None, workers: int = None) -> None:
+    """设置派生件的目标 DPI、JPEG 质量与并发进程数。"""
+    global DPI, QUALITY, WORKERS
+    if dpi is not None:
+        DPI = max(72, int(dpi))
+    if quality is not None:
+        QUALITY = min(95, max(30, int(quality)))
+    if workers is not None:
+        WORKERS = max(1, int(workers))
+
+
+def params() -> Dict[str, int]:
+    """当前目标参数（参与缓存键）。"""
+    max_w = int(round(LAYOUT_WIDTH_IN * DPI))
+    return {"max_w": max_w, "max_h": 2 * max_w, "dpi": DPI, "quality": QUALITY, "v": VERSION}
+
+
+def _make(src: str, dst: str, p: Dict[str, int]) -> bool:
+    """生成一张派生件；原图不超过上限且无需转正时不写文件并返回 False。"""
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as im:
+        orient = im.getexif().get(0x0112, 1)
+        w, h = (im.height, im.width) if orient in _ROTATED else (im.width, im.height)
+        if orient in (0, 1) and w <= p["max_w"] and h <= p["max_h"]:
+            return False
+        jpeg = Path(dst).suffix == ".jpg"
+        if jpeg:
+            # JPEG 解码时直接按 1/2、1/4、1/8 缩小，大照片不必完整解码
+            im.draft(im.mode, (p["max_h"], p["max_w"]) if orient in _ROTATED else (p["max_w"], p["max_h"]))
+        out = ImageOps.exif_transpose(im) if orient not in (0, 1) else im.copy()
+    out.thumbnail((p["max_w"], p["max_h"]), Image.LANCZOS)
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    if jpeg:
+        if out.mode not in ("RGB", "L"):
+            out = out.convert("RGB")
+        out.save(tmp, "JPEG", quality=p["quality"], optimize=True, dpi=(p["dpi"], p["dpi"]))
+    else:
+        out.save(tmp, "PNG", optimize=True, dpi=(p["dpi"], p["dpi"]))
+    os.replace(tmp, dst)
+    return True
+
+
+def _job(args: Tuple[str, str, Dict[str, int]]) -> Tuple[bool, Optional[str]]:
+    """进程池任务：返回 (是否写出了派生件, 错误信息)。"""
+    src, dst, p = args
+    try:
+        ensure_dir(Path(dst).parent)
+        return _make(src, dst, p), None
+    except Exception as e:
+        return False, str(e)
+
+
+class _Index:
+    """派生件索引（只在主进程中使用）。"""
+
+    def __init__(self, root: Path) -> None:
+        ensure_dir(root)
+        self.root = Path(root).resolve()
+        self.conn = sqlite3.connect(str(root / INDEX))
+        self.conn.executescript(_SCHEMA)
+
+    def digest(self, p: Path) -> str:
+        """原图内容哈希：题图库 blob 直接取文件名，其余按 (大小, mtime) 复用上次的结果。"""
+        if p.parent.parent.name == BLOBS and _SHA.fullmatch(p.stem):
+            return p.stem
+        st = p.stat()
+        row = self.conn.execute("SELECT size, mtime, sha FROM digests WHERE path=?", (str(p),)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        sha = file_sha256(p)
+        self.conn.execute("INSERT OR REPLACE INTO digests(path, size, mtime, sha) VALUES (?,?,?,?)",
+                          (str(p), st.st_size, st.st_mtime_ns, sha))
+        return sha
+
+    def source(self, p: Path) -> Optional[Path]:
+        """链接指向的原图：派生件先查索引，再按文件名中的原图哈希找题图库 blob（都找不到返回 None）；
+        其他路径原样返回。"""
+        try:
+            rel = p.relative_to(self.root).as_posix()
+        except ValueError:
+            return p
+        row = self.conn.execute("SELECT src FROM derived WHERE out=?", (rel,)).fetchone()
+        if row and Path(row[0]).is_file():
+            return Path(row[0])
+        m = _DERIVED.fullmatch(p.stem)
+        if m:
+            sha = m.group(1)
+            for blob in sorted((BLOB_DIR / sha[:2]).glob(f"{sha}.*")):
+                if blob.suffix.lower() in IMAGE_EXTS:
+                    return blob
+        return None
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT out FROM derived WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, src: Path, out: str) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO derived(key, src, out, used) VALUES (?,?,?,?)",
+                          (key, str(src), out, time.time()))
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+
+def derive_many(paths: Iterable[Path], workers: Optional[int] = None) -> Tuple[Dict[Path, Path], Dict[str, int]]:
+    """为一批图片取得派生件（命中缓存或进程池并发生成）。
+
+    返回：({链接解析出的路径: 应改链到的文件}, {"cached"/"new"/"original"/"failed": 数量})；
+    “original”表示原图本身已满足上限，沿用原图。Pillow 不可用时返回空映射。
+    """
+    stats = dict.fromkeys(_STATS, 0)
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("[WARN] 未安装 Pillow，不生成图片派生件，保留原图链接")
+        return {}, stats
+    p = params()
+    tag = hashlib.sha256(json.dumps(p, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    idx = _Index(CACHE_DIR)
+    root = idx.root
+    result: Dict[Path, Path] = {}
+    jobs: Dict[str, Tuple[Path, str, List[Path]]] = {}
+    try:
+        for path in dict.fromkeys(paths):
+            src = idx.source(path)
+            if src is None or not src.is_file():
+                # 派生件与其记录都已丢失、题图库中也没有原图：链接无法修复
+                stats["failed"] += 1
+                print(f"[WARN] 找不到派生件对应的原图，链接保持不变：{path}")
+                continue
+            key = f"{idx.digest(src)}_{tag}"
+            out = idx.get(key)
+            if out is not None and (out == "" or (root / out).exists()):
+                result[path] = root / out if out else src
+                idx.put(key, src, out)
+                stats["cached"] += 1
+                continue
+            if key in jobs:
+                jobs[key][2].append(path)
+                continue
+            ext = ".jpg" if src.suffix.lower() in (".jpg", ".jpeg") else ".png"
+            jobs[key] = (src, f"{key[:2]}/{key}{ext}", [path])  # 文件名可逆：<原图哈希>_<参数哈希>
+
+        items = list(jobs.items())
+        args = [(str(src), str(root / rel), p) for _, (src, rel, _) in items]
+        n = max(1, min(workers or WORKERS, len(items)))
+        if n > 1:
+            with ProcessPoolExecutor(max_workers=n) as ex:
+                outs = list(ex.map(_job, args))
+        else:
+            outs = [_job(a) for a in args]
+        for (key, (src, rel, targets)), (made, err) in zip(items, outs):
+            if err:
+                stats["failed"] += 1
+                print(f"[WARN] 图片派生件生成失败 {src}: {err}")
+                continue
+            idx.put(key, src, rel if made else "")
+            stats["new" if made else "original"] += 1
+            for t in targets:
+                result[t] = root / rel if made else src
+    finally:
+        idx.close()
+    return result, stats
+
+
+def _resolve(link: str, base: Path) -> Optional[Path]:
+    link = link.strip()
+    if Path(link).suffix.lower() not in IMAGE_EXTS:
+        return None
+    p = (Path(link) if os.path.isabs(link) else base / link).resolve()
+    # 派生件即使已被清理也要交给 derive_many，由索引找回原图重新生成
+    return p if p.is_file() or CACHE_DIR.resolve() in p.parents else None
+
+
+def _rel(p: Path, base: Path) -> str:
+    try:
+        return os.path.relpath(str(p), str(base)).replace("\\", "/")
+    except ValueError:  # Windows 下不同盘符
+        return p.as_posix()
+
+
+def rewrite_tex_files(items: List[Tuple[str, Path]], workers: Optional[int] = None) -> Tuple[List[str], Dict[str, int]]:
+    """批量改写多份 TeX 文本（每项为 (文本, 链接相对的目录)），全部图片共用一个进程池。
+
+    返回：(改写后的文本列表, 统计)。
+    """
+    refs: List[Dict[str, Path]] = []
+    for text, base in items:
+        base = Path(base).resolve()
+        found = {}
+        for m in _INCLUDE.finditer(text):
+            p = _resolve(m.group(2), base)
+            if p is not None:
+                found[m.group(2)] = p
+        refs.append(found)
+    wanted = [p for found in refs for p in found.values()]
+    if not wanted:
+        return [t for t, _ in items], dict.fromkeys(_STATS, 0)
+    mapping, stats = derive_many(wanted, workers)
+
+    out: List[str] = []
+    for (text, base), found in zip(items, refs):
+        base = Path(base).resolve()
+
+        def repl(m: re.Match) -> str:
+            new = mapping.get(found.get(m.group(2)))
+            if new is None or new == found[m.group(2)]:
+                return m.group(0)
+            return f"{m.group(1)}{_rel(new, base)}{m.group(3)}"
+
+        out.append(_INCLUDE.sub(repl, text))
+    return out, stats
+
+
+def rewrite_tex(text: str, base_dir: Path, workers: Optional[int] = None) -> Tuple[str, Dict[str, int]]:
+    """把 TeX 文本中的图片链接（相对 `base_dir`）改写为派生件；返回 (新文本, 统计)。"""
+    texts, stats = rewrite_tex_files([(text, base_dir)], workers)
+    return texts[0], stats
+
+
+def rewrite_tex_paths(files: Iterable[Path], workers: Optional[int] = None) -> Tuple[Dict[str, int], int]:
+    """就地改写多个 TeX 文件的图片链接（链接相对各自所在目录）；返回 (统计, 改动的文件数)。"""
+    files = [Path(f) for f in files]
+    texts = [f.read_text(encoding="utf-8") for f in files]
+    new_texts, stats = rewrite_tex_files([(t, f.parent) for t, f in zip(texts, files)], workers)
+    changed = 0
+    for f, old, new in zip(files, texts, new_texts):
+        if new != old:
+            f.write_text(new, encoding="utf-8")
+            changed += 1
+    return stats, changed
+
+
+def derived_refs(tex_path: Path) -> List[Path]:
+    """TeX 文件中指向派生件缓存的图片路径（供阶段图判断派生件是否仍在）。"""
+    tex_path = Path(tex_path)
+    if not tex_path.exists():
+        return []
+    base = tex_path.parent.resolve()
+    root = CACHE_DIR.resolve()
+    refs = []
+    for m in _INCLUDE.finditer(tex_path.read_text(encoding="utf-8", errors="ignore")):
+        link = m.group(2).strip()
+        p = Path(os.path.normpath(link if os.path.isabs(link) else base / link))
+        if root in p.parents:
+            refs.append(p)
+    return refs
+
+
+def summary(stats: Dict[str, int]) -> str:
+    return " ".join(f"{k}={v}" for k, v in stats.items())
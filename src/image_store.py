@@ -0,0 +1,288 @@
+"""
+image_store.py
+--------------
+按内容寻址的题图库（`qs_image_DB`）：
+1) 每张图片按内容 SHA-256 只存一份：`qs_image_DB/_blobs/<前两位>/<sha256><扩展名>`，
+   无论被多少份讲义、多少个页面引用；
+2) 每个文档一张名字表（原图名 → blob），不同文档中的同名图片互不覆盖，链接改写按“文档/图名”查找；
+3) blob、名字表、旧版平铺图片（`qs_image_DB/<文档名>/*.jpg`）与各文档来源签名都记在持久索引
+   `qs_image_DB/_index.sqlite` 中，入库时增量更新；“是否已入库”、链接索引、文档列表都是查询，
+   不再遍历整个图库。索引不存在（或 `rebuild()`）时才完整扫描一次磁盘；
+4) blob 先放到临时名再 `os.replace`，多线程并发入库同一张图也不会留下半截文件；放置按 `linkcopy`
+   的策略（reflink → hardlink → copy）进行，迁移旧目录时直接改名；索引改动在 `flush()` 时提交。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import linkcopy
+from .utils import ensure_dir, file_sha256
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
+BLOBS = "_blobs"
+NAMES = "_names"  # 旧版 JSON 名字表目录，重建索引时导入后删除
+INDEX = "_index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    rel   TEXT PRIMARY KEY,
+    size  INTEGER NOT NULL,
+    added REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS names (
+    doc  TEXT NOT NULL,
+    name TEXT NOT NULL,
+    rel  TEXT NOT NULL,
+    PRIMARY KEY (doc, name)
+);
+CREATE TABLE IF NOT EXISTS legacy (
+    doc  TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (doc, name)
+);
+CREATE TABLE IF NOT EXISTS sources (
+    doc     TEXT PRIMARY KEY,
+    sig     TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def tree_signature(folder: Path) -> str:
+    """目录下图片的 (相对路径, 大小, 修改时间) 签名；用来判断某文档的来源图片自上次入库后是否变化。"""
+    rows = []
+    for p in sorted(Path(folder).rglob("*")):
+        if p.is_file() and p.suffix.lower() in IMAGE_EXTS:
+            st = p.stat()
+            rows.append(f"{p.relative_to(folder).as_posix()}|{st.st_size}|{st.st_mtime_ns}")
+    return hashlib.sha256("\n".join(rows).encode("utf-8")).hexdigest()
+
+
+class ImageStore:
+    """`qs_image_DB` 的内容寻址存储。
+
+    - root: 图库根目录；blob 位于 `root/_blobs`，索引为 `root/_index.sqlite`；
+    - stats: {"added": 新写入的 blob 数, "deduped": 命中已有 blob 的入库次数}；
+    - touched: 本次运行中登记过图片的文档（清理/迁移只需处理这些文档）。
+
+    线程安全：内部共用一个连接并加锁，可在线程池中调用。
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self.blob_dir = self.root / BLOBS
+        ensure_dir(self.root)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / INDEX), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._blobs: Optional[Set[str]] = None
+        self.stats = {"added": 0, "deduped": 0}
+        self.touched: Set[str] = set()
+        if self._conn.execute("SELECT 1 FROM meta WHERE key='built'").fetchone() is None:
+            self.rebuild()
+
+    # ---- 索引重建（唯一的整库扫描） ----
+    def rebuild(self) -> None:
+        """按磁盘内容重建索引：扫描 `_blobs`、导入旧版 `_names/*.json`、登记旧版平铺图片。"""
+        with self._lock:
+            c = self._conn
+            c.execute("DELETE FROM blobs"); c.execute("DELETE FROM legacy")
+            now = time.time()
+            if self.blob_dir.exists():
+                c.executemany(
+                    "INSERT OR REPLACE INTO blobs(rel, size, added) VALUES (?,?,?)",
+                    [(f"{p.parent.name}/{p.name}", p.stat().st_size, now)
+                     for p in self.blob_dir.glob("*/*") if p.suffix.lower() in IMAGE_EXTS],
+                )
+            names_dir = self.root / NAMES
+            if names_dir.exists():
+                for f in names_dir.glob("*.json"):
+                    try:
+                        m = json.loads(f.read_text(encoding="utf-8"))
+                        c.executemany("INSERT OR REPLACE INTO names(doc, name, rel) VALUES (?,?,?)",
+                                      [(f.stem, n, r) for n, r in m.items()])
+                        f.unlink()
+                    except Exception:
+                        pass
+                try:
+                    names_dir.rmdir()
+                except Exception:
+                    pass
+            for d in self.root.iterdir():
+                if d.is_dir() and not d.name.startswith("_"):
+                    self._index_legacy(d.name)
+            c.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('built', ?)", (str(now),))
+            c.commit()
+            self._blobs = None
+
+    def _index_legacy(self, doc: str) -> None:
+        """重新登记 `root/<doc>/` 下的旧版平铺图片（调用方已持锁）。"""
+        self._conn.execute("DELETE FROM legacy WHERE doc=?", (doc,))
+        d = self.root / doc
+        if d.is_dir():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO legacy(doc, name) VALUES (?,?)",
+                [(doc, p.name) for p in d.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_EXTS],
+            )
+
+    def refresh_legacy(self, docs: Iterable[str]) -> None:
+        """清理/迁移改动了 `root/<doc>/` 之后，只重新登记这些文档的旧版平铺图片。"""
+        with self._lock:
+            for doc in docs:
+                self._index_legacy(doc)
+            self._conn.commit()
+
+    # ---- blobs ----
+    def _known(self) -> Set[str]:
+        if self._blobs is None:
+            self._blobs = {r for (r,) in self._conn.execute("SELECT rel FROM blobs")}
+        return self._blobs
+
+    def blob_path(self, rel: str) -> Path:
+        return self.blob_dir / rel
+
+    def _put(self, src: Path, dst: Path, move: bool) -> None:
+        """写入 blob：`move` 时直接改名（同一文件系统内零拷贝），否则按 `linkcopy` 策略
+        （reflink → hardlink → copy）放到临时名再替换。"""
+        ensure_dir(dst.parent)
+        if move:
+            try:
+                os.replace(src, dst)
+                return
+            except OSError:
+                pass
+        tmp = dst.with_name(f".{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        linkcopy.place(src, tmp, durable=True)
+        os.replace(tmp, dst)
+        if move:
+            src.unlink(missing_ok=True)
+
+    def add(self, src: Path, doc: Optional[str] = None, name: Optional[str] = None, move: bool = False) -> Path:
+        """入库一张图片，返回其 blob 路径；给出 `doc` 时同时登记到该文档的名字表（默认图名为文件名）。
+
+        - move: 入库后源文件不再需要（如迁移旧版目录）；新内容直接改名为 blob，已有内容则删除源文件。
+        """
+        src = Path(src)
+        size = src.stat().st_size
+        digest = file_sha256(src)
+        rel = f"{digest[:2]}/{digest}{src.suffix.lower()}"
+        with self._lock:
+            known = self._known()
+            fresh = rel not in known
+            known.add(rel)  # 先占位：并发入库同一内容时只有一个线程复制
+            if not fresh:
+                self.stats["deduped"] += 1
+        if fresh:
+            try:
+                self._put(src, self.blob_path(rel), move)
+            except Exception:
+                with self._lock:
+                    known.discard(rel)
+                raise
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO blobs(rel, size, added) VALUES (?,?,?)",
+                                   (rel, size, time.time()))
+                self.stats["added"] += 1
+        elif move:
+            src.unlink(missing_ok=True)
+        if doc:
+            self.register(doc, name or src.name, rel)
+        return self.blob_path(rel)
+
+    def add_tree(self, doc: str, folder: Path, move: bool = False) -> int:
+        """把 `folder` 下（递归）全部图片入库到文档 `doc`（线程池并发哈希与放置）；返回新写入的 blob 数。"""
+        before = self.stats["added"]
+        files = [p for p in sorted(Path(folder).rglob("*")) if p.is_file() and p.suffix.lower() in IMAGE_EXTS]
+
+        def _one(p: Path) -> None:
+            try:
+                self.add(p, doc, move=move)
+            except Exception as e:
+                print(f"[WARN] 图片入库失败 {p}: {e}")
+
+        if len(files) > 1 and linkcopy.WORKERS > 1:
+            with ThreadPoolExecutor(max_workers=min(linkcopy.WORKERS, len(files))) as ex:
+                list(ex.map(_one, files))
+        else:
+            for p in files:
+                _one(p)
+        return self.stats["added"] - before
+
+    # ---- 名字表 / 来源签名 ----
+    def register(self, doc: str, name: str, rel: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO names(doc, name, rel) VALUES (?,?,?)", (doc, name, rel))
+            self.touched.add(doc)
+
+    def lookup(self, doc: str, name: str) -> Optional[Path]:
+        """文档 `doc` 中名为 `name` 的图片的 blob 路径；未登记返回 None。"""
+        with self._lock:
+            row = self._conn.execute("SELECT rel FROM names WHERE doc=? AND name=?", (doc, name)).fetchone()
+        return self.blob_path(row[0]) if row else None
+
+    def docs(self) -> List[str]:
+        with self._lock:
+            return [d for (d,) in self._conn.execute("SELECT DISTINCT doc FROM names ORDER BY doc")]
+
+    def source_sig(self, doc: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT sig FROM sources WHERE doc=?", (doc,)).fetchone()
+        return row[0] if row else None
+
+    def set_source_sig(self, doc: str, sig: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sources(doc, sig, updated) VALUES (?,?,?)",
+                               (doc, sig, time.time()))
+
+    def flush(self) -> None:
+        """提交索引改动。"""
+        with self._lock:
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self) -> "ImageStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def index(self) -> Dict[str, Path]:
+        """链接改写用的索引（全部来自索引查询）：
+        - `文档/图名` → blob；`图名` → blob（仅当各文档中该名字指向同一内容时）；
+        - blob 自身的文件名 → blob；
+        - 旧版平铺图片：`文档/图名`、`图名` → `root/<文档>/<图名>`（仅在上述键不存在时）。
+        """
+        with self._lock:
+            names = self._conn.execute("SELECT doc, name, rel FROM names").fetchall()
+            rels = [r for (r,) in self._conn.execute("SELECT rel FROM blobs")]
+            legacy = self._conn.execute("SELECT doc, name FROM legacy").fetchall()
+        idx: Dict[str, Path] = {}
+        by_name: Dict[str, Set[str]] = {}
+        for doc, name, rel in names:
+            idx[f"{doc}/{name}"] = self.blob_path(rel)
+            by_name.setdefault(name, set()).add(rel)
+        for name, found in by_name.items():
+            if len(found) == 1:
+                idx[name] = self.blob_path(next(iter(found)))
+        for rel in rels:
+            idx.setdefault(rel.split("/", 1)[1], self.blob_path(rel))
+        for doc, name in legacy:
+            p = self.root / doc / name
+            idx.setdefault(f"{doc}/{name}", p)
+            idx.setdefault(name, p)
+        return idx
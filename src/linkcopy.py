@@ -0,0 +1,145 @@
+"""
+linkcopy.py
+-----------
+零拷贝的文件放置策略：把文件“放到”另一个路径时依次尝试
+1) reflink：写时复制克隆（Linux `FICLONE`，btrfs/XFS 等支持），共享数据块但两边互不影响；
+2) hardlink：同一文件系统内的硬链接，不占额外空间；
+3) symlink：指向源文件绝对路径的符号链接（源文件须长期存在，`durable=True` 时跳过）；
+4) copy：`shutil.copy2`。
+按（源所在设备, 目标所在设备）记住第一次成功的策略，同一对文件系统之后直接使用，不再逐个试探；
+`configure()` 或环境变量 `W2M_LINK_MODE`（auto/reflink/hardlink/symlink/copy）可固定策略，
+固定的策略失败时退回 copy；固定为 symlink 时，`durable=True` 的放置仍改用 hardlink → copy。`place_many()` 用线程池并发放置大量文件。
+
+注意：hardlink 与源文件共享同一 inode，源文件若被“原地改写”（而不是删除后重建），目标也会随之改变。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import shutil
+import threading
+
+MODES = ("reflink", "hardlink", "symlink", "copy")
+MODE = os.getenv("W2M_LINK_MODE") or "auto"
+WORKERS = int(os.getenv("W2M_LINK_WORKERS") or 8)
+
+_FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+_lock = threading.Lock()
+_chosen: Dict[Tuple[int, int, bool], str] = {}
+_counts: Dict[str, int] = {m: 0 for m in MODES}
+
+
+def configure(mode: Optional[str] = None, workers: Optional[int] = None) -> None:
+    """固定放置策略（auto 表示按文件系统自动选择）与 `place_many` 的线程数。"""
+    global MODE, WORKERS
+    if mode is not None:
+        if mode != "auto" and mode not in MODES:
+            raise ValueError(f"unknown link mode: {mode} (auto, {', '.join(MODES)})")
+        MODE = mode
+        with _lock:
+            _chosen.clear()
+    if workers is not None:
+        WORKERS = max(1, int(workers))
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflink needs fcntl (Linux)") from None
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+    except OSError:
+        dst.unlink(missing_ok=True)
+        raise
+    shutil.copystat(src, dst)
+
+
+def _hardlink(src: Path, dst: Path) -> None:
+    os.link(src, dst)
+
+
+def _symlink(src: Path, dst: Path) -> None:
+    os.symlink(src.resolve(), dst)
+
+
+def _copy(src: Path, dst: Path) -> None:
+    shutil.copy2(src, dst)
+
+
+_IMPL = {"reflink": _reflink, "hardlink": _hardlink, "symlink": _symlink, "copy": _copy}
+
+
+def _candidates(durable: bool) -> List[str]:
+    if MODE != "auto":
+        if durable and MODE == "symlink":
+            # 固定 symlink 时，持久目标（题图库 blob）仍不能指向临时源文件，改用 hardlink/copy
+            return ["hardlink", "copy"]
+        return [MODE] if MODE == "copy" else [MODE, "copy"]
+    return [m for m in MODES if not (durable and m == "symlink")]
+
+
+def place(src: Path, dst: Path, durable: bool = False) -> str:
+    """把 `src` 放到 `dst`（`dst` 不应已存在），返回实际使用的策略名。
+
+    - durable: 目标须在源文件删除后仍然有效（如题图库 blob），此时不使用 symlink（固定为 symlink 时改用 hardlink → copy）。
+    """
+    src, dst = Path(src), Path(dst)
+    key = (os.stat(src).st_dev, os.stat(dst.parent).st_dev, durable)
+    with _lock:
+        known = _chosen.get(key)
+    modes = _candidates(durable)
+    if known in modes:
+        modes = [known] + [m for m in modes if m != known]
+    err: Optional[Exception] = None
+    for m in modes:
+        try:
+            _IMPL[m](src, dst)
+        except OSError as e:
+            err = e
+            continue
+        with _lock:
+            _chosen.setdefault(key, m)
+            _counts[m] += 1
+        return m
+    raise err or OSError(f"cannot place {src} -> {dst}")
+
+
+def place_many(pairs: Iterable[Tuple[Path, Path]], durable: bool = False, workers: Optional[int] = None,
+               skip_existing: bool = True) -> Tuple[Dict[str, int], List[Tuple[Path, str]]]:
+    """线程池并发放置多个文件。
+
+    返回：({策略名: 文件数}, [(失败的源文件, 错误信息)])；`skip_existing` 时已存在的目标计为 "exists"。
+    """
+    def _one(pair: Tuple[Path, Path]):
+        src, dst = pair
+        if skip_existing and os.path.lexists(dst):
+            return src, "exists", None
+        try:
+            return src, place(src, dst, durable), None
+        except Exception as e:
+            return src, None, str(e)
+
+    jobs = list(pairs)
+    n = max(1, min(workers or WORKERS, len(jobs)))
+    if n > 1:
+        with ThreadPoolExecutor(max_workers=n) as ex:
+            results = list(ex.map(_one, jobs))
+    else:
+        results = [_one(j) for j in jobs]
+    used: Dict[str, int] = {}
+    failed: List[Tuple[Path, str]] = []
+    for src, mode, err in results:
+        if err:
+            failed.append((src, err))
+        else:
+            used[mode] = used.get(mode, 0) + 1
+    return used, failed
+
+
+def summary() -> Dict[str, int]:
+    """本进程中各策略累计放置的文件数。"""
+    with _lock:
+        return {m: n for m, n in _counts.items() if n}
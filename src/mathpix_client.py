@@ -0,0 +1,202 @@
+"""
+mathpix_client.py
+-----------------
+MathPix 公式识别的异步客户端：
+1) 连接池：所有请求共用一个 `requests.Session`（连接池大小与并发数一致），避免每张图重新握手；
+2) 并发与限流：`asyncio.Semaphore` 限制同时在途请求数，令牌桶限制每秒请求数；
+3) 重试：对 429/5xx/网络错误按指数退避（带抖动）重试；
+4) 缓存：按图片内容 SHA-256 缓存识别结果，同一张图只请求一次；
+5) 读文件与 base64 编码放到线程中执行，不阻塞事件循环。
+
+接口地址默认为官方 API，可通过环境变量 `MATHPIX_API_URL` 指向本地 mock 服务
+（见 `scripts/mock_mathpix_server.py`）。
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+import asyncio
+import base64
+import hashlib
+import mimetypes
+import os
+import random
+import threading
+import time
+
+DEFAULT_API_URL = "https://api.mathpix.com/v3/text"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """异步令牌桶：平均每秒 `rate` 个令牌，最多积攒 `capacity` 个（允许短时突发）。"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class MathpixClient:
+    """MathPix 异步客户端。
+
+    参数：
+    - app_id / app_key: MathPix 凭据；
+    - api_url: 接口地址；
+    - max_concurrency: 同时在途请求上限（也是连接池大小）；
+    - rate: 每秒请求数上限（<=0 表示不限流）；
+    - retries / backoff: 最大重试次数与首次退避秒数（之后指数增长）；
+    - timeout: 单次请求超时秒数。
+
+    统计字段：`stats` 记录 requests/retries/failures/cache_hits。
+    """
+
+    def __init__(
+        self,
+        app_id: str,
+        app_key: str,
+        api_url: str = DEFAULT_API_URL,
+        max_concurrency: int = 8,
+        rate: float = 10.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 20.0,
+    ) -> None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_url = api_url
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.rate = rate
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.timeout = timeout
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({"app_id": app_id, "app_key": app_key})
+        self._cache: Dict[str, Optional[str]] = {}
+        self._cache_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "cache_hits": 0}
+
+    def close(self) -> None:
+        self._session.close()
+
+    @staticmethod
+    def _encode(img_path: Path):
+        """读取图片，返回 (内容哈希, data URI)。在工作线程中执行。"""
+        raw = Path(img_path).read_bytes()
+        mime = mimetypes.guess_type(str(img_path))[0] or "image/png"
+        return hashlib.sha256(raw).hexdigest(), f"data:{mime};base64,{base64.b64encode(raw).decode()}"
+
+    def _post(self, payload: dict):
+        r = self._session.post(self.api_url, json=payload, timeout=self.timeout)
+        return r.status_code, (r.json() if r.ok else None)
+
+    async def _request(self, src: str, sem: asyncio.Semaphore, bucket: TokenBucket) -> Optional[str]:
+        payload = {"src": src, "formats": ["latex_styled"]}
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                delay = self.backoff * (2 ** (attempt - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            await bucket.acquire()
+            async with sem:
+                self.stats["requests"] += 1
+                try:
+                    status, js = await asyncio.to_thread(self._post, payload)
+                except Exception as e:
+                    print("[WARN] MathPix failed:", e)
+                    continue
+            if js is not None:
+                return (js.get("latex_styled") or js.get("latex") or "").strip() or None
+            if status not in RETRY_STATUS:
+                print(f"[WARN] MathPix HTTP {status}")
+                break
+        self.stats["failures"] += 1
+        return None
+
+    async def _recognize_one(self, img_path: Path, sem: asyncio.Semaphore, bucket: TokenBucket, inflight: dict) -> Optional[str]:
+        try:
+            key, src = await asyncio.to_thread(self._encode, img_path)
+        except Exception as e:
+            print("[WARN] MathPix failed:", e)
+            return None
+        with self._cache_lock:
+            if key in self._cache:
+                self.stats["cache_hits"] += 1
+                return self._cache[key]
+        # 同一批内内容相同的图片只发一次请求，其余等待同一结果
+        if key in inflight:
+            self.stats["cache_hits"] += 1
+            return await asyncio.shield(inflight[key])
+        fut = asyncio.get_running_loop().create_future()
+        inflight[key] = fut
+        latex = None
+        try:
+            latex = await self._request(src, sem, bucket)
+        finally:
+            inflight.pop(key, None)
+            fut.set_result(latex)
+        if latex is not None:
+            with self._cache_lock:
+                self._cache[key] = latex
+        return latex
+
+    async def recognize_many(self, images: Sequence[Path]) -> List[Optional[str]]:
+        """并发识别多张图片，返回与输入顺序一致的 LaTeX 列表（失败为 None）。"""
+        sem = asyncio.Semaphore(self.max_concurrency)
+        bucket = TokenBucket(self.rate)
+        inflight: Dict[str, asyncio.Future] = {}
+        return list(await asyncio.gather(*(self._recognize_one(Path(p), sem, bucket, inflight) for p in images)))
+
+    def recognize(self, images: Sequence[Path]) -> List[Optional[str]]:
+        """同步入口：在新的事件循环中执行 `recognize_many`。"""
+        if not images:
+            return []
+        return asyncio.run(self.recognize_many(images))
+
+
+_client: Optional[MathpixClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> Optional[MathpixClient]:
+    """按环境变量构造进程内共享的客户端；缺少凭据或 requests 时返回 None。
+
+    环境变量：`MATHPIX_APP_ID`、`MATHPIX_APP_KEY`，可选 `MATHPIX_API_URL`、
+    `MATHPIX_CONCURRENCY`、`MATHPIX_RATE`。
+    """
+    global _client
+    app_id = os.getenv("MATHPIX_APP_ID"); app_key = os.getenv("MATHPIX_APP_KEY")
+    if not (app_id and app_key):
+        return None
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = MathpixClient(
+                    app_id,
+                    app_key,
+                    api_url=os.getenv("MATHPIX_API_URL") or DEFAULT_API_URL,
+                    max_concurrency=int(os.getenv("MATHPIX_CONCURRENCY") or 8),
+                    rate=float(os.getenv("MATHPIX_RATE") or 10),
+                )
+            except Exception as e:
+                print("[WARN] MathPix client unavailable:", e)
+                return None
+    return _client
@@ -0,0 +1,93 @@
+"""
+mineru_cache.py
+---------------
+MinerU 解析结果缓存（指纹清单）：
+1) 每次解析成功后，在工作目录旁写入 `<work_dir>.manifest.json`，记录：
+   输入文件 SHA-256、MinerU 版本、CLI 参数、全部输出文件的相对路径与 SHA-256；
+2) 重跑时若输入、版本、参数均未变化且输出文件完整无改动，则直接复用已有 JSON/Markdown，
+   不再启动 `mineru parse`（CPU 上单页动辄数十秒）。
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import json
+
+from .utils import file_sha256
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path(work_dir: Path) -> Path:
+    """清单文件路径：与工作目录同级，避免被当作 MinerU 的 `*.json` 输出读取。"""
+    return work_dir.parent / f"{work_dir.name}.manifest.json"
+
+
+def mineru_version() -> str:
+    """MinerU 版本（读包元数据，不启动子进程）；元数据不可用时回退到 CLI 探测。"""
+    try:
+        from importlib.metadata import version
+        return version("mineru")
+    except Exception:
+        from .mineru_helper import MinerUHelper
+        return MinerUHelper.get_version()
+
+
+def _hash_outputs(work_dir: Path) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for p in sorted(work_dir.rglob("*")):
+        if p.is_file():
+            out[p.relative_to(work_dir).as_posix()] = file_sha256(p)
+    return out
+
+
+def write_manifest(input_path: Path, work_dir: Path, cli_args: List[str], version: Optional[str] = None) -> Path:
+    """解析成功后记录指纹清单，返回清单路径。"""
+    data: Dict[str, Any] = {
+        "manifest_version": MANIFEST_VERSION,
+        "input": input_path.name,
+        "input_sha256": file_sha256(input_path),
+        "mineru_version": version or mineru_version(),
+        "cli_args": list(cli_args),
+        "outputs": _hash_outputs(work_dir),
+    }
+    mp = manifest_path(work_dir)
+    mp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    return mp
+
+
+def is_fresh(input_path: Path, work_dir: Path, cli_args: List[str], version: Optional[str] = None) -> bool:
+    """判断 `work_dir` 中已有输出是否可直接复用。
+
+    条件：清单存在；输入哈希、MinerU 版本、CLI 参数一致；清单中的每个输出文件仍存在且哈希不变。
+    """
+    mp = manifest_path(work_dir)
+    if not mp.exists() or not work_dir.exists():
+        return False
+    try:
+        data = json.loads(mp.read_text(encoding="utf-8"))
+    except Exception:
+        return False
+    if data.get("manifest_version") != MANIFEST_VERSION or not data.get("outputs"):
+        return False
+    if data.get("cli_args") != list(cli_args):
+        return False
+    if data.get("mineru_version") != (version or mineru_version()):
+        return False
+    try:
+        if data.get("input_sha256") != file_sha256(input_path):
+            return False
+        for rel, digest in data["outputs"].items():
+            p = work_dir / rel
+            if not p.is_file() or file_sha256(p) != digest:
+                return False
+    except Exception:
+        return False
+    return True
+
+
+def invalidate(work_dir: Path) -> None:
+    """删除清单，使下次必定重新解析。"""
+    try:
+        manifest_path(work_dir).unlink()
+    except FileNotFoundError:
+        pass
@@ -4,28 +4,52 @@ mineru_helper.py
 提供对 MinerU 命令行工具的统一封装：
 1) 自动检测 MinerU 版本与 CLI 兼容方式（新版本需要 `-p/--path`）。
 2) 按需回退到 `python -m mineru` 调用，提升在不同安装环境中的可用性。
-3) 针对 PyTorch 2.6+ 的安全反序列化机制，自动注册 `ultralytics` 模型类型到 `safe_globals`，
-   以便 MinerU 依赖的 DocLayout YOLO 等模型能顺利加载。
+3) 可选“进程内”后端：直接调用 MinerU 的 Python API（`mineru.cli.common.do_parse`），
+   在同一个长驻进程内复用已加载的版面/OCR 模型；不可用时回退到 CLI 子进程；
+4) 针对 PyTorch 2.6+ 的安全反序列化机制，在进程内运行 MinerU 前自动注册 `ultralytics` 模型类型到
+   `safe_globals`，以便 MinerU 依赖的 DocLayout YOLO 等模型能顺利加载（仅导入本模块不会加载 torch）。
 """
 
 from pathlib import Path
 from typing import Dict, Any, Optional, List
-import subprocess, json, re, sys
+import subprocess, json, re, sys, os, threading
 
 # ----------------------------------------------------------
 # 兼容 PyTorch 2.6+ 模型反序列化安全机制
+# 仅在进程内运行 MinerU 时才需要（CLI 子进程有自己的解释器），因此按需执行一次，
+# 避免仅导入本模块就加载 torch/ultralytics。
 # ----------------------------------------------------------
-try:
-    import torch  # type: ignore
-    import ultralytics  # type: ignore
-    from packaging import version  # type: ignore
-    if version.parse(torch.__version__) >= version.parse("2.6.0"):
-        print(f"[INFO] 检测到 PyTorch {torch.__version__} (>=2.6)，启用 safe_globals 自动补丁")
-        torch.serialization.add_safe_globals([
-            ultralytics.nn.tasks.DetectionModel  # 供 DocLayout YOLO 反序列化
-        ])
-except Exception as e:
-    print(f"[WARN] PyTorch safe_globals 自动补丁加载失败: {e}")
+_torch_patch_done = False
+
+
+def apply_torch_safe_globals_patch() -> None:
+    global _torch_patch_done
+    if _torch_patch_done:
+        return
+    _torch_patch_done = True
+    try:
+        import torch  # type: ignore
+        import ultralytics  # type: ignore
+        from packaging import version  # type: ignore
+        if version.parse(torch.__version__) >= version.parse("2.6.0"):
+            print(f"[INFO] 检测到 PyTorch {torch.__version__} (>=2.6)，启用 safe_globals 自动补丁")
+            torch.serialization.add_safe_globals([
+                ultralytics.nn.tasks.DetectionModel  # 供 DocLayout YOLO 反序列化
+            ])
+    except Exception as e:
+        print(f"[WARN] PyTorch safe_globals 自动补丁加载失败: {e}")
+
+
+BACKENDS = ("auto", "api", "cli")
+
+
+def _env_backend() -> str:
+    """读取环境变量 MINERU_BACKEND；取值无效时告警并回退到 "auto"（它也是命令行参数的默认值）。"""
+    value = os.getenv("MINERU_BACKEND") or "auto"
+    if value not in BACKENDS:
+        print(f"[WARN] 环境变量 MINERU_BACKEND={value!r} 无效（可选 {'/'.join(BACKENDS)}），改用 auto")
+        return "auto"
+    return value
 
 
 class MinerUHelper:
@@ -39,27 +63,95 @@ class MinerUHelper:
 
     _cached_version: Optional[str] = None
     _use_new_cli: Optional[bool] = None
+    # 解析后端："auto"（优先进程内 API）| "api" | "cli"；可用环境变量 MINERU_BACKEND 预设
+    backend: str = _env_backend()
+    _api_ok: Optional[bool] = None
+    _api_lock = threading.Lock()
+    # 保护上面几个类级缓存：多个页面线程并发首次探测时只探测一次
+    _state_lock = threading.RLock()
+
+    @classmethod
+    def set_backend(cls, backend: str) -> None:
+        """设置解析后端（auto/api/cli）。"""
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown MinerU backend: {backend}")
+        cls.backend = backend
+
+    @classmethod
+    def api_available(cls) -> bool:
+        """MinerU 的 Python API 是否可在当前解释器中导入（结果缓存）。"""
+        if cls._api_ok is None:
+            with cls._state_lock:
+                if cls._api_ok is None:
+                    try:
+                        from mineru.cli.common import do_parse, read_fn  # type: ignore  # noqa: F401
+                        cls._api_ok = True
+                    except Exception:
+                        cls._api_ok = False
+        return cls._api_ok
+
+    @classmethod
+    def use_api(cls) -> bool:
+        """按 `backend` 设置决定本次是否走进程内 API。"""
+        if cls.backend == "cli":
+            return False
+        ok = cls.api_available()
+        if cls.backend == "api" and not ok:
+            print("[WARN] MinerU Python API 不可用，回退到 CLI。")
+        return ok
+
+    @classmethod
+    def run_parse_api(cls, input_paths: List[Path], output_dir: Path, lang: str = "ch") -> None:
+        """在当前进程内调用 MinerU 解析一个或多个文件。
+
+        - 输出布局与 CLI 一致：`output_dir/<stem>/auto/...`；
+        - MinerU 内部以单例缓存模型，同一进程内后续页面无需重新加载权重；
+        - 模型推理不保证线程安全，调用被类级锁串行化。
+        """
+        apply_torch_safe_globals_patch()
+        from mineru.cli.common import do_parse, read_fn  # type: ignore
+        output_dir.mkdir(parents=True, exist_ok=True)
+        names = [Path(p).stem for p in input_paths]
+        pdf_bytes = [read_fn(Path(p)) for p in input_paths]
+        with cls._api_lock:
+            print(f"[INFO] MinerU 进程内解析：{', '.join(names)}")
+            do_parse(
+                output_dir=str(output_dir),
+                pdf_file_names=names,
+                pdf_bytes_list=pdf_bytes,
+                p_lang_list=[lang] * len(names),
+                backend="pipeline",
+                parse_method="auto",
+            )
 
     @classmethod
     def get_version(cls) -> str:
         """获取 MinerU 版本号（字符串）。
 
-        优先执行 `mineru --version`；失败则尝试 `python -m mineru --version`。
-        结果会缓存在类变量 `_cached_version` 中，后续重复调用直接返回缓存。
+        通过 `env_probe` 读取磁盘缓存；缓存失效（解释器/包版本/可执行文件变化）时才执行
+        `python -m mineru --version`（失败再试 `mineru --version`）。
+        结果同时缓存在类变量 `_cached_version` 中，后续重复调用直接返回（线程安全）。
         """
         if cls._cached_version:
             return cls._cached_version
+        with cls._state_lock:
+            if not cls._cached_version:
+                from . import env_probe
+                cls._cached_version = env_probe.get("mineru_version")
+        return cls._cached_version
+
+    @staticmethod
+    def _probe_version() -> str:
         # Prefer the current interpreter (venv) to ensure consistency
         try:
             output = subprocess.check_output([sys.executable, "-m", "mineru", "--version"], text=True, stderr=subprocess.STDOUT)
-            cls._cached_version = output.strip()
+            return output.strip()
         except Exception:
             try:
                 output = subprocess.check_output(["mineru", "--version"], text=True, stderr=subprocess.STDOUT)
-                cls._cached_version = output.strip()
+                return output.strip()
             except Exception:
-                cls._cached_version = "unknown"
-        return cls._cached_version
+                return "unknown"
 
     @classmethod
     def is_new_cli(cls) -> bool:
@@ -68,25 +160,62 @@ class MinerUHelper:
         逻辑：解析版本字符串中的主/次版本号：
         - 若主版本 > 0，或次版本 >= 2，则视为新 CLI（需要 `-p`）；
         - 若无法解析版本，则默认按新 CLI 处理以提高兼容性。
-        结果将缓存在 `_use_new_cli` 中。
+        结果将缓存在 `_use_new_cli` 中（线程安全）。
         """
         if cls._use_new_cli is not None:
             return cls._use_new_cli
-        version_str = cls.get_version()
-        match = re.search(r"([0-9]+)\.([0-9]+)", version_str)
+        with cls._state_lock:
+            if cls._use_new_cli is None:
+                cls._use_new_cli = cls.version_uses_new_cli(cls.get_version())
+        return cls._use_new_cli
+
+    @staticmethod
+    def version_uses_new_cli(version_str: str) -> bool:
+        """按版本字符串判断是否为新 CLI（无法解析时按新 CLI 处理）。"""
+        match = re.search(r"([0-9]+)\.([0-9]+)", version_str or "")
         if match:
             major, minor = map(int, match.groups())
-            cls._use_new_cli = (major > 0 or minor >= 2)
-        else:
-            cls._use_new_cli = True
-        return cls._use_new_cli
+            return major > 0 or minor >= 2
+        return True
+
+    @staticmethod
+    def cli_args(input_path: Path, output_dir: Path, new_cli: bool) -> List[str]:
+        """`mineru` 之后的参数列表（新 CLI 需要 `-p`）。也用于解析缓存的指纹。"""
+        if new_cli:
+            return ["parse", "-p", str(input_path), "--output", str(output_dir)]
+        return ["parse", str(input_path), "--output", str(output_dir)]
+
+    @classmethod
+    def run_cli(cls, input_path: Path, output_dir: Path) -> Optional[Exception]:
+        """以子进程方式执行一次 `mineru parse`；`input_path` 可为单个文件或整个目录（批量）。
+
+        依次尝试 `python -m mineru` 与 PATH 中的 `mineru`；成功返回 None，否则返回最后一个异常。
+        """
+        is_new = cls.is_new_cli()
+        ver = cls._cached_version or "unknown"
+        print(f"[INFO] MinerU 版本检测：{ver} | {'新CLI(-p)' if is_new else '旧CLI'}")
+
+        args = cls.cli_args(input_path, output_dir, is_new)
+        cmds: List[List[str]] = [
+            [sys.executable, "-m", "mineru", *args],
+            ["mineru", *args],
+        ]
+        last_err: Optional[Exception] = None
+        for cmd in cmds:
+            try:
+                print(f"[INFO] Running: {' '.join(cmd)}")
+                subprocess.check_call(cmd)
+                return None
+            except Exception as e:
+                last_err = e
+        return last_err
 
     @classmethod
     def run_parse(cls, input_path: Path, output_dir: Path) -> Optional[Dict[str, Any]]:
         """执行 MinerU 解析任务并尝试解析输出结果。
 
-        - 按 `is_new_cli()` 自动选择是否添加 `-p` 参数；
-        - 依次尝试 `mineru` 与 `python -m mineru` 两种入口；
+        - 若 `use_api()` 为真，先在进程内调用 MinerU API；失败则回退 CLI；
+        - CLI：按 `is_new_cli()` 自动选择是否添加 `-p` 参数，依次尝试 `python -m mineru` 与 `mineru` 两种入口；
         - 运行后优先读取 `output_dir` 中的 `*.json`，否则读取 `*.md`；
         - 若无可用输出，返回 None，并在控制台打印告警。
 
@@ -98,31 +227,19 @@ class MinerUHelper:
         - dict 或 None：解析后的结构化结果或空值。
         """
         output_dir.mkdir(parents=True, exist_ok=True)
-        is_new = cls.is_new_cli()
-        ver = cls._cached_version or "unknown"
-        print(f"[INFO] MinerU 版本检测：{ver} | {'新CLI(-p)' if is_new else '旧CLI'}")
-
-        cmds: List[List[str]]
-        if is_new:
-            cmds = [
-                [sys.executable, "-m", "mineru", "parse", "-p", str(input_path), "--output", str(output_dir)],
-                ["mineru", "parse", "-p", str(input_path), "--output", str(output_dir)],
-            ]
-        else:
-            cmds = [
-                [sys.executable, "-m", "mineru", "parse", str(input_path), "--output", str(output_dir)],
-                ["mineru", "parse", str(input_path), "--output", str(output_dir)],
-            ]
-
         last_err: Optional[Exception] = None
-        for cmd in cmds:
+        ran = False
+        if cls.use_api():
             try:
-                print(f"[INFO] Running: {' '.join(cmd)}")
-                subprocess.check_call(cmd)
-                break
+                cls.run_parse_api([input_path], output_dir)
+                ran = True
             except Exception as e:
+                print("[WARN] MinerU 进程内解析失败，回退到 CLI：", e)
                 last_err = e
 
+        if not ran:
+            last_err = cls.run_cli(input_path, output_dir)
+
         json_files = sorted(output_dir.glob("*.json"))
         if json_files:
             try:
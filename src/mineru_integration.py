@@ -1,7 +1,8 @@
 from pathlib import Path
 from typing import List, Dict, Any
 import json
-from PIL import Image
+import re
+import shutil
 
 
 def image_to_single_pdf(img_path: Path) -> Path:
@@ -16,6 +17,7 @@ def image_to_single_pdf(img_path: Path) -> Path:
     返回：
     - 生成的 PDF 文件路径（与图片同名，后缀改为 .pdf）。
     """
+    from PIL import Image
     pdf_path = img_path.with_suffix(".pdf")
     img = Image.open(img_path).convert("RGB")
     img.save(pdf_path, "PDF", resolution=300.0)
@@ -23,26 +25,38 @@ def image_to_single_pdf(img_path: Path) -> Path:
 
 
 from .mineru_helper import MinerUHelper
+from . import linkcopy
+from . import mineru_cache
+from . import pdf_shard
 
+from . import question_grammar
 
-def run_mineru_on_file(input_path: Path, work_dir: Path) -> Dict[str, Any] | None:
-    """对单个文件（图片/PDF）调用 MinerU 并返回解析结构。
 
-    行为：
-    - 首选通过 `MinerUHelper.run_parse` 调用 MinerU，自动适配新旧 CLI 语法；
-    - 若未得到结果，则在 `work_dir` 下递归兜底查找 `*.md` 或 `*.json` 文件：
-      - 发现 Markdown：包装为 {"blocks": [{"type": "markdown", "text": ...}]} 返回；
-      - 发现 JSON：读取为字典返回；
-    - 若仍无可用输出，返回 None。
+def mineru_auto_dir(tmp_dir: Path, page: Path) -> Path:
+    """页面 `page` 的 MinerU 输出目录 `tmp_dir/<stem>/<stem>/auto`（内含 `<stem>.md` 与 `images/`）。
 
-    参数：
-    - input_path: 输入图片或 PDF 路径。
-    - work_dir: MinerU 工作/输出目录（应可写）。
+    单页解析、批量解析（移动到同一位置）与分片拼接都使用这一布局。
     """
-    res = MinerUHelper.run_parse(input_path, work_dir)
-    if res:
-        return res
+    return tmp_dir / page.stem / page.stem / "auto"
+
 
+def read_mineru_outputs(work_dir: Path) -> Dict[str, Any] | None:
+    """读取 MinerU 在 `work_dir` 下的已有输出（不运行 MinerU）。
+
+    查找顺序与 `run_parse` + 兜底逻辑一致：顶层 `*.json` → 顶层 `*.md` → 递归 `*.md` → 递归 `*.json`。
+    """
+    for jf in sorted(work_dir.glob("*.json")):
+        try:
+            return json.loads(jf.read_text(encoding="utf-8"))
+        except Exception:
+            break
+    md_files = sorted(work_dir.glob("*.md"))
+    if md_files:
+        return {"blocks": [{"type": "markdown", "text": md_files[0].read_text(encoding="utf-8")}]}
+    return _read_nested_outputs(work_dir)
+
+
+def _read_nested_outputs(work_dir: Path) -> Dict[str, Any] | None:
     # 兼容兜底：递归查找 md/json 输出
     try:
         md_files = sorted(work_dir.rglob("*.md"))
@@ -67,12 +81,39 @@ def run_mineru_on_file(input_path: Path, work_dir: Path) -> Dict[str, Any] | Non
     return None
 
 
+def cache_fingerprint_args() -> tuple:
+    """解析缓存使用的 (MinerU 版本, CLI 参数模板)；路径用占位符，工作目录挪动后缓存仍有效。"""
+    version = mineru_cache.mineru_version()
+    new_cli = MinerUHelper.version_uses_new_cli(version)
+    return version, MinerUHelper.cli_args(Path("<input>"), Path("<output>"), new_cli)
+
+
+def run_mineru_on_file(input_path: Path, work_dir: Path) -> Dict[str, Any] | None:
+    """对单个文件（图片/PDF）调用 MinerU 并返回解析结构。
+
+    行为：
+    - 首选通过 `MinerUHelper.run_parse` 调用 MinerU，自动适配新旧 CLI 语法；
+    - 若未得到结果，则在 `work_dir` 下递归兜底查找 `*.md` 或 `*.json` 文件：
+      - 发现 Markdown：包装为 {"blocks": [{"type": "markdown", "text": ...}]} 返回；
+      - 发现 JSON：读取为字典返回；
+    - 若仍无可用输出，返回 None。
+
+    参数：
+    - input_path: 输入图片或 PDF 路径。
+    - work_dir: MinerU 工作/输出目录（应可写）。
+    """
+    res = MinerUHelper.run_parse(input_path, work_dir)
+    if res:
+        return res
+    return _read_nested_outputs(work_dir)
+
+
 def extract_question_blocks(mineru_struct: Dict[str, Any]) -> List[Dict[str, Any]]:
     """从 MinerU 的结构化输出里，基于“题号”样式粗切分题目文本块。
 
     策略：
     - 合并 blocks/data 下各元素的文本字段（text/markdown/content）。
-    - 使用匹配“例/练习/数字/括号数字”等题号样式的正则进行切分。
+    - 按题头文法（`question_grammar`）中的题目/变式/答案/解析题头切分，题头前的内容单独成块。
     - 过滤空段，返回 [{"type": "question_text", "text": "..."}] 列表。
 
     参数：
@@ -81,105 +122,172 @@ def extract_question_blocks(mineru_struct: Dict[str, Any]) -> List[Dict[str, Any
     返回：
     - 题目文本块列表，可能为空。
     """
-    import re
-
-    qre= re.compile(
-        r"(?m)^\s*(?:>\s*)*"
-        r"("  # 捕获用于命名的标签文本
-        r"(?:"
-        r"\d+[．.]|\d+[)]|"                     # 1. / 1) / 1．
-        r"【例\d+】|【练习\d+】|【变式\d*-*\d*】|" # 【例1】/【练习1】/【变式1-1】
-        r"例\d+|练习\d+|变式\d+|"
-        r"【答案】|【解析】|【详解】|【参考答案】|"
-        r"答案[:：]?|解析[:：]?|详解[:：]?|参考答案[:：]?"
-        r")"
-        r")\s*"
-    )
-    
+    raw = _struct_text(mineru_struct)
+    if not raw:
+        return []
+    kinds = {question_grammar.QUESTION, question_grammar.VARIANT, question_grammar.ANSWER, question_grammar.ANALYSIS}
+    heads = [t for t in question_grammar.scan(raw) if t.kind in kinds]
+    bounds = [0] + [t.head for t in heads] + [len(raw)]
+    merged = [raw[bounds[i]:bounds[i + 1]].strip() for i in range(len(bounds) - 1)]
+    return [{"type": "question_text", "text": m} for m in merged if m]
+
+
+def _struct_text(mineru_struct: Dict[str, Any]) -> str:
+    """合并 MinerU 结构化结果 blocks/data 下各元素的文本字段（text/markdown/content）。"""
     blocks = mineru_struct.get("blocks") or mineru_struct.get("data") or []
     texts: List[str] = []
     for blk in blocks:
         t = blk.get("text") or blk.get("markdown") or blk.get("content") or ""
         if isinstance(t, str):
             texts.append(t)
-    raw = "\n\n".join(texts).strip()
-    if not raw:
-        return []
-
-    pieces = qre.split(raw)
-    merged: List[str] = []
-    buf = ""
-    i = 0
-    while i < len(pieces):
-        seg = pieces[i]
-        if i + 2 < len(pieces) and qre.match(pieces[i] + pieces[i + 1]):
-            if buf.strip():
-                merged.append(buf.strip())
-            buf = (pieces[i + 1] + (pieces[i + 2] or "")).strip()
-            i += 3
-        else:
-            buf += (seg or "")
-            i += 1
-    if buf.strip():
-        merged.append(buf.strip())
-
-    return [{"type": "question_text", "text": m} for m in merged if m.strip()]
+    return "\n\n".join(texts).strip()
 
 
 def robust_question_blocks(mineru_struct: Dict[str, Any]) -> List[Dict[str, Any]]:
     """改进版题块切分：
     - 支持：【例1】/【变式】/【题1】/第1题/1. /（1）等题头；
-    - 忽略 噪声标题：模型/题型展示/方法点拨/目录/答案/解析/详解/参考答案；
+    - 题头来自 `question_grammar` 的记号流（题目/变式/小问）；答案/解析/详解与其他【...】标题不作切分点；
     - 未命中题头时，返回整段文本一个题块。
     """
-    import re
-    blocks = mineru_struct.get("blocks") or mineru_struct.get("data") or []
-    texts: List[str] = []
-    for blk in blocks:
-        t = blk.get("text") or blk.get("markdown") or blk.get("content") or ""
-        if isinstance(t, str):
-            texts.append(t)
-    raw = "\n\n".join(texts).strip()
+    raw = _struct_text(mineru_struct)
     if not raw:
         return []
 
-    head_pat = re.compile(
-        r"(?m)^\s*(?:>\s*)*(?:"
-        r"【\s*(?:例|练习|题|变式)\s*\d*】|"
-        r"第\s*\d+\s*题|"
-        r"(?:例|练习)\s*\d+\s*[\.、．)]|"
-        r"\d+\s*[\.、．)]|"
-        r"[（(]\s*\d+\s*[）)]"
-        r")"
-    )
-    noise_pat = re.compile(r"模型|题型展示|方法点拨|目录|参考答案|答案|解析|详解")
-
-    starts: List[int] = []
-    for m in head_pat.finditer(raw):
-        token = m.group(0)
-        if noise_pat.search(token):
+    segs = question_grammar.segments(raw, question_grammar.SEGMENT_KINDS)
+    if not segs:
+        return [{"type": "question_text", "text": raw}]
+
+    out = [seg.strip() for _, seg in segs]
+    return [{"type": "question_text", "text": s} for s in out if s]
+
+def _load_if_fresh(input_path: Path, work_subdir: Path, version: str, args: List[str]) -> Dict[str, Any] | None:
+    """指纹清单有效时读取已有输出，否则返回 None。"""
+    if mineru_cache.is_fresh(input_path, work_subdir, args, version):
+        res = read_mineru_outputs(work_subdir)
+        if res:
+            print(f"[INFO] MinerU 缓存命中，跳过解析：{input_path.name}")
+            return res
+    return None
+
+
+def _record(input_path: Path, work_subdir: Path, version: str, args: List[str]) -> None:
+    try:
+        mineru_cache.write_manifest(input_path, work_subdir, args, version)
+    except Exception as e:
+        print("[WARN] 写入 MinerU 缓存清单失败：", e)
+
+
+_SENTENCE_END = tuple("。．.？?！!；;：:)）]】」』\"”$")
+_BLOCK_START = ("#", "!", "|", "<", ">", "$$", "- ", "* ", "```")
+_CJK = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+
+def _continues_across(prev: str, nxt: str) -> bool:
+    """前一分片末尾的段落是否延续到下一分片开头（句子未结束，且下一片不是以题头/标题/图片/表格开始）。"""
+    a = prev.rstrip(); b = nxt.lstrip()
+    if not a or not b or a.endswith(_SENTENCE_END):
+        return False
+    first = b.splitlines()[0]
+    if first.startswith(_BLOCK_START) or question_grammar.head_at(first):
+        return False
+    return True
+
+
+def join_shard_texts(texts: List[str]) -> str:
+    """按页序拼接各分片的 Markdown。
+
+    MinerU 单独解析每个分片时不会跨分片合并段落；若分片边界处句子未结束，
+    这里把两段直接接上（中文之间不加空格，其余加一个空格），使跨边界的题目在切分题块前恢复完整。
+    """
+    out = ""
+    for t in texts:
+        t = t.strip()
+        if not t:
             continue
-        starts.append(m.start())
+        if not out:
+            out = t
+        elif _continues_across(out, t):
+            a = out.rstrip(); b = t.lstrip()
+            sep = "" if _CJK.match(a[-1]) and _CJK.match(b[0]) else " "
+            out = a + sep + b
+        else:
+            out = out + "\n\n" + t
+    return out
 
-    if not starts:
-        return [{"type": "question_text", "text": raw}]
 
-    starts.sort()
-    out: List[str] = []
-    for i, s in enumerate(starts):
-        e = starts[i + 1] if i + 1 < len(starts) else len(raw)
-        seg = raw[s:e].strip()
-        if seg:
-            out.append(seg)
+def _merge_shard_images(shard_dir: Path, images_dst: Path) -> None:
+    """把分片输出中的 `images/` 合并到拼接后的目录（MinerU 图片按内容哈希命名，不会冲突）。"""
+    pairs = []
+    for images_src in shard_dir.rglob("images"):
+        if not images_src.is_dir():
+            continue
+        images_dst.mkdir(parents=True, exist_ok=True)
+        pairs.extend((f, images_dst / f.name) for f in images_src.iterdir() if f.is_file())
+    _, failed = linkcopy.place_many(pairs, durable=True)
+    for f, err in failed:
+        print(f"[WARN] 分片图片合并失败 {f}: {err}")
+
+
+def _parse_sharded(input_path: Path, work_subdir: Path, tmp_dir: Path) -> Dict[str, Any] | None:
+    """大 PDF 分片并发解析并拼接。
+
+    - 分片与其 MinerU 输出位于 `tmp_dir/_shards/<stem>/`（每个分片各自有指纹清单，重跑时可单独复用）；
+    - 拼接结果写入 `work_subdir/<stem>/auto/<stem>.md` 与 `images/`，与单文件解析的目录布局一致；
+    - 任一分片失败时返回 None，由调用方回退为整文件解析。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    shard_root = tmp_dir / "_shards" / input_path.stem
+    shards = pdf_shard.split_pdf(input_path, shard_root)
+    print(f"[INFO] 大 PDF 分片解析：{input_path.name} → {len(shards)} 片（{pdf_shard.SHARD_PAGES} 页/片）")
+    out_root = shard_root / "out"
+    with ThreadPoolExecutor(max_workers=min(pdf_shard.SHARD_WORKERS, len(shards))) as ex:
+        results = list(ex.map(lambda sp: mineru_parse_page(sp, out_root), shards))
+    if not all(results):
+        bad = [sp.name for sp, r in zip(shards, results) if not r]
+        print("[WARN] 分片解析失败，改为整文件解析：", ", ".join(bad))
+        return None
+    merged_auto = mineru_auto_dir(tmp_dir, input_path)
+    shutil.rmtree(work_subdir / input_path.stem, ignore_errors=True)
+    merged_auto.mkdir(parents=True, exist_ok=True)
+    for sp in shards:
+        _merge_shard_images(out_root / sp.stem, merged_auto / "images")
+    text = join_shard_texts([_struct_text(r) for r in results])
+    (merged_auto / f"{input_path.stem}.md").write_text(text, encoding="utf-8")
+    return {"blocks": [{"type": "markdown", "text": text}]}
+
+
+def mineru_parse_page(page_path: Path, tmp_dir: Path) -> Dict[str, Any] | None:
+    """对单个页面文件调用 MinerU，返回原始解析结果（JSON 或 {"markdown": ...}），失败返回 None。
+
+    - 直接将输入图片或 PDF 交给 MinerU（其内部已支持图片转 PDF），避免我们重复转换；
+    - 使用 `tmp_dir/<stem>` 作为 MinerU 工作目录（会创建）；
+    - 若工作目录旁的指纹清单表明输入/版本/参数/输出均未变化，直接复用已有输出，不再调用 MinerU；
+    - 页数超过 `pdf_shard.SHARD_PAGES` 的 PDF 按页码区间分片并发解析后拼接（见 `_parse_sharded`）。
+    """
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    input_path = page_path  # MinerU 原生支持图片，内部会自行处理为 PDF
+    work_subdir = tmp_dir / input_path.stem
+    work_subdir.mkdir(parents=True, exist_ok=True)
+    version, args = cache_fingerprint_args()
+    sharded = pdf_shard.needs_sharding(input_path)
+    if sharded:
+        args = args + [f"--shard-pages={pdf_shard.SHARD_PAGES}"]
+    res = _load_if_fresh(input_path, work_subdir, version, args)
+    if not res:
+        mineru_cache.invalidate(work_subdir)
+        res = _parse_sharded(input_path, work_subdir, tmp_dir) if sharded else None
+        if not res:
+            res = run_mineru_on_file(input_path, work_subdir)
+        if res:
+            _record(input_path, work_subdir, version, args)
+    return res or None
 
-    return [{"type": "question_text", "text": s} for s in out]
 
 def mineru_parse_to_questions(page_path: Path, tmp_dir: Path) -> List[Dict[str, Any]]:
     """对单个页面文件调用 MinerU 并提取题目块列表。
 
     行为：
-    - 直接将输入图片或 PDF 交给 MinerU（其内部已支持图片转 PDF），避免我们重复转换；
-    - 使用传入的 `tmp_dir` 作为 MinerU 工作目录（会创建）；
+    - 由 `mineru_parse_page` 解析（或复用指纹清单有效的已有输出）；
     - 解析 MinerU 输出并切分为题目文本块后返回。
 
     参数：
@@ -189,11 +297,82 @@ def mineru_parse_to_questions(page_path: Path, tmp_dir: Path) -> List[Dict[str,
     返回：
     - 题目块字典列表（可能为空列表）。
     """
-    tmp_dir.mkdir(parents=True, exist_ok=True)
-    input_path = page_path  # MinerU 原生支持图片，内部会自行处理为 PDF
-    work_subdir = tmp_dir / input_path.stem
-    work_subdir.mkdir(parents=True, exist_ok=True)
-    res = run_mineru_on_file(input_path, work_subdir)
+    res = mineru_parse_page(page_path, tmp_dir)
     if not res:
         return []
     return robust_question_blocks(res)
+
+
+def _stage_inputs(pages: List[Path], stage_dir: Path) -> None:
+    """把待解析文件放入批量输入目录（按 `linkcopy` 策略链接，最后才复制）。"""
+    if stage_dir.exists():
+        shutil.rmtree(stage_dir, ignore_errors=True)
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    _, failed = linkcopy.place_many([(p, stage_dir / p.name) for p in pages], skip_existing=False)
+    if failed:
+        raise OSError("; ".join(f"{p.name}: {err}" for p, err in failed))
+
+
+def mineru_parse_many(pages: List[Path], tmp_dir: Path) -> Dict[Path, List[Dict[str, Any]]]:
+    """批量解析多个页面文件：MinerU 进程启动与模型加载每批只发生一次。
+
+    行为：
+    - 先按指纹清单筛掉可直接复用的页面；
+    - 其余页面一次性交给 MinerU：进程内 API 直接传文件列表；CLI 则把文件放进
+      `tmp_dir/_batch_in/` 后以目录为输入执行一次 `mineru parse`；
+    - 批量输出 `tmp_dir/_batch_out/<stem>/` 会被移动到单页模式的位置 `tmp_dir/<stem>/<stem>/`，
+      因此 `robust_question_blocks` 与后续图片同步逻辑无需改动；
+    - 文件名（stem）重复或批量失败的页面、以及需要分片的大 PDF 逐个回退到 `mineru_parse_to_questions`。
+
+    返回：{页面路径: 题目块列表}。
+    """
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    version, args = cache_fingerprint_args()
+    results: Dict[Path, List[Dict[str, Any]]] = {}
+    stale: List[Path] = []
+    for page in pages:
+        work_subdir = tmp_dir / page.stem
+        res = _load_if_fresh(page, work_subdir, version, args)
+        if res:
+            results[page] = robust_question_blocks(res)
+        else:
+            stale.append(page)
+
+    stems = [p.stem for p in stale]
+    # 大 PDF 不进整批，逐个走分片解析
+    batch = [p for p in stale if stems.count(p.stem) == 1 and not pdf_shard.needs_sharding(p)]
+    if len(batch) > 1:
+        batch_out = tmp_dir / "_batch_out"
+        shutil.rmtree(batch_out, ignore_errors=True)
+        try:
+            if MinerUHelper.use_api():
+                MinerUHelper.run_parse_api(batch, batch_out)
+            else:
+                stage_dir = tmp_dir / "_batch_in"
+                _stage_inputs(batch, stage_dir)
+                err = MinerUHelper.run_cli(stage_dir, batch_out)
+                shutil.rmtree(stage_dir, ignore_errors=True)
+                if err:
+                    print("[WARN] MinerU 批量解析失败，改为逐页解析：", err)
+        except Exception as e:
+            print("[WARN] MinerU 批量解析失败，改为逐页解析：", e)
+        for page in batch:
+            src = batch_out / page.stem
+            if not src.exists():
+                continue
+            work_subdir = tmp_dir / page.stem
+            mineru_cache.invalidate(work_subdir)
+            dst = work_subdir / page.stem
+            shutil.rmtree(dst, ignore_errors=True)
+            work_subdir.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(src), str(dst))
+            res = read_mineru_outputs(work_subdir)
+            if res:
+                _record(page, work_subdir, version, args)
+                results[page] = robust_question_blocks(res)
+        shutil.rmtree(batch_out, ignore_errors=True)
+
+    for page in stale:
+        if page not in results:
+            results[page] = mineru_parse_to_questions(page, tmp_dir)
+    return results
@@ -0,0 +1,121 @@
+"""
+ocr_cache.py
+------------
+按内容寻址的 OCR 结果持久缓存（SQLite）：
+1) 键 = 图片内容 SHA-256 + 引擎名 + 引擎版本 + 参数，值 = `run_ocr` 的结果字典（JSON）；
+2) 重跑同一批图片（例如只改了模板/正则）时直接命中缓存，完全跳过模型推理；
+3) 记录命中/未命中次数，并按总字节数上限淘汰最久未访问的条目。
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from .utils import file_sha256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_results (
+    key         TEXT PRIMARY KEY,
+    engine      TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ocr_results_access ON ocr_results(last_access);
+"""
+
+
+def _pkg_version(name: str) -> str:
+    """读取已安装包版本（仅查元数据，不导入包）；未安装返回空串。"""
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return ""
+
+
+def engine_fingerprint(use_pix2tex: bool) -> str:
+    """`run_ocr` 引擎链的版本指纹：任一引擎升级/安装/卸载都会使旧缓存失效。"""
+    import os
+    parts = [
+        f"paddleocr={_pkg_version('paddleocr')}",
+        f"pytesseract={_pkg_version('pytesseract')}",
+        f"pix2tex={_pkg_version('pix2tex') if use_pix2tex else '-'}",
+        f"mathpix={'on' if os.getenv('MATHPIX_APP_ID') and os.getenv('MATHPIX_APP_KEY') else 'off'}",
+    ]
+    return ";".join(parts)
+
+
+class OCRCache:
+    """OCR 结果缓存。
+
+    参数：
+    - db_path: SQLite 文件路径（通常为 `<out_dir>/.ocr_cache.sqlite`）；
+    - max_bytes: 缓存值总字节数上限，超出后淘汰最久未访问的条目（<=0 表示不限）。
+
+    线程安全：内部共用一个连接并加锁，可在线程池中调用。
+    """
+
+    def __init__(self, db_path: Path, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def make_key(img_path: Path, engine: str, version: str, params: Dict[str, Any]) -> str:
+        """由图片内容哈希、引擎名/版本与参数生成缓存键。"""
+        raw = "|".join([file_sha256(img_path), engine, version, json.dumps(params, sort_keys=True)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM ocr_results WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE ocr_results SET last_access=? WHERE key=?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, engine: str, value: Dict[str, Any]) -> None:
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results(key, engine, value, size, last_access) VALUES (?,?,?,?,?)",
+                (key, engine, data, len(data.encode("utf-8")), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """总大小超过上限时，按最久未访问顺序删除条目（调用方已持锁）。"""
+        if self.max_bytes <= 0:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        over = total - self.max_bytes
+        for key, size in self._conn.execute("SELECT key, size FROM ocr_results ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM ocr_results WHERE key=?", (key,))
+            over -= size
+            if over <= 0:
+                break
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            n, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_results").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": n, "bytes": total}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,256 @@
+"""
+ocr_engines.py
+--------------
+OCR 引擎注册表：
+1) 每个线程内每种引擎只加载一次模型（PaddleOCR / Tesseract / pix2tex），在多次 `run_ocr` 调用间复用；
+   多数模型推理不是线程安全的，线程后端的各 OCR 工作线程因此各持一份实例、互不加锁，
+   `--ocr_workers N` 时 N 批可真正并行（代价是每个线程各占一份模型内存）；
+2) 统一提供批量接口 `recognize(images)`，一次处理多张图片，整份讲义只付一次模型加载成本；
+3) 加载失败（未安装/初始化异常）在进程内记住一次，其他线程不再重复尝试导入。
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+import threading
+
+from .utils import detect_gpu_type
+
+
+class OCREngine:
+    """OCR 引擎基类。
+
+    - 子类实现 `_load()`（加载模型）与 `_recognize_one()`（识别单张图片）；
+    - 实例只在创建它的线程中使用（见 `get_engine`）；`recognize()` 的锁只防止实例被意外跨线程共享；
+    - 单张失败返回 None，不影响同批其他图片。
+    """
+
+    name = "base"
+
+    def __init__(self) -> None:
+        self.available = False
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """加载模型；成功返回 True，失败返回 False（仅在注册表首次创建时调用）。"""
+        try:
+            self._load()
+            self.available = True
+        except Exception as e:
+            print(f"[WARN] OCR 引擎 {self.name} 不可用: {e}")
+            self.available = False
+        return self.available
+
+    def _load(self) -> None:
+        raise NotImplementedError
+
+    def _recognize_one(self, img_path: Path) -> Optional[str]:
+        raise NotImplementedError
+
+    def recognize(self, images: Sequence[Path]) -> List[Optional[str]]:
+        """批量识别：返回与 `images` 等长、顺序一致的结果列表。"""
+        out: List[Optional[str]] = []
+        with self._lock:
+            for img in images:
+                try:
+                    out.append(self._recognize_one(Path(img)))
+                except Exception as e:
+                    print(f"[WARN] {self.name} failed on {img}: {e}")
+                    out.append(None)
+        return out
+
+
+class PaddleEngine(OCREngine):
+    """PaddleOCR 中英文文本识别；GPU 检测只在加载时做一次，失败回退 CPU。"""
+
+    name = "paddle"
+
+    def _load(self) -> None:
+        from paddleocr import PaddleOCR
+        gpu = (detect_gpu_type() == "nvidia")
+        try:
+            self._ocr = PaddleOCR(use_angle_cls=True, lang="ch", use_gpu=gpu)
+        except Exception:
+            self._ocr = PaddleOCR(use_angle_cls=True, lang="ch", use_gpu=False)
+
+    def _recognize_one(self, img_path: Path) -> Optional[str]:
+        res = self._ocr.ocr(str(img_path), cls=True)
+        lines = []
+        for page in res or []:
+            for line in page or []:
+                lines.append(line[1][0])
+        return "\n".join(lines).strip()
+
+
+class TesseractEngine(OCREngine):
+    """Tesseract 中文简体+英文识别，作为 PaddleOCR 的备选。"""
+
+    name = "tesseract"
+
+    def _load(self) -> None:
+        import pytesseract
+        from PIL import Image
+        self._tess = pytesseract
+        self._image = Image
+
+    def _recognize_one(self, img_path: Path) -> Optional[str]:
+        with self._image.open(img_path) as im:
+            return self._tess.image_to_string(im, lang="chi_sim+eng")
+
+
+class Pix2TexEngine(OCREngine):
+    """本地 pix2tex（LatexOCR）公式识别，支持真正的批量推理。
+
+    - 解码时即按模型工作分辨率（`args.max_dimensions`）缩小（JPEG 走 draft 解码），避免整张原图进内存；
+    - 每张图先单独做预处理（含 pix2tex 自带的宽度估计），再按相近尺寸分组、补白到同一尺寸，
+      整组堆叠为一个张量调用一次 `model.generate`；
+    - 批量路径出错时回退到逐张调用 `LatexOCR.__call__`。
+    """
+
+    name = "pix2tex"
+    batch_size = 16
+
+    def _load(self) -> None:
+        from pix2tex.cli import LatexOCR
+        from PIL import Image
+        self._model = LatexOCR()
+        self._image = Image
+
+    def _open_downscaled(self, img_path: Path):
+        """打开图片并缩小到模型工作分辨率以内（不放大）。"""
+        max_w, max_h = self._model.args.max_dimensions
+        im = self._image.open(img_path)
+        try:
+            im.draft("RGB", (max_w, max_h))
+        except Exception:
+            pass
+        im = im.convert("RGB")
+        im.thumbnail((max_w, max_h), self._image.LANCZOS)
+        return im
+
+    def _recognize_one(self, img_path: Path) -> Optional[str]:
+        return (self._model(self._open_downscaled(img_path)) or "").strip()
+
+    def _preprocess(self, img):
+        """复刻 `LatexOCR.__call__` 的预处理，返回送入模型前的 PIL 图（宽高均为 32 的倍数）。"""
+        import numpy as np
+        import torch
+        from pix2tex.cli import minmax_size
+        from pix2tex.utils import pad
+        from pix2tex.dataset.transforms import test_transform
+        m = self._model
+        args = m.args
+        img = minmax_size(pad(img), args.max_dimensions, args.min_dimensions)
+        if m.image_resizer is None or args.no_resize:
+            return pad(img).convert("RGB")
+        input_image = img.convert("RGB").copy()
+        r, w, h = 1, input_image.size[0], input_image.size[1]
+        with torch.no_grad():
+            for _ in range(10):
+                h = int(h * r)
+                resample = self._image.BILINEAR if r > 1 else self._image.LANCZOS
+                img = pad(minmax_size(input_image.resize((w, h), resample), args.max_dimensions, args.min_dimensions))
+                t = test_transform(image=np.array(img.convert("RGB")))["image"][:1].unsqueeze(0)
+                w = (m.image_resizer(t.to(args.device)).argmax(-1).item() + 1) * 32
+                if w == img.size[0]:
+                    break
+                r = w / img.size[0]
+        return img.convert("RGB")
+
+    def _generate(self, imgs) -> List[str]:
+        """将一组预处理后的图片补白到同一尺寸，堆叠后一次性解码。"""
+        import numpy as np
+        import torch
+        from pix2tex.utils import post_process, token2str
+        from pix2tex.dataset.transforms import test_transform
+        m = self._model
+        W = max(im.size[0] for im in imgs)
+        H = max(im.size[1] for im in imgs)
+        tensors = []
+        for im in imgs:
+            canvas = self._image.new("RGB", (W, H), (255, 255, 255))
+            canvas.paste(im, (0, 0))
+            tensors.append(test_transform(image=np.array(canvas))["image"][:1])
+        batch = torch.stack(tensors).to(m.args.device)
+        with torch.no_grad():
+            dec = m.model.generate(batch, temperature=m.args.get("temperature", .25))
+        return [post_process(s).strip() for s in token2str(dec, m.tokenizer)]
+
+    def recognize(self, images: Sequence[Path]) -> List[Optional[str]]:
+        out: List[Optional[str]] = [None] * len(images)
+        with self._lock:
+            prepped = []
+            for i, img_path in enumerate(images):
+                try:
+                    prepped.append((i, self._preprocess(self._open_downscaled(Path(img_path)))))
+                except Exception as e:
+                    print(f"[WARN] pix2tex failed on {img_path}: {e}")
+            # 相近尺寸分组，减少补白带来的无效计算
+            prepped.sort(key=lambda t: (t[1].size[1], t[1].size[0]))
+            for k in range(0, len(prepped), self.batch_size):
+                chunk = prepped[k:k + self.batch_size]
+                try:
+                    for (i, _), pred in zip(chunk, self._generate([im for _, im in chunk])):
+                        out[i] = pred
+                except Exception as e:
+                    print(f"[WARN] pix2tex 批量推理失败，逐张回退: {e}")
+                    for i, _ in chunk:
+                        try:
+                            out[i] = self._recognize_one(Path(images[i]))
+                        except Exception as e2:
+                            print(f"[WARN] pix2tex failed on {images[i]}: {e2}")
+        return out
+
+
+_FACTORIES: Dict[str, Callable[[], OCREngine]] = {
+    PaddleEngine.name: PaddleEngine,
+    TesseractEngine.name: TesseractEngine,
+    Pix2TexEngine.name: Pix2TexEngine,
+}
+_FAILED: Dict[str, int] = {}  # 加载失败的引擎名 → 失败时的注册表版本
+_GENERATION = 0  # register_engine 每次递增，使各线程已加载的实例失效
+_LOCAL = threading.local()
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _thread_engines() -> Dict[str, OCREngine]:
+    if getattr(_LOCAL, "generation", None) != _GENERATION:
+        _LOCAL.generation = _GENERATION
+        _LOCAL.engines = {}
+    return _LOCAL.engines
+
+
+def register_engine(name: str, factory: Callable[[], OCREngine]) -> None:
+    """注册（或替换）一种引擎的构造函数；各线程已加载的实例会被丢弃。"""
+    global _GENERATION
+    with _REGISTRY_LOCK:
+        _FACTORIES[name] = factory
+        _FAILED.pop(name, None)
+        _GENERATION += 1
+
+
+def get_engine(name: str) -> Optional[OCREngine]:
+    """获取当前线程的引擎实例；该线程首次调用时加载模型。
+
+    返回：可用的引擎实例；若未注册或加载失败（任一线程失败过）则返回 None。
+    """
+    engines = _thread_engines()
+    eng = engines.get(name)
+    if eng is None:
+        with _REGISTRY_LOCK:
+            factory = _FACTORIES.get(name)
+            if factory is None or _FAILED.get(name) == _GENERATION:
+                return None
+        eng = factory()
+        if not eng.load():
+            with _REGISTRY_LOCK:
+                _FAILED[name] = _GENERATION
+        engines[name] = eng
+    return eng if eng.available else None
+
+
+def recognize(name: str, images: Sequence[Path]) -> List[Optional[str]]:
+    """使用指定引擎批量识别；引擎不可用时返回全 None 列表。"""
+    eng = get_engine(name)
+    if eng is None:
+        return [None] * len(images)
+    return eng.recognize(images)
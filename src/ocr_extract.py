@@ -1,76 +1,40 @@
 from pathlib import Path
-from typing import Optional, Dict, Any
-from PIL import Image
+from typing import Optional, Dict, Any, List, Sequence
 import os
-from .utils import detect_gpu_type
+from .ocr_engines import recognize
 
 def _ocr_with_paddle(img_path: Path) -> Optional[str]:
     """使用 PaddleOCR 识别通用中英文文本。
 
-    - 自动根据 `detect_gpu_type()` 选择是否启用 GPU；失败时回退 CPU。
+    - 模型由 `ocr_engines` 注册表在进程内只加载一次（GPU 检测也只做一次）；
     - 将识别到的行文本按行拼接为一个字符串返回。
 
     返回：识别到的文本，失败返回 None。
     """
-    try:
-        from paddleocr import PaddleOCR
-    except Exception:
-        return None
-    gpu=(detect_gpu_type()=="nvidia")
-    try:
-        ocr=PaddleOCR(use_angle_cls=True, lang="ch", use_gpu=gpu)
-    except Exception:
-        ocr=PaddleOCR(use_angle_cls=True, lang="ch", use_gpu=False)
-    res=ocr.ocr(str(img_path), cls=True)
-    lines=[]
-    for page in res:
-        for line in page: lines.append(line[1][0])
-    return "\n".join(lines).strip()
+    return recognize("paddle", [img_path])[0]
 
 def _ocr_with_tesseract(img_path: Path) -> Optional[str]:
     """使用 Tesseract 识别中文简体+英文，作为 PaddleOCR 的备选方案。"""
-    try:
-        import pytesseract
-        return pytesseract.image_to_string(Image.open(img_path), lang="chi_sim+eng")
-    except Exception:
-        return None
-
-_pix2tex_model=None
+    return recognize("tesseract", [img_path])[0]
 
 def _ocr_formula_with_pix2tex(img_path: Path) -> Optional[str]:
     """使用本地 pix2tex 模型识别公式为 LaTeX。
 
-    - 懒加载并缓存 `LatexOCR` 模型到 `_pix2tex_model`，避免重复初始化开销。
+    - `LatexOCR` 模型由 `ocr_engines` 注册表懒加载并缓存，避免重复初始化开销。
     - 返回识别到的 LaTeX 字符串；失败返回 None。
     """
-    global _pix2tex_model
-    try:
-        from pix2tex.cli import LatexOCR
-        if _pix2tex_model is None: _pix2tex_model=LatexOCR()
-        img=Image.open(img_path).convert("RGB")
-        return (_pix2tex_model(img) or "").strip()
-    except Exception as e:
-        print("[WARN] pix2tex failed:", e); return None
+    return recognize("pix2tex", [img_path])[0]
 
 def _ocr_formula_with_mathpix(img_path: Path) -> Optional[str]:
     """调用 MathPix API 识别公式为 LaTeX（需要环境变量凭据）。
 
     需要设置：`MATHPIX_APP_ID` 与 `MATHPIX_APP_KEY`；若缺失直接返回 None。
-    优先返回 `latex_styled` 字段，其次回退到 `latex`。
+    请求经由 `mathpix_client` 的共享连接池、限流、重试与结果缓存。
     """
-    app_id=os.getenv("MATHPIX_APP_ID"); app_key=os.getenv("MATHPIX_APP_KEY")
-    if not (app_id and app_key): return None
-    try:
-        import base64, requests
-        with open(img_path,"rb") as f: b64=base64.b64encode(f.read()).decode()
-        headers={"app_id":app_id,"app_key":app_key}
-        data={"src":f"data:image/png;base64,{b64}","formats":["latex_styled"]}
-        r=requests.post("https://api.mathpix.com/v3/text", headers=headers, json=data, timeout=20)
-        if r.ok:
-            js=r.json(); return (js.get("latex_styled") or js.get("latex") or "").strip() or None
-    except Exception as e:
-        print("[WARN] MathPix failed:", e)
-    return None
+    from .mathpix_client import get_client  # 延迟导入：asyncio/ssl 只在真正调用 MathPix 时加载
+    client=get_client()
+    if client is None: return None
+    return client.recognize([img_path])[0]
 
 def run_ocr(img_path: Path, use_pix2tex: bool=True) -> Dict[str, Any]:
     """对单张图片执行文本 OCR 与公式 OCR。
@@ -85,3 +49,49 @@ def run_ocr(img_path: Path, use_pix2tex: bool=True) -> Dict[str, Any]:
     latex=_ocr_formula_with_pix2tex(img_path) if use_pix2tex else None
     if latex is None: latex=_ocr_formula_with_mathpix(img_path)
     return {"text": text, "latex": latex}
+
+def run_ocr_batch(img_paths: Sequence[Path], use_pix2tex: bool=True) -> List[Dict[str, Any]]:
+    """`run_ocr` 的批量版本：每种引擎对整批图片只调用一次 `recognize`。
+
+    - 文本：整批先走 PaddleOCR，仅对其失败/为空的图片再走 Tesseract；
+    - 公式：整批走 pix2tex（若启用），仅对失败的图片并发回退 MathPix。
+
+    返回：与 `img_paths` 顺序一致的 [{"text", "latex"}] 列表。
+    """
+    imgs=[Path(p) for p in img_paths]
+    texts=recognize("paddle", imgs)
+    miss=[i for i,t in enumerate(texts) if not t]
+    if miss:
+        for i,t in zip(miss, recognize("tesseract", [imgs[i] for i in miss])): texts[i]=t
+    latex=recognize("pix2tex", imgs) if use_pix2tex else [None]*len(imgs)
+    miss=[i for i,l in enumerate(latex) if l is None]
+    client=None
+    if miss:
+        from .mathpix_client import get_client
+        client=get_client()
+    if client is not None:
+        for i,l in zip(miss, client.recognize([imgs[i] for i in miss])): latex[i]=l
+    return [{"text": t or "", "latex": l} for t,l in zip(texts, latex)]
+
+def _image_size(img_path: Path) -> tuple:
+    """读取图片尺寸 (宽, 高)；只解析文件头，不解码像素。失败时退化为按文件大小估计。"""
+    try:
+        from PIL import Image
+        with Image.open(img_path) as im:
+            return im.size
+    except Exception:
+        try:
+            return (Path(img_path).stat().st_size, 1)
+        except Exception:
+            return (0, 0)
+
+def batch_by_size(img_paths: Sequence[Path], batch_size: int=8) -> List[List[int]]:
+    """将图片按尺寸相近分组为批次，返回每批的原始下标列表。
+
+    - 先按 (高, 宽) 排序，使同批图片尺寸接近，便于引擎按批识别；
+    - 调用方需按下标把结果放回原顺序。
+    """
+    batch_size=max(1, int(batch_size))
+    sizes=[_image_size(p) for p in img_paths]
+    order=sorted(range(len(img_paths)), key=lambda i: (sizes[i][1], sizes[i][0]))
+    return [order[i:i+batch_size] for i in range(0, len(order), batch_size)]
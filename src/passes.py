@@ -0,0 +1,133 @@
+"""
+passes.py
+---------
+文本遍（pass）管理器：把“读文件 → 正则改写 → 写回”的零散脚本合并为一次读、多遍内存改写、一次写：
+1) `Pass` 为一个 `str -> str` 的纯函数遍；`PassManager` 按登记顺序在内存缓冲区上依次执行；
+2) 逐遍计时：记录每遍的累计耗时、调用次数与实际改动次数，`report()` 输出汇总；
+3) 文件模式：`run_file()` 只读一次、只在内容变化时写一次；
+4) 批量模式：`run_batch()` 用进程池并行处理多个文件，并把各进程的计时合并回来
+   （遍函数须为模块级函数，才能被子进程按名导入）。
+
+TeX 的遍注册表见 `scripts/tex_passes.py`，Markdown（worksheet.md 归一、链接修复、切分）的见 `scripts/md_passes.py`。
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import time
+
+
+@dataclass(frozen=True)
+class Pass:
+    """一个文本遍：`fn(text) -> text`；`name` 用于注册、选择与计时。"""
+
+    name: str
+    fn: Callable[[str], str]
+    doc: str = ""
+
+
+class PassRegistry:
+    """按名称登记遍，并按名称列表组装 `PassManager`。"""
+
+    def __init__(self) -> None:
+        self._passes: Dict[str, Pass] = {}
+
+    def register(self, name: str, fn: Callable[[str], str], doc: str = "") -> Pass:
+        if name in self._passes:
+            raise ValueError(f"duplicate pass: {name}")
+        p = Pass(name, fn, doc)
+        self._passes[name] = p
+        return p
+
+    def names(self) -> List[str]:
+        return list(self._passes)
+
+    def get(self, name: str) -> Pass:
+        try:
+            return self._passes[name]
+        except KeyError:
+            raise KeyError(f"unknown pass: {name} (known: {', '.join(self._passes)})") from None
+
+    def manager(self, names: Sequence[str]) -> "PassManager":
+        return PassManager([self.get(n) for n in names])
+
+
+def _run_file_job(job: Tuple[List[Pass], Path, Optional[Path], str]) -> Tuple[Path, bool, Dict[str, List[float]], Optional[str]]:
+    """进程池任务：处理单个文件，返回 (路径, 是否改动, 计时, 错误信息)。"""
+    passes, path, out, encoding = job
+    pm = PassManager(passes)
+    try:
+        changed = pm.run_file(path, out, encoding)
+        return path, changed, pm.stats, None
+    except Exception as e:
+        return path, False, pm.stats, str(e)
+
+
+class PassManager:
+    """按顺序在内存中执行一组文本遍。
+
+    - stats: {遍名: [累计秒数, 调用次数, 改动次数]}，跨多次 `run()` 累加。
+    """
+
+    def __init__(self, passes: Iterable[Pass]) -> None:
+        self.passes: List[Pass] = list(passes)
+        self.stats: Dict[str, List[float]] = {p.name: [0.0, 0, 0] for p in self.passes}
+
+    def run(self, text: str) -> str:
+        """依次执行全部遍并返回结果文本。"""
+        for p in self.passes:
+            t0 = time.perf_counter()
+            new = p.fn(text)
+            st = self.stats[p.name]
+            st[0] += time.perf_counter() - t0
+            st[1] += 1
+            if new != text:
+                st[2] += 1
+            text = new
+        return text
+
+    def run_file(self, path: Path, out: Optional[Path] = None, encoding: str = "utf-8") -> bool:
+        """读一次 `path`，执行全部遍，内容变化（或指定了 `out`）时写一次；返回内容是否变化。"""
+        src = Path(path).read_text(encoding=encoding)
+        dst = self.run(src)
+        changed = dst != src
+        if out is not None or changed:
+            Path(out or path).write_text(dst, encoding="utf-8")
+        return changed
+
+    def merge_stats(self, stats: Dict[str, List[float]]) -> None:
+        for name, (secs, calls, changed) in stats.items():
+            st = self.stats.setdefault(name, [0.0, 0, 0])
+            st[0] += secs; st[1] += calls; st[2] += changed
+
+    def run_batch(self, paths: Sequence[Path], workers: int = 1, encoding: str = "utf-8") -> Tuple[List[Path], List[Tuple[Path, str]]]:
+        """就地处理多个文件；`workers > 1` 且文件多于一个时使用进程池。
+
+        返回：(发生改动的文件列表, [(失败文件, 错误信息)])。
+        """
+        jobs = [(self.passes, Path(p), None, encoding) for p in paths]
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as ex:
+                results = list(ex.map(_run_file_job, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+        else:
+            results = [_run_file_job(j) for j in jobs]
+        changed: List[Path] = []
+        failed: List[Tuple[Path, str]] = []
+        for path, ch, stats, err in results:
+            self.merge_stats(stats)
+            if err:
+                failed.append((path, err))
+            elif ch:
+                changed.append(path)
+        return changed, failed
+
+    def report(self) -> str:
+        """逐遍计时汇总（多行文本）。"""
+        total = sum(st[0] for st in self.stats.values())
+        w = max([28] + [len(n) + 2 for n in self.stats])
+        rows = [f"{'pass':<{w}}{'ms':>10}{'calls':>8}{'changed':>9}"]
+        for name, (secs, calls, changed) in self.stats.items():
+            rows.append(f"{name:<{w}}{secs * 1000:>10.2f}{int(calls):>8}{int(changed):>9}")
+        rows.append(f"{'total':<{w}}{total * 1000:>10.2f}")
+        return "\n".join(rows)
@@ -0,0 +1,97 @@
+"""
+pdf_shard.py
+------------
+大 PDF 按页码区间分片：
+1) 用 pypdfium2 读取页数，超过 `SHARD_PAGES` 页的 PDF 被切成若干连续页码区间的小 PDF；
+2) 分片文件名带页码区间（`<stem>__p0001-0040.pdf`），按文件名排序即为原始页序；
+3) 分片由 `mineru_integration` 并发交给 MinerU 解析，再按页序拼接文本与图片目录；
+4) 源 PDF 内容与每片页数不变时直接沿用已有分片文件（pypdfium2 每次保存都会写入新的 `/ID`，
+   重新切分会让分片字节变化、使各分片的 MinerU 指纹清单失效）。
+
+配置：`configure()` 或环境变量 `MINERU_SHARD_PAGES`（0 表示不分片）、`MINERU_SHARD_WORKERS`。
+"""
+
+from pathlib import Path
+from typing import List
+import json
+import os
+
+from .utils import file_sha256
+
+SHARD_PAGES = int(os.getenv("MINERU_SHARD_PAGES") or 40)
+SHARD_WORKERS = int(os.getenv("MINERU_SHARD_WORKERS") or 2)
+
+
+def configure(pages: int = None, workers: int = None) -> None:
+    """设置每片页数（<=0 关闭分片）与并发解析的分片数。"""
+    global SHARD_PAGES, SHARD_WORKERS
+    if pages is not None:
+        SHARD_PAGES = int(pages)
+    if workers is not None:
+        SHARD_WORKERS = max(1, int(workers))
+
+
+def page_count(pdf_path: Path) -> int:
+    """PDF 页数；pypdfium2 不可用或文件无法打开时返回 0。"""
+    try:
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(str(pdf_path))
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    except Exception:
+        return 0
+
+
+def needs_sharding(path: Path, shard_pages: int = None) -> bool:
+    """是否为需要分片的大 PDF（页数超过每片页数）。"""
+    n = SHARD_PAGES if shard_pages is None else shard_pages
+    if n <= 0 or path.suffix.lower() != ".pdf":
+        return False
+    return page_count(path) > n
+
+
+def split_pdf(pdf_path: Path, out_dir: Path, shard_pages: int = None) -> List[Path]:
+    """按每片 `shard_pages` 页切分 PDF，返回按页序排列的分片路径列表。
+
+    - 分片写入 `out_dir/<stem>__pAAAA-BBBB.pdf`（页码从 1 开始、含两端）；
+    - `out_dir/<stem>__shards.json` 记录源 PDF 的 SHA-256、每片页数与分片列表；三者一致且分片都在时
+      直接返回已有分片，不重新保存；
+    - 需要重新切分时先删除旧分片，避免源文件变短后残留多余分片。
+    """
+    n = SHARD_PAGES if shard_pages is None else shard_pages
+    out_dir.mkdir(parents=True, exist_ok=True)
+    record_path = out_dir / f"{pdf_path.stem}__shards.json"
+    record = {"source": file_sha256(pdf_path), "pages": n}
+    try:
+        old = json.loads(record_path.read_text(encoding="utf-8"))
+        kept = [out_dir / name for name in old.get("shards", [])]
+        if {k: old.get(k) for k in record} == record and kept and all(p.exists() for p in kept):
+            return kept
+    except Exception:
+        pass
+
+    import pypdfium2 as pdfium
+    record_path.unlink(missing_ok=True)
+    for old in out_dir.glob(f"{pdf_path.stem}__p*.pdf"):
+        old.unlink()
+    src = pdfium.PdfDocument(str(pdf_path))
+    shards: List[Path] = []
+    try:
+        total = len(src)
+        for start in range(0, total, n):
+            end = min(start + n, total)
+            dst = pdfium.PdfDocument.new()
+            try:
+                dst.import_pages(src, list(range(start, end)))
+                shard = out_dir / f"{pdf_path.stem}__p{start + 1:04d}-{end:04d}.pdf"
+                dst.save(str(shard))
+            finally:
+                dst.close()
+            shards.append(shard)
+    finally:
+        src.close()
+    record["shards"] = [p.name for p in shards]
+    record_path.write_text(json.dumps(record, indent=1), encoding="utf-8")
+    return shards
@@ -1,17 +1,26 @@
 from pathlib import Path
+import os
 import re
 import subprocess
-import shutil
 import time, atexit
 from typing import List, Dict, Any, Tuple
 import argparse
+import contextlib
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
 from .split_questions import cut_questions
-from .ocr_extract import run_ocr
+from .ocr_extract import run_ocr_batch, batch_by_size
+from .ocr_cache import OCRCache, engine_fingerprint
 from .structure_parser import parse_question_v2 as parse_question
-from .export_md import export_markdown
-from .export_tex import export_latex
+from .export_md import MarkdownWriter
+from .export_tex import LatexWriter
 from .utils import ensure_dir
-from .mineru_integration import mineru_parse_to_questions
+from .mineru_integration import mineru_auto_dir, mineru_parse_page, mineru_parse_many, robust_question_blocks
+from .mineru_helper import MinerUHelper
+from .image_store import IMAGE_EXTS, ImageStore, tree_signature
+from . import linkcopy
+from . import pdf_shard
+from . import tex_scan
+from .stream import Stage, StreamPipeline
 
 __RUN_T0 = time.perf_counter()
 def __print_total_elapsed():
@@ -56,46 +65,176 @@ def md_to_pandoc_tex(md_path: Path, out_tex: Path) -> Path:
     try:
         # 移除 pandoc 的 \pandocbounded{...} 包裹，避免图片不显示
         tex = out_tex.read_text(encoding="utf-8", errors="ignore")
-        tex = re.sub(r"\\pandocbounded\{([\s\S]*?)\}", r"\1", tex)
+        tex = tex_scan.unwrap(tex, ["pandocbounded"])
         out_tex.write_text(tex, encoding="utf-8")
     except Exception as e:
         print("[WARN] 清理 pandocbounded 时出错：", e)
     return out_tex
 
-def process_images(images_dir: Path, tmp_dir: Path) -> List[Path]:
-    """对 `images_dir` 下的图片进行题块切分并输出到 `tmp_dir`。
+IMAGE_SUFFIXES = [".png",".jpg",".jpeg",".bmp",".tif",".tiff"]
 
-    - 仅处理常见图片后缀（png/jpg/jpeg/bmp/tif/tiff），忽略其他文件。
-    - 调用 `cut_questions` 对每张图片做粗分割，返回所有切割后的图片路径列表。
-    """
-    ensure_dir(tmp_dir); outs=[]
-    for p in sorted(images_dir.glob("*.*")):
-        if p.suffix.lower() not in [".png",".jpg",".jpeg",".bmp",".tif",".tiff"]: continue
-        outs.extend(cut_questions(p, tmp_dir))
-    return outs
+def list_images(images_dir: Path) -> List[Path]:
+    """`images_dir` 下的常见图片（png/jpg/jpeg/bmp/tif/tiff），按文件名排序。"""
+    return [p for p in sorted(images_dir.glob("*.*")) if p.suffix.lower() in IMAGE_SUFFIXES]
+
+def ocr_executor(workers: int, backend: str = "thread") -> Executor:
+    """OCR 并发池：`"thread"` 为线程池，`"process"` 为进程池（每个子进程各自常驻一套引擎）。"""
+    if backend == "process":
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
 
-def ocr_and_structure(crops: List[Path], use_pix2tex: bool) -> Tuple[List[Dict[str, Any]], List[str]]:
+def ocr_and_structure(
+    crops: List[Path],
+    use_pix2tex: bool,
+    workers: int = 1,
+    backend: str = "thread",
+    batch_size: int = 8,
+    cache: OCRCache = None,
+    executor: Executor = None,
+) -> Tuple[List[Dict[str, Any]], List[str]]:
     """对切分得到的小图执行 OCR，并解析题目结构。
 
+    - 小图按尺寸相近分批（`batch_by_size`），每批调用一次 `run_ocr_batch`；
+    - `workers > 1` 时各批并发执行：`backend="thread"` 用线程池，`"process"` 用进程池
+      （每个子进程各自加载一次模型，适合多核 CPU）；
+    - 传入 `executor` 时各批提交到这个由调用方创建、整个运行期间复用的池（忽略 `workers`/`backend`），
+      逐页调用也不会每页新建进程池、重新加载模型；
+    - 结果按原始小图顺序回填，输出顺序与 `crops` 一致；
+    - 传入 `cache` 时先按图片内容哈希查缓存，只有未命中的小图才进入 OCR，识别结果随后写回缓存。
+
     返回：
     - questions: 结构化题目列表（题号/题干/选项/答案等）。
     - latex: 每张小图识别到的公式 LaTeX 字符串列表（可能含 None）。
     """
+    results: List[Dict[str, Any]] = [{}] * len(crops)
+    keys: List[str] = [""] * len(crops)
+    todo = list(range(len(crops)))
+    if cache is not None:
+        version = engine_fingerprint(use_pix2tex)
+        params = {"use_pix2tex": use_pix2tex}
+        todo = []
+        for i, img in enumerate(crops):
+            keys[i] = cache.make_key(img, "run_ocr", version, params)
+            hit = cache.get(keys[i])
+            if hit is None:
+                todo.append(i)
+            else:
+                results[i] = hit
+    pending = [crops[i] for i in todo]
+    batches = [[todo[j] for j in b] for b in batch_by_size(pending, batch_size)]
+    if executor is None and (workers <= 1 or len(batches) <= 1):
+        for b in batches:
+            for i, o in zip(b, run_ocr_batch([crops[i] for i in b], use_pix2tex)):
+                results[i] = o
+    elif batches:
+        with contextlib.ExitStack() as stack:
+            ex = executor or stack.enter_context(ocr_executor(workers, backend))
+            futs = {ex.submit(run_ocr_batch, [crops[i] for i in b], use_pix2tex): b for b in batches}
+            for fut in as_completed(futs):
+                for i, o in zip(futs[fut], fut.result()):
+                    results[i] = o
+    if cache is not None:
+        for i in todo:
+            # 引擎全部不可用时结果为空，不写缓存，避免安装引擎后仍命中空结果
+            if results[i].get("text") or results[i].get("latex"):
+                cache.put(keys[i], "run_ocr", results[i])
     qs=[]; ltx=[]
-    for img in crops:
-        o=run_ocr(img, use_pix2tex=use_pix2tex)
+    for o in results:
         q=parse_question(o.get("text") or ""); qs.append(q); ltx.append(o.get("latex"))
     return qs, ltx
 
-def main():
+def sync_mineru_page_images(page: Path, out_dir: Path, store: ImageStore) -> None:
+    """把当前页面 MinerU 产出的图片按内容入库（已有同内容 blob 时只登记名字，不复制）。
+
+    - 图片目录的签名与索引中记录的一致时（重跑未变化的页面）直接跳过，不再逐张计算哈希。
+    """
+    images = mineru_auto_dir(out_dir/"_mineru_tmp", page)/"images"
+    try:
+        if images.exists():
+            sig = tree_signature(images)
+            if store.source_sig(page.stem) != sig:
+                store.add_tree(page.stem, images)
+                store.set_source_sig(page.stem, sig)
+    except Exception:
+        pass
+
+def structure_mineru_page(
+    page: Path,
+    blocks: List[Dict[str, Any]],
+    out_dir: Path,
+    store: ImageStore,
+    repo_root: Path,
+) -> Tuple[List[Dict[str, Any]], List[str], List[Path]]:
+    """把单页题目块中的图片链接改写到 qs_image_DB 的 blob 并解析题目结构。"""
+    qs=[]; ltx=[]; imgs=[]
+    auto_dir = mineru_auto_dir(out_dir/"_mineru_tmp", page)
+    root = repo_root.resolve()
+    def _repl(md: re.Match) -> str:
+        alt = md.group(1)
+        relp = (md.group(2) or "").strip()
+        if relp.startswith("./"):
+            relp = relp[2:]
+        new_url = relp
+        try:
+            p = auto_dir/relp
+            blob = store.lookup(page.stem, p.name)
+            if blob is None and p.suffix.lower() in IMAGE_EXTS and p.exists():
+                blob = store.add(p, page.stem)
+            if blob is not None:
+                new_url = "../" + blob.resolve().relative_to(root).as_posix()
+        except Exception:
+            pass
+        return f"![{alt}]({new_url})"
+    for b in blocks:
+        text = b.get("text") or ""
+        # 将题干内的 Markdown 图片链接改写为指向仓库根 qs_image_DB 中的 blob，确保渲染全部图片
+        try:
+            text = re.sub(r"!\[([^\]]*)\]\(([^)]+)\)", _repl, text)
+        except Exception:
+            pass
+        q=parse_question(text); qs.append(q); ltx.append(None); imgs.append(None)
+    return qs, ltx, imgs
+
+def _open_writers(fmt: str, out_dir: Path, stack: contextlib.ExitStack) -> list:
+    """按导出格式打开流式写出器（Markdown/LaTeX），由 `stack` 负责关闭。"""
+    writers=[]
+    if fmt in ("md","both"): writers.append(stack.enter_context(MarkdownWriter(out_dir)))
+    if fmt in ("tex","both"): writers.append(stack.enter_context(LatexWriter(out_dir)))
+    return writers
+
+def _finish_exports(writers: list) -> None:
+    for w in writers:
+        if isinstance(w, MarkdownWriter):
+            print("[OK] 导出 Markdown:", w.path)
+            # 额外：将 Markdown 转成 LaTeX（pandoc），写入 worksheet_pandoc.tex
+            pandoc_tex = md_to_pandoc_tex(w.path, w.out_dir/"worksheet_pandoc.tex")
+            if pandoc_tex: print("[OK] Pandoc LaTeX:", pandoc_tex)
+        else:
+            print("[OK] 导出 LaTeX:", w.path)
+
+def main(argv=None):
     """命令行入口：组合 MinerU/切图 + OCR + 导出为 Markdown/LaTeX。
 
+    各步骤以流式流水线（`src/stream.py`）运行，阶段之间由有界队列连接：
+    - MinerU 模式：mineru 解析 → 题块切分 → 图片同步 → 题目解析 → 导出；
+    - 切图模式：切图 → OCR 与题目解析 → 导出；
+    第 N 页导出、复制图片的同时即可解析第 N+1 页，Markdown/LaTeX 逐题写出。
+
     关键参数：
     - --images_dir: 输入目录（图片或 PDF）；
     - --out_dir: 输出目录（会创建）；
     - --format: md/tex/both；
     - --use_pix2tex: 启用本地公式识别；
-    - --use_mineru: 使用 MinerU 解析 PDF/整页为题目文本块。
+    - --use_mineru: 使用 MinerU 解析 PDF/整页为题目文本块；
+    - --mineru_backend: MinerU 解析后端（auto/api/cli）；
+    - --no_mineru_batch: 关闭 CLI 后端的整批预解析（进程内 API 后端总是逐页流式解析）；
+    - --page_workers: MinerU 模式下并发解析/同步页面的线程数（结果仍按页面顺序写出）；
+    - --queue_size: 阶段之间队列的容量（背压，限制在途页面数）；
+    - --shard_pages / --shard_workers: 大 PDF 每片页数（0 不分片）与并发解析的分片数；
+    - --ocr_workers / --ocr_backend / --ocr_batch_size: 本地 OCR 的并发数、并发方式（thread/process）与批大小；
+    - --no_ocr_cache / --ocr_cache_max_mb: 关闭 OCR 结果缓存 / 缓存大小上限；
+    - --link_mode: 图片放置方式（auto/reflink/hardlink/symlink/copy，见 `src/linkcopy.py`）。
     """
     ap=argparse.ArgumentParser()
     ap.add_argument("--images_dir", required=True)
@@ -103,7 +242,25 @@ def main():
     ap.add_argument("--format", choices=["md","tex","both"], default="both")
     ap.add_argument("--use_pix2tex", action="store_true")
     ap.add_argument("--use_mineru", action="store_true")
-    args=ap.parse_args()
+    ap.add_argument("--mineru_backend", choices=["auto","api","cli"], default=MinerUHelper.backend,
+                    help="auto: 优先进程内 API（模型常驻），不可用时回退 CLI")
+    ap.add_argument("--no_mineru_batch", action="store_true",
+                    help="CLI 后端也逐页流式调用 MinerU，而不是先整批一次调用")
+    ap.add_argument("--page_workers", type=int, default=min(4, os.cpu_count() or 1),
+                    help="MinerU 模式下并发处理页面的线程数")
+    ap.add_argument("--queue_size", type=int, default=2, help="流水线阶段之间队列的容量")
+    ap.add_argument("--shard_pages", type=int, default=pdf_shard.SHARD_PAGES,
+                    help="超过该页数的 PDF 按页码区间分片并发解析（0 表示不分片）")
+    ap.add_argument("--shard_workers", type=int, default=pdf_shard.SHARD_WORKERS)
+    ap.add_argument("--ocr_workers", type=int, default=1)
+    ap.add_argument("--ocr_backend", choices=["thread","process"], default="thread")
+    ap.add_argument("--ocr_batch_size", type=int, default=8)
+    ap.add_argument("--link_mode", choices=["auto",*linkcopy.MODES], default=linkcopy.MODE,
+                    help="图片入库/分片合并时的放置方式（auto：reflink → hardlink → copy，按文件系统自动选择）")
+    ap.add_argument("--no_ocr_cache", action="store_true", help="不读写 <out_dir>/.ocr_cache.sqlite")
+    ap.add_argument("--ocr_cache_max_mb", type=int, default=256)
+    args=ap.parse_args(argv)
+    linkcopy.configure(args.link_mode)
     images_dir=Path(args.images_dir); out_dir=Path(args.out_dir); ensure_dir(out_dir)
     crops_dir=out_dir/"images"; ensure_dir(crops_dir)
     # 全局题图资源库（项目根目录）
@@ -118,106 +275,79 @@ def main():
     atexit.register(_print_elapsed)
 
     if args.use_mineru:
-        qs=[]; ltx=[]; imgs=[]
-        pages=[p for p in sorted(images_dir.glob("*.*")) if p.suffix.lower() in [".png",".jpg",".jpeg",".bmp",".tif",".tiff",".pdf"]]
+        MinerUHelper.set_backend(args.mineru_backend)
+        pdf_shard.configure(args.shard_pages, args.shard_workers)
+        pages=[p for p in sorted(images_dir.glob("*.*")) if p.suffix.lower() in IMAGE_SUFFIXES+[".pdf"]]
         if not pages: print("未在 images_dir 中找到可处理文件（图片或 PDF）。"); return
-        for page in pages:
-            blocks=mineru_parse_to_questions(page, out_dir/"_mineru_tmp")
-            # 基于分段文本中的 Markdown 图片为每题挑选插图（若无，则不附图）
-            auto_dir = out_dir/"_mineru_tmp"/page.stem/"auto"
-            # 同步当前页面的 MinerU 产出目录到 qs_image_DB（保留原有层级）
-            try:
-                mineru_root = out_dir/"_mineru_tmp"
-                if auto_dir.exists():
-                    rel = auto_dir.resolve().relative_to(mineru_root.resolve())
-                    dst_auto = qs_image_db/rel
-                    ensure_dir(dst_auto)
-                    for src_path in auto_dir.rglob('*'):
-                        if src_path.is_file():
-                            dst_path = dst_auto/src_path.relative_to(auto_dir)
-                            ensure_dir(dst_path.parent)
-                            if not dst_path.exists():
-                                try:
-                                    shutil.copy2(src_path, dst_path)
-                                except Exception:
-                                    pass
-            except Exception:
-                pass
-            for idx, b in enumerate(blocks):
-                text = b.get("text") or ""
-                img_paths = []
-                for m in re.finditer(r"!\[[^\]]*\]\(([^)]+)\)", text):
-                    relp = m.group(1).strip()
-                    # 仅处理相对路径 images/*
-                    if relp.startswith("./"): relp = relp[2:]
-                    p = (auto_dir/relp).resolve()
-                    if p.suffix.lower() in [".jpg",".jpeg",".png",".bmp"] and p.exists():
-                        img_paths.append(p)
-                final_img=None
-                if img_paths:
-                    # 取体积最大的作为代表图
-                    img_paths.sort(key=lambda p: p.stat().st_size, reverse=True)
-                    chosen = img_paths[0]
-                    dst_name=f"{page.stem}_{idx}_{chosen.name}"
-                    dst_path=crops_dir/dst_name
-                    try:
-                        if not dst_path.exists():
-                            shutil.copy2(chosen, dst_path)
-                        final_img = dst_path if dst_path.exists() else None
-                    except Exception:
-                        final_img=None
-                # 将代表图复制/指向到全局图片库 qs_image_DB，并使用其路径作为最终引用
-                if img_paths:
-                    try:
-                        img_paths.sort(key=lambda p: p.stat().st_size, reverse=True)
-                        chosen2 = img_paths[0]
-                        rel_from_mineru = chosen2.resolve().relative_to((out_dir/"_mineru_tmp").resolve())
-                        dst_in_db = qs_image_db/rel_from_mineru
-                        ensure_dir(dst_in_db.parent)
-                        if not dst_in_db.exists():
-                            shutil.copy2(chosen2, dst_in_db)
-                        if dst_in_db.exists():
-                            final_img = dst_in_db
-                    except Exception:
-                        pass
-                # 将题干内的 Markdown 图片链接改写为指向仓库根的 qs_image_DB，确保渲染全部图片
-                try:
-                    def _repl(md: re.Match) -> str:
-                        alt = md.group(1)
-                        relp = (md.group(2) or "").strip()
-                        if relp.startswith("./"):
-                            relp = relp[2:]
-                        new_url = relp
-                        try:
-                            mineru_root = (out_dir/"_mineru_tmp").resolve()
-                            p = (auto_dir/relp).resolve()
-                            rel_from_mineru = p.relative_to(mineru_root)
-                            target = (qs_image_db/rel_from_mineru).resolve()
-                            new_url = ("../" + target.relative_to(repo_root.resolve()).as_posix())
-                        except Exception:
-                            pass
-                        return f"![{alt}]({new_url})"
-                    text = re.sub(r"!\[([^\]]*)\]\(([^)]+)\)", _repl, text)
-                except Exception:
-                    pass
-                q=parse_question(text); qs.append(q); ltx.append(None); imgs.append(None)
-        if args.format in ("md","both"):
-            md=export_markdown(qs, imgs, ltx, out_dir); print("[OK] 导出 Markdown:", md)
-            # 额外：将 Markdown 转成 LaTeX（pandoc），写入 worksheet_pandoc.tex
-            pandoc_tex = md_to_pandoc_tex(md, out_dir/"worksheet_pandoc.tex")
-            if pandoc_tex: print("[OK] Pandoc LaTeX:", pandoc_tex)
-        if args.format in ("tex","both"):
-            tex=export_latex(qs, imgs, ltx, out_dir); print("[OK] 导出 LaTeX:", tex)
+        mineru_tmp = out_dir/"_mineru_tmp"
+        # CLI 后端每次调用都要启动进程、加载模型，先整批解析一次；进程内 API 模型常驻，逐页流式解析首题更快
+        parsed = {}
+        if not args.no_mineru_batch and not MinerUHelper.use_api():
+            parsed = mineru_parse_many(pages, mineru_tmp)
+
+        def _parse(page: Path):
+            if page in parsed: return page, None, parsed[page]
+            return page, mineru_parse_page(page, mineru_tmp), None
+        def _split(item):
+            page, res, blocks = item
+            if blocks is None: blocks = robust_question_blocks(res) if res else []
+            return page, blocks
+        def _sync(item):
+            sync_mineru_page_images(item[0], out_dir, store)
+            return item
+        def _structure(item):
+            page, blocks = item
+            return structure_mineru_page(page, blocks, out_dir, store, repo_root)
+
+        workers = max(1, args.page_workers)
+        stream = StreamPipeline([
+            Stage("mineru", _parse, workers),
+            Stage("split", _split),
+            Stage("sync", _sync, workers),
+            Stage("parse", _structure),
+        ], queue_size=args.queue_size)
+        with contextlib.ExitStack() as stack:
+            # 图库只在 MinerU 模式下打开；异常退出时也会提交已登记的名字表并关闭索引
+            store = stack.enter_context(ImageStore(qs_image_db))
+            writers = _open_writers(args.format, out_dir, stack)
+            for pq, pl, pi in stream.run(pages):
+                for q, img, latex in zip(pq, pi, pl):
+                    for w in writers: w.write(q, img, latex)
+        print("[INFO] 流水线:", stream.summary())
+        print("[INFO] 图库:", store.stats, "放置方式:", linkcopy.summary())
+        _finish_exports(writers)
         return
 
-    crops=process_images(images_dir, crops_dir)
-    if not crops: print("未在 images_dir 中找到可处理图片。"); return
-    qs,ltx=ocr_and_structure(crops, args.use_pix2tex)
-    if args.format in ("md","both"):
-        md=export_markdown(qs, crops, ltx, out_dir); print("[OK] 导出 Markdown:", md)
-        pandoc_tex = md_to_pandoc_tex(md, out_dir/"worksheet_pandoc.tex")
-        if pandoc_tex: print("[OK] Pandoc LaTeX:", pandoc_tex)
-    if args.format in ("tex","both"):
-        tex=export_latex(qs, crops, ltx, out_dir); print("[OK] 导出 LaTeX:", tex)
+    images=list_images(images_dir)
+    if not images: print("未在 images_dir 中找到可处理图片。"); return
+    cache=None if args.no_ocr_cache else OCRCache(out_dir/".ocr_cache.sqlite", max_bytes=args.ocr_cache_max_mb*1024*1024)
+
+    # 池在整个运行期间只建一次：进程池的子进程与其中常驻的引擎跨页复用
+    pool = ocr_executor(args.ocr_workers, args.ocr_backend) if args.ocr_workers > 1 else None
+
+    def _ocr(crops: List[Path]):
+        qs, ltx = ocr_and_structure(crops, args.use_pix2tex, batch_size=args.ocr_batch_size,
+                                    cache=cache, executor=pool)
+        return qs, ltx, crops
+
+    stream = StreamPipeline([
+        Stage("crop", lambda p: cut_questions(p, crops_dir)),
+        Stage("ocr", _ocr),
+    ], queue_size=args.queue_size)
+    n = 0
+    with contextlib.ExitStack() as stack:
+        if pool is not None:
+            stack.enter_context(pool)
+        writers = _open_writers(args.format, out_dir, stack)
+        for qs, ltx, crops in stream.run(images):
+            n += len(crops)
+            for q, img, latex in zip(qs, crops, ltx):
+                for w in writers: w.write(q, img, latex)
+    print("[INFO] 流水线:", stream.summary())
+    if cache is not None:
+        print("[INFO] OCR 缓存:", cache.stats()); cache.close()
+    if not n:
+        print("未在 images_dir 中找到可处理图片。"); return
+    _finish_exports(writers)
 
 if __name__=="__main__": main()
@@ -0,0 +1,117 @@
+"""
+question_grammar.py
+-------------------
+题头文法：把散落在各处的题头正则合并为一个编译好的文法，一次扫描文档，产出带类型的记号流。
+1) 记号类型：question（【例1】/【题2】/第3题/例4./1.）、variant（【变式】/变式1）、
+   answer（【答案】/答案：/参考答案：）、analysis（解析：/详解：）、solution（解法1：/解法二：）、
+   sub（（1）/(2) 小问）、tag（其余【...】标题，如【方法点拨】）；
+2) 题头只在行首识别（允许前导空白与 `>` 引用符）；记号的 `start` 与旧正则的匹配起点一致
+   （包含其前的空行），切分时各段的边界因此保持不变；
+3) 切题（robust_question_blocks）、标题归一（normalize_md_question_titles）、切分 part（split_md_to_parts）
+   与 `parse_question_v2` 都消费这里的记号，按需挑选类型，不再各自维护正则；
+4) `scan()` 按文本缓存结果，同一份文本被多个消费者使用时只扫描一次。
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+import re
+
+QUESTION = "question"
+VARIANT = "variant"
+ANSWER = "answer"
+ANALYSIS = "analysis"
+SOLUTION = "solution"
+SUB = "sub"
+TAG = "tag"
+
+# 各消费者常用的类型集合
+SEGMENT_KINDS = frozenset({QUESTION, VARIANT, SUB})                      # 题块切分
+PART_KINDS = frozenset({QUESTION, VARIANT, ANSWER, ANALYSIS, SOLUTION})  # 切分 part
+TITLE_KINDS = frozenset({QUESTION, VARIANT, ANSWER, ANALYSIS, TAG})      # 单独成行的标题
+
+_KEYWORD_KIND = {
+    "例": QUESTION, "练习": QUESTION, "题": QUESTION, "变式": VARIANT,
+    "答案": ANSWER, "参考答案": ANSWER, "解析": ANALYSIS, "详解": ANALYSIS,
+}
+
+_GRAMMAR = re.compile(
+    r"(?m)^\s*(?:>\s*)*(?P<head>"
+    r"【\s*(?P<bkw>参考答案|答案|解析|详解|练习|例|题|变式)\s*(?P<bnum>\d*-*\d*)\s*】|"  # 【例1】/【变式1-1】/【答案】
+    r"第\s*(?P<dnum>\d+)\s*题|"                                                      # 第1题
+    r"解法\s*(?P<snum>\d+|[一二三四五六七八九十]+)\s*[:：]?|"                          # 解法1：/解法二
+    r"(?P<kw>参考答案|答案|解析|详解)\s*[:：]?|"                                      # 答案：/解析
+    r"(?P<ekw>例|练习|变式)\s*(?P<enum>\d+)(?:\s*[\.、．)])?|"                        # 例1 / 练习2. / 变式3
+    r"(?P<num>\d+)\s*(?P<sep>[\.、．)])(?!\d)|"                                      # 1. / 2、 / 3) （排除 1.5）
+    r"[（(]\s*(?P<sub>\d+)\s*[）)]|"                                                  # （1）/(2)
+    r"【(?P<tag>[^】\n]+)】"                                                          # 其他【...】标题
+    r")(?P<alone>[^\S\n]*$)?"
+)
+
+
+@dataclass(frozen=True)
+class Token:
+    """一个题头记号。
+
+    - kind: 记号类型（见模块常量）；
+    - label: 题头原文（如 "【例1】"、"1."、"解析："）；
+    - number: 题号/小问号/解法序号（无则为 None）；
+    - start: 匹配起点（含题头前的空白行与 `>`），用作段落切分边界；
+    - head: 题头文字起点；end: 题头文字终点；
+    - alone: 题头所在行除题头外是否只有空白（即“标题单独成行”）。
+    """
+
+    kind: str
+    label: str
+    number: Optional[str]
+    start: int
+    head: int
+    end: int
+    alone: bool
+
+    @property
+    def inner(self) -> str:
+        """【...】形式题头的括号内文字（已去空白）；其他形式返回 label。"""
+        if self.label.startswith("【") and self.label.endswith("】"):
+            return self.label[1:-1].strip()
+        return self.label
+
+
+def _token(m: "re.Match[str]") -> Token:
+    g = m.groupdict()
+    if g["bkw"]:
+        kind, number = _KEYWORD_KIND[g["bkw"]], g["bnum"] or None
+    elif g["dnum"]:
+        kind, number = QUESTION, g["dnum"]
+    elif g["snum"]:
+        kind, number = SOLUTION, g["snum"]
+    elif g["kw"]:
+        kind, number = _KEYWORD_KIND[g["kw"]], None
+    elif g["ekw"]:
+        kind, number = _KEYWORD_KIND[g["ekw"]], g["enum"]
+    elif g["num"]:
+        kind, number = QUESTION, g["num"]
+    elif g["sub"]:
+        kind, number = SUB, g["sub"]
+    else:
+        kind, number = TAG, None
+    return Token(kind, g["head"].strip(), number, m.start(), m.start("head"), m.end("head"), g["alone"] is not None)
+
+
+@lru_cache(maxsize=16)
+def scan(text: str) -> Tuple[Token, ...]:
+    """扫描整篇文本，按出现顺序返回全部题头记号（结果按文本缓存）。"""
+    return tuple(_token(m) for m in _GRAMMAR.finditer(text))
+
+
+def head_at(text: str, pos: int = 0) -> Optional[Token]:
+    """若 `pos` 处（可跳过空白/`>`）以题头开始，返回该记号，否则返回 None。"""
+    m = _GRAMMAR.match(text, pos)
+    return _token(m) if m else None
+
+
+def segments(text: str, kinds=SEGMENT_KINDS):
+    """按 `kinds` 类型的题头把文本切成 (Token, 段落文本) 列表；第一个题头之前的内容不返回。"""
+    heads = [t for t in scan(text) if t.kind in kinds]
+    bounds = [t.start for t in heads] + [len(text)]
+    return [(t, text[bounds[i]:bounds[i + 1]]) for i, t in enumerate(heads)]
@@ -1,9 +1,11 @@
 from pathlib import Path
 from typing import List, Tuple
-import cv2, numpy as np
+
+# cv2 在首次使用时才导入：MinerU 模式与仅导出的运行不需要 OpenCV
 
 def preprocess(img):
     """预处理：去噪 + 自适应阈值，生成二值图以利于版面分析。"""
+    import cv2
     gray=cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     gray=cv2.fastNlMeansDenoising(gray, h=10)
     bw=cv2.adaptiveThreshold(gray,255,cv2.ADAPTIVE_THRESH_MEAN_C,cv2.THRESH_BINARY,35,10)
@@ -16,6 +18,7 @@ def find_question_boxes(bw)->List[Tuple[int,int,int,int]]:
     - 过滤小区域噪声（以图像面积比例设下限）；
     - 返回按 (y, x) 排序的矩形列表 (x, y, w, h)。
     """
+    import cv2
     k=cv2.getStructuringElement(cv2.MORPH_RECT,(5,2)); dil=cv2.dilate(255-bw,k,1)
     cnts,_=cv2.findContours(dil,cv2.RETR_EXTERNAL,cv2.CHAIN_APPROX_SIMPLE)
     H,W=bw.shape[:2]; min_area=max(2500,(H*W)//500); boxes=[]
@@ -33,6 +36,7 @@ def cut_questions(page_path: Path, out_dir: Path) -> List[Path]:
     - 输出文件名格式：`<stem>_q{i}.png`；
     - 返回所有切割后图片的路径列表。
     """
+    import cv2
     img=cv2.imread(str(page_path)); bw=preprocess(img); boxes=find_question_boxes(bw)
     if not boxes:
         out=out_dir/f"{page_path.stem}_q1.png"; cv2.imwrite(str(out),img); return [out]
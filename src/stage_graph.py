@@ -0,0 +1,208 @@
+"""
+stage_graph.py
+--------------
+声明式阶段图（DAG）与增量重建：
+1) 每个阶段声明输入（文件/目录，含实现该阶段的脚本源码）、输出与参数；
+2) 阶段运行后记录输入内容指纹（SHA-256）与参数哈希到状态文件；重跑时若输入、参数均未变化
+   且输出仍存在，则跳过该阶段；
+3) 输入指纹在阶段运行**之后**记录，因此就地修改输入的阶段（如改写 worksheet.md 的链接）不会让自己
+   在下次运行时被误判为过期；
+4) 展开阶段（`expand`）在运行时生成子阶段（如 qs_DB 下每个 part 一个 v1/v2 阶段），
+   每个子阶段独立记录指纹，只改动一个 part 时只重跑该 part；
+5) 文件哈希按 (大小, mtime) 缓存在状态文件中，未改动的大文件不会被重复读取。
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+import hashlib
+import json
+import os
+import time
+
+from .utils import file_sha256
+
+PathSpec = Union[Sequence[Path], Callable[[], Iterable[Path]]]
+STATE_VERSION = 1
+_SKIP_DIRS = {"__pycache__", ".git"}
+
+
+@dataclass
+class Stage:
+    """阶段定义。
+
+    - name: 唯一名称（也是状态文件中的键）；
+    - run: 执行函数；返回值被忽略，抛出异常视为失败（不记录指纹）；
+    - inputs / outputs: 路径列表，或返回路径的可调用对象（在运行时求值，可依赖上游产物）；
+    - deps: 上游阶段名，决定执行顺序；
+    - params: 参与指纹的参数（命令行选项等）；
+    - expand: 若提供，则该阶段在运行时展开为若干子阶段，自身不执行 `run`。
+    """
+
+    name: str
+    run: Optional[Callable[[], Any]] = None
+    inputs: PathSpec = field(default_factory=list)
+    outputs: PathSpec = field(default_factory=list)
+    deps: List[str] = field(default_factory=list)
+    params: Dict[str, Any] = field(default_factory=dict)
+    expand: Optional[Callable[[], List["Stage"]]] = None
+
+
+def _resolve(spec: PathSpec) -> List[Path]:
+    return [Path(p) for p in (spec() if callable(spec) else spec)]
+
+
+def _walk(paths: Iterable[Path]) -> List[Path]:
+    """展开目录为其中的全部文件（跳过 __pycache__/.git），按路径排序。"""
+    files = set()
+    for p in paths:
+        if p.is_dir():
+            for root, dirs, names in os.walk(p):
+                dirs[:] = [d for d in dirs if d not in _SKIP_DIRS]
+                files.update(Path(root) / n for n in names)
+        elif p.exists():
+            files.add(p)
+    return sorted(files)
+
+
+def _params_hash(params: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class StageGraph:
+    """阶段图：登记阶段后调用 `run()` 按依赖顺序执行过期阶段。
+
+    参数：
+    - state_path: 指纹状态文件（JSON）；
+    - root: 记录路径时使用的相对根目录（通常为仓库根）。
+    """
+
+    def __init__(self, state_path: Path, root: Path) -> None:
+        self.state_path = Path(state_path)
+        self.root = Path(root)
+        self.stages: Dict[str, Stage] = {}
+        self._state = self._load()
+        self.ran: List[str] = []
+        self.skipped: List[str] = []
+
+    # ---------- 状态 ----------
+    def _load(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.state_path.read_text(encoding="utf-8"))
+            if data.get("version") == STATE_VERSION:
+                return data
+        except Exception:
+            pass
+        return {"version": STATE_VERSION, "stages": {}, "files": {}}
+
+    def _save(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._state, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+    def _rel(self, p: Path) -> str:
+        try:
+            return p.resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return p.resolve().as_posix()
+
+    def _hash(self, p: Path) -> str:
+        """带 (size, mtime) 缓存的文件哈希。"""
+        st = p.stat()
+        key = self._rel(p)
+        cached = self._state["files"].get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = file_sha256(p)
+        self._state["files"][key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def fingerprint(self, paths: Iterable[Path]) -> Dict[str, str]:
+        return {self._rel(f): self._hash(f) for f in _walk(paths)}
+
+    # ---------- 图 ----------
+    def add(self, stage: Stage) -> Stage:
+        if stage.name in self.stages:
+            raise ValueError(f"duplicate stage: {stage.name}")
+        self.stages[stage.name] = stage
+        return stage
+
+    def order(self, targets: Optional[List[str]] = None) -> List[Stage]:
+        """拓扑排序；给定 targets 时只包含它们及其上游。"""
+        out: List[Stage] = []
+        seen: Dict[str, bool] = {}
+
+        def visit(name: str) -> None:
+            if seen.get(name):
+                return
+            if name in seen:
+                raise ValueError(f"stage cycle at: {name}")
+            seen[name] = False
+            stage = self.stages[name]
+            for d in stage.deps:
+                visit(d)
+            seen[name] = True
+            out.append(stage)
+
+        for name in (targets or list(self.stages)):
+            visit(name)
+        return out
+
+    def why_stale(self, stage: Stage) -> Optional[str]:
+        """返回阶段需要重跑的原因；无需重跑时返回 None。"""
+        rec = self._state["stages"].get(stage.name)
+        if not rec:
+            return "无记录"
+        if rec.get("params") != _params_hash(stage.params):
+            return "参数变化"
+        outputs = _resolve(stage.outputs)
+        missing = [self._rel(p) for p in outputs if not p.exists()]
+        if missing:
+            return f"输出缺失 {missing[0]}"
+        cur = self.fingerprint(_resolve(stage.inputs))
+        old = rec.get("inputs", {})
+        if cur != old:
+            changed = sorted(k for k in set(cur) | set(old) if cur.get(k) != old.get(k))
+            more = f" 等 {len(changed)} 个" if len(changed) > 1 else ""
+            return f"输入变化 {changed[0]}{more}"
+        return None
+
+    def _run_one(self, stage: Stage, force: bool, dry_run: bool) -> None:
+        reason = "强制重跑" if force else self.why_stale(stage)
+        if reason is None:
+            print(f"[stage] {stage.name}: 最新，跳过")
+            self.skipped.append(stage.name)
+            return
+        print(f"[stage] {stage.name}: 运行（{reason}）")
+        if dry_run:
+            self.ran.append(stage.name)
+            return
+        t0 = time.perf_counter()
+        stage.run()
+        self._state["stages"][stage.name] = {
+            "params": _params_hash(stage.params),
+            "inputs": self.fingerprint(_resolve(stage.inputs)),
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+        self._save()
+        self.ran.append(stage.name)
+
+    def run(self, targets: Optional[List[str]] = None, force: Iterable[str] = (), dry_run: bool = False) -> None:
+        """按依赖顺序执行过期阶段。
+
+        - force: 需要强制重跑的阶段名（"all" 表示全部）；展开阶段的子阶段名为 `<父阶段>:<子名>`，
+          强制父阶段即强制其全部子阶段；
+        - dry_run: 只打印计划，不执行。
+        """
+        force = set(force)
+        self.ran = []; self.skipped = []
+        for stage in self.order(targets):
+            forced = "all" in force or stage.name in force
+            if stage.expand is None:
+                self._run_one(stage, forced, dry_run)
+                continue
+            for child in stage.expand():
+                child.name = f"{stage.name}:{child.name}"
+                self._run_one(child, forced or child.name in force, dry_run)
+        print(f"[stage] 运行 {len(self.ran)} 个，跳过 {len(self.skipped)} 个")
@@ -0,0 +1,172 @@
+"""
+stream.py
+---------
+基于有界队列的流式多阶段流水线（生产者/消费者）：
+1) 每个阶段（Stage）由若干工作线程组成，阶段之间用有界 `queue.Queue` 连接；
+   上游阶段可以在下游处理第 N 项的同时处理第 N+1 项（例如解析下一页时导出上一页）；
+2) 背压：同时在途（已投入但尚未被消费者取走）的条目数受 `max_inflight` 限制，
+   慢阶段会让上游阻塞，内存占用保持平稳，不随页数增长；
+3) 保序：阶段内多线程可能乱序完成，结果在出口经重排缓冲区按输入顺序逐项产出；
+4) 出错：任一阶段抛出的异常会随条目传到出口，在消费者线程中按顺序重新抛出，其余线程随即停止；
+5) 统计：记录首个结果用时（time-to-first-result）、总用时与各阶段累计忙碌时间。
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+import queue
+import threading
+import time
+
+_DONE = object()
+_POLL = 0.1
+
+
+class _Failed:
+    """携带异常在阶段间传递的占位条目。"""
+
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+@dataclass
+class Stage:
+    """流水线阶段：`fn(item) -> item`，由 `workers` 个线程并发执行。"""
+
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    busy: float = field(default=0.0, init=False)
+    count: int = field(default=0, init=False)
+
+
+class StreamPipeline:
+    """有界队列连接的多阶段流水线。
+
+    参数：
+    - stages: 阶段列表，按顺序串联；
+    - queue_size: 每条阶段间队列的容量；
+    - max_inflight: 同时在途条目上限（默认 `queue_size * (阶段数 + 1)`），用于限制重排缓冲区与内存。
+
+    用法：`for result in StreamPipeline(stages).run(items): ...`，结果与 `items` 顺序一致。
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 2, max_inflight: Optional[int] = None) -> None:
+        if not stages:
+            raise ValueError("StreamPipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self.max_inflight = max(1, int(max_inflight or self.queue_size * (len(stages) + 1)))
+        self.first_result: Optional[float] = None
+        self.elapsed: float = 0.0
+
+    def _put(self, q: queue.Queue, x: Any) -> bool:
+        """带停止检查的阻塞 put；流水线被中止时返回 False。"""
+        while not self._stop.is_set():
+            try:
+                q.put(x, timeout=_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        """带停止检查的阻塞 get；流水线被中止时返回 `_DONE`。"""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _worker(self, stage: Stage, inq: queue.Queue, outq: queue.Queue, state: Dict[str, Any], downstream: int) -> None:
+        while True:
+            got = self._get(inq)
+            if got is _DONE:
+                with state["lock"]:
+                    state["left"] -= 1
+                    last = state["left"] == 0
+                if last:
+                    for _ in range(downstream):
+                        self._put(outq, _DONE)
+                return
+            seq, item = got
+            if not isinstance(item, _Failed) and not self._stop.is_set():
+                t0 = time.perf_counter()
+                try:
+                    item = stage.fn(item)
+                except BaseException as e:  # 交给消费者线程重新抛出
+                    item = _Failed(e)
+                dt = time.perf_counter() - t0
+                with state["lock"]:
+                    stage.busy += dt; stage.count += 1
+            if not self._put(outq, (seq, item)):
+                return
+
+    def _feed(self, items: Iterable[Any], outq: queue.Queue, downstream: int) -> None:
+        try:
+            for seq, item in enumerate(items):
+                while not self._slots.acquire(timeout=_POLL):
+                    if self._stop.is_set():
+                        return
+                if not self._put(outq, (seq, item)):
+                    return
+        except BaseException as e:
+            self._feed_error = e
+        for _ in range(downstream):
+            self._put(outq, _DONE)
+
+    def run(self, items: Iterable[Any]) -> Iterator[Any]:
+        """启动各阶段线程并按输入顺序逐项产出最终结果。"""
+        t0 = time.perf_counter()
+        self.first_result = None
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(self.max_inflight)
+        self._feed_error: Optional[BaseException] = None
+        for stage in self.stages:
+            stage.workers = max(1, int(stage.workers)); stage.busy = 0.0; stage.count = 0
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0], self.stages[0].workers),
+                                    name="stream-feed", daemon=True)]
+        for k, stage in enumerate(self.stages):
+            n = stage.workers
+            downstream = self.stages[k + 1].workers if k + 1 < len(self.stages) else 1
+            state = {"lock": threading.Lock(), "left": n}
+            for w in range(n):
+                threads.append(threading.Thread(
+                    target=self._worker, args=(stage, queues[k], queues[k + 1], state, downstream),
+                    name=f"stream-{stage.name}-{w}", daemon=True,
+                ))
+        for t in threads:
+            t.start()
+
+        pending: Dict[int, Any] = {}
+        nxt = 0
+        outq = queues[-1]
+        try:
+            while True:
+                got = outq.get()
+                if got is _DONE:
+                    break
+                seq, item = got
+                pending[seq] = item
+                while nxt in pending:
+                    item = pending.pop(nxt)
+                    nxt += 1
+                    self._slots.release()
+                    if isinstance(item, _Failed):
+                        raise item.exc
+                    if self.first_result is None:
+                        self.first_result = time.perf_counter() - t0
+                    yield item
+            if self._feed_error is not None:
+                raise self._feed_error
+        finally:
+            # 正常结束时各线程已退出；提前中止（异常/消费者不再迭代）时通知其余线程停止
+            self._stop.set()
+            self.elapsed = time.perf_counter() - t0
+
+    def summary(self) -> str:
+        """一行统计：首个结果用时、总用时与各阶段忙碌时间/处理条数。"""
+        first = f"{self.first_result:.2f}s" if self.first_result is not None else "-"
+        parts = [f"{s.name}×{s.workers} {s.busy:.2f}s/{s.count}" for s in self.stages]
+        return f"首个结果 {first} | 总计 {self.elapsed:.2f}s | " + ", ".join(parts)
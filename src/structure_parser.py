@@ -1,6 +1,7 @@
 import re
 from typing import Dict, Any
 from .utils import split_options, has_likely_options
+from . import question_grammar
 
 # 将原始题目文本解析为结构化字段：
 # - 提取题号（例/练习/数字/括号数字等样式）；
@@ -20,27 +21,17 @@ def parse_question(raw_text:str)->Dict[str,Any]:
 
 def parse_question_v2(raw_text: str) -> Dict[str, Any]:
     """增强版题目解析：更全面的题头与答案样式。
-    - 题头：【例1】/【练习2】/【题3】/第4题/1. / 1、 / （1）/ (2)
+    - 题头：【例1】/【练习2】/【题3】/【变式】/第4题/例5./变式1/1. / 1、 / （1）/ (2)
     - 答案：【答案】D / 参考答案：D / 答案：12 / 答案：√/×/对/错
     """
     text = raw_text.strip()
     number = None
 
-    # 题头（取整段起始标记作为题号保留）
-    header_pat = re.compile(
-        r"^\s*(?:"
-        r"【\s*(?:例|练习|题|变式)\s*\d*】|"   # 【例1】/【题2】/【变式】
-        r"第\s*\d+\s*题|"                      # 第1题
-        r"(?:例|练习)\s*\d+\s*[\.、．)]|"     # 例1. / 练习2、
-        r"\d+\s*[\.、．)]|"                     # 1. / 2、 / 3．
-        r"[（(]\s*\d+\s*[）)]"                  # （1） / (2)
-        r")",
-        re.UNICODE,
-    )
-    m = header_pat.match(text)
-    if m:
-        number = m.group(0).strip()
-        text = text[m.end():].lstrip()
+    # 题头（取整段起始标记作为题号保留；文法见 question_grammar，答案/解析等题头不算题号）
+    head = question_grammar.head_at(text)
+    if head and head.kind in question_grammar.SEGMENT_KINDS:
+        number = head.label
+        text = text[head.end:].lstrip()
 
     # 选项解析
     options = split_options(text) if has_likely_options(text) else None
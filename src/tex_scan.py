@@ -0,0 +1,178 @@
+"""
+tex_scan.py
+-----------
+括号与转义感知的 TeX 扫描器，用于一次线性扫描中展开/改写指定的宏：
+1) `\\name{...}` 的参数按真实的花括号嵌套匹配（`\\{`、`\\}`、`\\\\` 视为转义，`%` 注释中的括号不计），
+   不再像 `\\\\name\\{([\\s\\S]*?)\\}` 那样在第一个 `}` 处截断；
+2) 目标宏之外的正文用 C 层的正则搜索直接跳过，只在目标宏的参数内部逐个检查括号/命令记号；
+   候选宏是否处于转义或 `%` 注释中，由随扫描单调前进的转义/注释记号流判断（`_Liveness`），
+   不会为每个候选回扫所在行，长行上也保持线性；参数内嵌套的目标宏在同一次扫描中一并处理；
+3) 未闭合的参数原样保留（不产生半截改写）。
+
+接口：
+- `match_group(s, i)`：从 `s[i] == "{"` 开始找到匹配的 `}`，返回其后位置；
+- `rewrite(s, rules)`：`rules = {宏名: (开头替换, 结尾替换)}`，如 `{"ensuremath": ("$", "$")}`；
+- `unwrap(s, names)`：去掉宏本身与参数括号，只保留参数内容（如 `\\pandocbounded{...}`）；
+- `find_command(s, name)`：定位下一个 `\\name{...}`，供其他 TeX 修复脚本按需改写。
+
+基准见 `scripts/bench_tex_scan.py`。
+"""
+
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+
+# 参数内部需要关心的记号：命令（含转义字符）、注释、花括号
+_INNER = re.compile(r"\\(?:[A-Za-z@]+|.)|%[^\n]*|[{}]", re.S)
+# 判断候选宏是否有效时只需关心的记号：非字母的转义对（如 `\\`、`\%`、`\{`）与注释（到行尾）；
+# `\name` 形式的命令不影响其后字符的含义，不必切分
+_ESCAPE_OR_COMMENT = re.compile(r"\\[^A-Za-z@]|%[^\n]*", re.S)
+
+
+@lru_cache(maxsize=32)
+def _target_re(names: Tuple[str, ...]) -> "re.Pattern[str]":
+    alt = "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True))
+    # 参数内不含 { } \\ % 时（最常见的情形）直接在正则里连同结尾 } 一起匹配，省去逐记号检查
+    return re.compile(r"\\(" + alt + r")(?![A-Za-z@])\s*\{(?:([^{}\\%]*)\})?")
+
+
+class _Liveness:
+    """判断候选位置的反斜杠是否真的开始一个命令（不是被转义的字符，也不在 `%` 注释中）。
+
+    记住上一次判断后已知的记号边界 `lo`，每次只检查 `lo` 到候选位置之间的文本：
+    询问的位置须单调递增，整个扫描中每个字符至多被检查常数次，长行上也保持线性。
+    """
+
+    def __init__(self, s: str, start: int = 0) -> None:
+        self.s = s
+        # 行首总是记号边界（注释止于换行，被转义的换行本身就是转义对的第二个字符）
+        self.lo = s.rfind("\n", 0, start) + 1
+
+    def __call__(self, pos: int) -> bool:
+        s, lo = self.s, self.lo
+        if pos < lo:
+            return False  # 落在上次找到的转义对或注释之中
+        nl = s.rfind("\n", lo, pos)
+        if nl >= 0:
+            lo = nl + 1  # 注释与转义对都不跨过换行，只需检查候选所在行
+        if s[pos - 1:pos] != "\\" and s.find("%", lo, pos) < 0:
+            self.lo = pos  # 常见情形：中间没有 %，前一个字符也不是反斜杠
+            return True
+        j = lo
+        for t in _ESCAPE_OR_COMMENT.finditer(s, lo, pos):
+            if t.group()[0] == "%":
+                end = s.find("\n", t.start())
+                end = len(s) if end < 0 else end
+                if end > pos:
+                    self.lo = end
+                    return False
+            j = t.end()
+        if s[pos - 1] == "\\" and pos - 1 >= j:
+            self.lo = pos + 1  # 前一个反斜杠与 pos 处的反斜杠组成转义对
+            return False
+        self.lo = pos
+        return True
+
+
+def match_group(s: str, i: int) -> int:
+    """返回与 `s[i]`（须为 `{`）匹配的 `}` 之后的位置；未闭合时返回 -1。"""
+    if i >= len(s) or s[i] != "{":
+        raise ValueError("match_group expects '{' at the given position")
+    depth = 0
+    for t in _INNER.finditer(s, i):
+        tok = t.group()
+        if tok == "{":
+            depth += 1
+        elif tok == "}":
+            depth -= 1
+            if depth == 0:
+                return t.end()
+    return -1
+
+
+def _open(m: "re.Match[str]", rules: Dict[str, Tuple[str, str]], stack: List[list], edits: List[Optional[Tuple[int, int, str]]]) -> None:
+    """处理一次目标宏匹配：简单参数直接记下首尾改写；否则先占位记下开头改写并压栈，等待匹配的 `}`。"""
+    name = m.group(1)
+    start_repl, end_repl = rules[name]
+    a, b = m.span(2)
+    if a >= 0:
+        edits.append((m.start(), a, start_repl))
+        edits.append((b, m.end(), end_repl))
+    else:
+        stack.append([end_repl, len(edits), 0])
+        edits.append((m.start(), m.end(), start_repl))
+
+
+def rewrite(s: str, rules: Dict[str, Tuple[str, str]]) -> str:
+    """把 `\\name{X}` 改写为 `open + X + close`（X 内的目标宏同样改写），单次线性扫描。"""
+    if not rules or not any(("\\" + n) in s for n in rules):
+        return s
+    target = _target_re(tuple(rules))
+    # 改写按扫描顺序追加，位置天然有序；未闭合参数的开头改写事后置为 None
+    edits: List[Optional[Tuple[int, int, str]]] = []
+    # 栈中每项：[结尾改写, 开头改写在 edits 中的下标, 该参数内尚未闭合的普通 { 数]
+    stack: List[list] = []
+    live = _Liveness(s)
+    i = 0
+    while True:
+        if not stack:
+            m = target.search(s, i)
+            if not m:
+                break
+            i = m.end()
+            if live(m.start()):
+                _open(m, rules, stack, edits)
+            continue
+        t = _INNER.search(s, i)
+        if not t:
+            break
+        i = t.end()
+        tok = t.group()
+        frame = stack[-1]
+        if tok == "{":
+            frame[2] += 1
+        elif tok == "}":
+            if frame[2]:
+                frame[2] -= 1
+            else:
+                stack.pop()
+                edits.append((t.start(), i, frame[0]))
+        elif tok[1:] in rules:
+            m = target.match(s, t.start())
+            if m:
+                i = m.end()
+                _open(m, rules, stack, edits)
+    for frame in stack:
+        edits[frame[1]] = None  # 未闭合：不做半截改写
+    if not edits:
+        return s
+    out: List[str] = []
+    pos = 0
+    for e in edits:
+        if e is not None:
+            out.append(s[pos:e[0]]); out.append(e[2])
+            pos = e[1]
+    out.append(s[pos:])
+    return "".join(out)
+
+
+def unwrap(s: str, names: Iterable[str]) -> str:
+    """去掉 `\\name{...}` 的宏与参数括号，只保留参数内容。"""
+    return rewrite(s, {n: ("", "") for n in names})
+
+
+def find_command(s: str, name: str, start: int = 0) -> Optional[Tuple[int, int, int]]:
+    """查找下一个 `\\name{...}`，返回 (命令起点, 参数内容起点, 命令终点)；找不到或未闭合时返回 None。"""
+    target = _target_re((name,))
+    live = _Liveness(s, start)
+    i = start
+    while True:
+        m = target.search(s, i)
+        if not m:
+            return None
+        i = m.end()
+        if live(m.start()):
+            if m.start(2) >= 0:
+                return m.start(), m.start(2), m.end()
+            end = match_group(s, m.end() - 1)
+            return (m.start(), m.end(), end) if end >= 0 else None
@@ -1,7 +1,9 @@
 from pathlib import Path
+import hashlib
 import re
 import platform
 import subprocess
+from functools import lru_cache
 
 
 def ensure_dir(p: Path) -> None:
@@ -9,6 +11,15 @@ def ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
 
+def file_sha256(p: Path, chunk_size: int = 1 << 20) -> str:
+    """计算文件内容的 SHA-256（十六进制），按块读取避免大文件一次进内存。"""
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
 # 常见题号样式正则片段（供其他模块参考）
 QUESTION_NUMBER_PATTERNS = [
     r"(?:例|练习)\s*\d+",
@@ -50,12 +61,19 @@ def split_options(text: str):
     return items if items else None
 
 
+@lru_cache(maxsize=None)
 def detect_gpu_type() -> str:
-    """检测本机 GPU 类型。
+    """检测本机 GPU 类型（进程内只探测一次；跨进程经 `env_probe` 磁盘缓存）。
 
     返回：
     - 'nvidia' | 'amd' | 'none'
     """
+    from . import env_probe
+    return env_probe.get("gpu")
+
+
+def _detect_gpu_type_uncached() -> str:
+    """实际探测 GPU 类型（启动 `lspci`/`wmic` 子进程），仅供 `env_probe` 调用。"""
     sys = platform.system().lower()
     try:
         if sys == 'windows':